@@ -0,0 +1,248 @@
+"""
+回放录制的 AKShare 和新浪行情响应，用于离线运行完整的 main() 流程
+
+录制（需要联网）: python benchmarks/akshare_replay.py <录制目录>
+  依次调用日报用到的 AKShare 接口，每个返回的 DataFrame 保存为 <接口>[__参数].pkl，
+  新浪批量报价的原始响应保存为 sina_quotes.txt，各次调用的耗时记在 manifest.json 中。
+
+回放:
+  install(directory) 把一个假的 akshare 模块放进 sys.modules，接口返回录制的 DataFrame；
+  latency=True 时每次调用按录制时的耗时 sleep，用于观察对冲和并发的效果。
+  SinaReplayServer 在本地回放新浪报价，SINA_QUOTE_URL 指向它的 url 即可。
+  directory 为None或目录中缺少某个接口时，使用按真实列结构生成的合成数据。
+"""
+import json
+import os
+import sys
+import threading
+import time
+import types
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+import pandas as pd
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCH_DIR, '..', 'scripts'))
+
+# 日报用到的接口及参数；板块成分接口按板块名分别录制
+RECORDED_CALLS = [
+    ('stock_zh_index_spot', {}),
+    ('stock_zh_index_spot_em', {'symbol': '沪深重要指数'}),
+    ('index_global_spot_em', {}),
+    ('currency_boc_sina', {}),
+    ('stock_zh_a_spot_em', {}),
+]
+
+SINA_FILE = 'sina_quotes.txt'
+MANIFEST_FILE = 'manifest.json'
+
+# 合成的新浪报价，字段布局见 fetch_and_send.parse_sina_quote
+SYNTHETIC_SINA_LINES = {
+    'gb_$inx': '标普500指数,5026.61,0.57,2024-02-09 16:14:00,28.70,5004.17,5030.06,5000.34',
+    'gb_ixic': '纳斯达克,15990.66,1.25,2024-02-09 16:14:00,196.95,15865.42,16000.00,15860.00',
+    'znb_NKY': '日经225指数,36897.42,34.14,0.09,36900.00,36700.00',
+    'znb_VIX': 'VIX恐慌指数,12.93,-0.13,-1.00,13.20,12.80',
+    'DINIW': '06:00:00,104.0900,104.1200,104.1300,0,104.13,104.30,103.95,104.09,美元指数',
+    'hf_CHA50CFD': '11862.00,,11860.00,11865.00,11900.00,11800.00,15:00:00,11820.00,11830.00',
+    's_sh000001': '上证指数,3050.12,12.30,0.41,3200000,36000000',
+    's_sz399001': '深证成指,9800.55,-20.10,-0.20,3900000,45000000',
+    's_sz399006': '创业板指,1900.33,5.12,0.27,1200000,20000000',
+    'fx_susdcny': '16:30:00,7.1930,7.1935,7.1890,40,7.1920,7.1960,7.1880,7.1930,在岸人民币',
+}
+
+
+def _call_key(name, kwargs):
+    return f"{name}__{kwargs['symbol']}" if 'symbol' in kwargs else name
+
+
+def recorded_calls():
+    """所有需要录制的 (接口, 参数)，包括各板块的成分股接口"""
+    from fetch_and_send import SECTOR_BOARDS
+    boards = {'concept': 'stock_board_concept_cons_em', 'industry': 'stock_board_industry_cons_em'}
+    calls = list(RECORDED_CALLS)
+    calls += [(boards[kind], {'symbol': board}) for kind, board in SECTOR_BOARDS.values()]
+    return calls
+
+
+def sina_codes():
+    from fetch_and_send import INDICATORS
+    codes = set()
+    for spec in INDICATORS.values():
+        for entry in [spec] + spec.get('alternates', []):
+            if entry.get('quote'):
+                codes.add(entry['quote'])
+    return sorted(codes)
+
+
+def record(directory):
+    """调用真实的 AKShare 和新浪接口，把响应保存到 directory"""
+    import akshare as ak
+    import requests
+    from fetch_and_send import SINA_HEADERS
+
+    os.makedirs(directory, exist_ok=True)
+    manifest = {'recorded_at': time.strftime('%Y-%m-%d %H:%M:%S'), 'calls': {}}
+    for name, kwargs in recorded_calls():
+        func = getattr(ak, name, None)
+        if func is None:
+            print(f"跳过 {name}: 当前AKShare版本不提供该接口")
+            continue
+        key = _call_key(name, kwargs)
+        start = time.perf_counter()
+        try:
+            frame = func(**kwargs)
+        except Exception as e:
+            print(f"录制 {key} 时出错: {e}")
+            continue
+        elapsed = time.perf_counter() - start
+        frame.to_pickle(os.path.join(directory, f"{key}.pkl"))
+        manifest['calls'][key] = {'elapsed': round(elapsed, 4), 'rows': len(frame)}
+        print(f"{key}: {len(frame)} 行, {elapsed:.2f}s")
+
+    start = time.perf_counter()
+    response = requests.get('https://hq.sinajs.cn/list=' + ','.join(sina_codes()), headers=SINA_HEADERS, timeout=10)
+    response.encoding = 'gbk'
+    with open(os.path.join(directory, SINA_FILE), 'w', encoding='utf-8') as f:
+        f.write(response.text)
+    manifest['calls']['sina_quotes'] = {'elapsed': round(time.perf_counter() - start, 4)}
+
+    with open(os.path.join(directory, MANIFEST_FILE), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=1)
+
+
+def synthetic_frames(stocks=5000, seed=0):
+    """按各接口真实的列结构生成合成数据，{调用键: DataFrame}"""
+    from bench_market_breadth import make_snapshot
+    from fetch_and_send import SECTOR_BOARDS
+
+    rng = np.random.default_rng(seed)
+    snapshot = make_snapshot(stocks, seed)
+    snapshot['涨跌额'] = np.round(snapshot['最新价'] - snapshot['昨收'], 2)
+
+    def quotes(codes, values):
+        values = np.asarray(values, dtype=np.float64)
+        pct = np.round(rng.normal(0, 1, len(codes)), 2)
+        return pd.DataFrame({'代码': codes, '名称': codes, '最新价': values,
+                             '涨跌额': np.round(values * pct / 100, 2), '涨跌幅': pct})
+
+    frames = {
+        'stock_zh_index_spot': quotes(['sh000001', 'sz399001', 'sz399006', 'sh000300'],
+                                      [3050.12, 9800.55, 1900.33, 3600.0]),
+        'stock_zh_index_spot_em__沪深重要指数': quotes(['000001', '399001', '399006', '000300'],
+                                                 [3050.12, 9800.55, 1900.33, 3600.0]),
+        'index_global_spot_em': quotes(['SPX', 'NDX', 'N225', 'UDI', 'HSI'],
+                                       [5026.61, 17962.0, 36897.42, 104.09, 16500.0]),
+        'currency_boc_sina': pd.DataFrame({'币种': ['美元', '欧元', '日元'],
+                                           '现汇买入价': [710.1, 770.2, 4.8],
+                                           '现汇卖出价': [713.1, 775.8, 4.84]}),
+        'stock_zh_a_spot_em': snapshot,
+    }
+    boards = {'concept': 'stock_board_concept_cons_em', 'industry': 'stock_board_industry_cons_em'}
+    for i, (kind, board) in enumerate(SECTOR_BOARDS.values()):
+        members = snapshot['代码'].sample(min(100, stocks), random_state=seed + i)
+        frames[f"{boards[kind]}__{board}"] = pd.DataFrame({'代码': members.to_numpy()})
+    return frames
+
+
+class Recording:
+    """一份录制（或合成）的响应"""
+
+    def __init__(self, directory=None):
+        self.frames = synthetic_frames()
+        self.sina_lines = dict(SYNTHETIC_SINA_LINES)
+        self.latency = {}
+        self.directory = directory
+        if directory is None:
+            return
+        try:
+            with open(os.path.join(directory, MANIFEST_FILE), 'r', encoding='utf-8') as f:
+                calls = json.load(f).get('calls', {})
+        except (OSError, ValueError):
+            calls = {}
+        for key, info in calls.items():
+            self.latency[key] = info.get('elapsed', 0.0)
+            path = os.path.join(directory, f"{key}.pkl")
+            if os.path.exists(path):
+                self.frames[key] = pd.read_pickle(path)
+        try:
+            with open(os.path.join(directory, SINA_FILE), 'r', encoding='utf-8') as f:
+                for line in f:
+                    code, _, payload = line.strip()[len('var hq_str_'):].partition('="')
+                    if code:
+                        self.sina_lines[code] = payload.rstrip('";')
+        except OSError:
+            pass
+
+
+def make_module(recording, latency=False):
+    """由录制生成假的 akshare 模块；录制中没有的接口不存在（与旧版本AKShare缺少接口时的行为一致）"""
+    ak = types.ModuleType('akshare')
+    ak.calls = []
+    names = {key.split('__', 1)[0] for key in recording.frames}
+
+    def make(name):
+        def func(**kwargs):
+            key = _call_key(name, kwargs)
+            ak.calls.append(key)
+            if key not in recording.frames:
+                raise KeyError(f"录制中没有 {key}")
+            if latency:
+                time.sleep(recording.latency.get(key, 0.0))
+            return recording.frames[key].copy()
+        func.__name__ = name
+        return func
+
+    for name in names:
+        setattr(ak, name, make(name))
+    return ak
+
+
+def install(directory=None, latency=False):
+    """把回放用的 akshare 模块放进 sys.modules，返回该模块"""
+    ak = make_module(Recording(directory), latency)
+    sys.modules['akshare'] = ak
+    return ak
+
+
+class SinaReplayHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    wbufsize = -1
+
+    def do_GET(self):
+        server = self.server
+        if server.latency:
+            time.sleep(server.latency)
+        codes = self.path.split('list=', 1)[-1].split(',')
+        body = ''.join(f'var hq_str_{c}="{server.lines.get(c, "")}";\n' for c in codes).encode('gbk')
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class SinaReplayServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, recording, latency=False):
+        super().__init__(('127.0.0.1', 0), SinaReplayHandler)
+        self.lines = recording.sina_lines
+        self.latency = recording.latency.get('sina_quotes', 0.0) if latency else 0.0
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}/list="
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+
+if __name__ == '__main__':
+    if len(sys.argv) < 2:
+        print("用法: python benchmarks/akshare_replay.py <录制目录>")
+        sys.exit(1)
+    record(sys.argv[1])
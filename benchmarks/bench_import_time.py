@@ -0,0 +1,83 @@
+"""
+启动耗时基准测试
+
+每个场景在新的解释器进程中运行若干次，取耗时中位数，并列出该场景加载了哪些重量级模块：
+  python       空解释器，作为参照
+  eager        启动时即导入 pandas/numpy/requests/akshare（延迟导入之前的做法）
+  import       只导入 fetch_and_send 模块
+  render-only  用样例数据执行 fetch_and_send.py --render-only
+  dry-run      用样例数据执行 fetch_and_send.py --dry-run
+
+用法: python benchmarks/bench_import_time.py [每个场景的运行次数]
+"""
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+SCRIPTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'scripts')
+HEAVY_MODULES = ('numpy', 'pandas', 'requests', 'akshare')
+
+SAMPLE_DATA = {
+    'domestic_market': {
+        'SHANGHAI': {'value': 3050.12, 'change': 12.3, 'change_pct': 0.41},
+        'SZ_COMP': {'value': 9800.55, 'change': -20.1, 'change_pct': -0.2},
+        'RISING_STOCKS': 3200, 'FALLING_STOCKS': 1800, 'LIMIT_UP': 60, 'LIMIT_DOWN': 5,
+    },
+    'capital_flows': {'TURNOVER': 9500.0},
+    'global_markets': {
+        'S&P_500': {'value': 5026.61, 'change': 28.7, 'change_pct': 0.57},
+        'VIX': {'value': 12.93, 'change': -0.13, 'change_pct': -1.0},
+    },
+    'policy_sentiment': {'SECTOR_PERFORMANCE': {'AI_CHIP': 2.5, 'CONSUMER': -0.3}},
+}
+
+# 在子进程中执行代码，最后一行输出加载了的重量级模块
+REPORT_MODULES = (
+    "import sys; print('LOADED=' + ','.join(m for m in %r if m in sys.modules))" % (HEAVY_MODULES,)
+)
+
+SCENARIOS = {
+    'python': "pass",
+    'eager': "import pandas, numpy, requests, akshare; import fetch_and_send",
+    'import': "import fetch_and_send",
+    'render-only': "import sys, fetch_and_send; fetch_and_send.main(render_only=True)",
+    'dry-run': "import sys, fetch_and_send; fetch_and_send.main(dry_run=True)",
+}
+
+
+def run_scenario(code, env):
+    start = time.perf_counter()
+    result = subprocess.run([sys.executable, '-c', f"{code}\n{REPORT_MODULES}"],
+                            cwd=SCRIPTS_DIR, env=env, capture_output=True, text=True)
+    elapsed = time.perf_counter() - start
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1])
+    loaded = result.stdout.strip().splitlines()[-1].split('=', 1)[1]
+    return elapsed, loaded
+
+
+def main():
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    with tempfile.TemporaryDirectory() as cache_dir:
+        with open(os.path.join(cache_dir, 'last_data.json'), 'w', encoding='utf-8') as f:
+            json.dump(SAMPLE_DATA, f, ensure_ascii=False)
+        env = dict(os.environ, CACHE_DIR=cache_dir, TO_EMAIL='bench@example.com',
+                   REPORT_OUTPUT=os.path.join(cache_dir, 'report.html'))
+
+        print(f"{'场景':<14}{'中位耗时':>10}  已加载的重量级模块")
+        for name, code in SCENARIOS.items():
+            try:
+                results = [run_scenario(code, env) for _ in range(runs)]
+            except RuntimeError as e:
+                print(f"{name:<14}{'失败':>10}  {e}")
+                continue
+            median = statistics.median(elapsed for elapsed, _ in results)
+            print(f"{name:<14}{median * 1000:>8.0f}ms  {results[-1][1] or '-'}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,62 @@
+"""
+邮件投递基准：每封邮件单独建连 vs 连接池批量投递
+
+在本地启动 SMTP 替身（connect_delay 模拟TLS握手和登录的耗时），
+分别按原先"每封邮件建连-登录-发送-退出"的方式和 mailer.deliver 投递同一批邮件，
+比较总耗时和建立的连接数。
+
+用法: python benchmarks/bench_mailer.py [收件人数] [建连延迟秒数]
+"""
+import os
+import smtplib
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'scripts'))
+
+import mailer
+from smtp_stub import SMTPStub
+
+SENDER = 'report@example.com'
+HTML = '<html><body>' + '<p>行情数据</p>' * 200 + '</body></html>'
+
+
+def send_one_by_one(port, recipients):
+    for recipient in recipients:
+        server = smtplib.SMTP('127.0.0.1', port)
+        server.login(SENDER, 'secret')
+        server.sendmail(SENDER, recipient, mailer.build_message(SENDER, recipient, '日报', HTML))
+        server.quit()
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    delay = float(sys.argv[2]) if len(sys.argv) > 2 else 0.05
+    recipients = [f"reader{i}@example.com" for i in range(count)]
+
+    stub = SMTPStub(connect_delay=delay).start()
+    start = time.perf_counter()
+    send_one_by_one(stub.port, recipients)
+    serial_time = time.perf_counter() - start
+    serial_connections = stub.connections
+    stub.shutdown()
+
+    stub = SMTPStub(connect_delay=delay, fail_first=3).start()
+    pool = mailer.SMTPConnectionPool(SENDER, 'secret', host='127.0.0.1', port=stub.port,
+                                     size=4, starttls=False)
+    start = time.perf_counter()
+    errors = mailer.deliver([(r, '日报', HTML) for r in recipients], SENDER, pool,
+                            rate_limit=0, backoff=0.01)
+    pooled_time = time.perf_counter() - start
+    pool.close()
+    stub.shutdown()
+
+    failed = sum(1 for e in errors.values() if e)
+    print(f"{count}位收件人, 建连延迟 {delay * 1000:.0f} ms")
+    print(f"逐封建连:   {serial_time:6.2f} s, 连接数 {serial_connections}")
+    print(f"连接池投递: {pooled_time:6.2f} s, 连接数 {stub.connections}, "
+          f"送达 {len(stub.messages)}, 失败 {failed} (含3次注入的421重试)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,58 @@
+"""
+市场宽度计算的基准测试
+
+构造一份约5000只股票的全市场快照（包含主板、创业板、科创板、北交所和ST股），
+测量 compute_market_breadth 和 compute_sector_performance（33个板块）单次计算的耗时。
+
+用法: python benchmarks/bench_market_breadth.py [股票数量]
+"""
+import os
+import sys
+import timeit
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'scripts'))
+
+import market_snapshot
+
+
+def make_snapshot(size, seed=0):
+    rng = np.random.default_rng(seed)
+    prefixes = rng.choice(['600', '601', '000', '002', '300', '688', '830'], size=size)
+    # 每个前缀内部顺序编号，保证代码唯一
+    serials = pd.Series(prefixes).groupby(prefixes).cumcount()
+    codes = [f"{p}{n:03d}" for p, n in zip(prefixes, serials)]
+    names = np.where(rng.random(size) < 0.03, '*ST股票', '股票')
+    prev_close = np.round(rng.uniform(2, 200, size), 2)
+    pct = np.clip(rng.normal(0, 3, size), -20, 20) / 100
+    price = np.round(prev_close * (1 + pct), 2)
+    return pd.DataFrame({
+        '代码': codes,
+        '名称': names,
+        '最新价': price,
+        '昨收': prev_close,
+        '涨跌幅': np.round((price / prev_close - 1) * 100, 2),
+        '成交额': rng.uniform(1e6, 5e9, size),
+        '总市值': rng.uniform(1e9, 2e12, size),
+    })
+
+
+def main():
+    size = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    snapshot = make_snapshot(size)
+    number = 200
+    elapsed = timeit.timeit(lambda: market_snapshot.compute_market_breadth(snapshot), number=number)
+    print(market_snapshot.compute_market_breadth(snapshot))
+    print(f"{size}只股票: 平均每次 {elapsed / number * 1000:.2f} ms")
+
+    membership = {f"SECTOR_{i}": snapshot['代码'].sample(100, random_state=i).tolist() for i in range(33)}
+    elapsed = timeit.timeit(
+        lambda: market_snapshot.compute_sector_performance(snapshot, membership), number=number
+    )
+    print(f"{len(membership)}个板块: 平均每次 {elapsed / number * 1000:.2f} ms")
+
+
+if __name__ == '__main__':
+    main()
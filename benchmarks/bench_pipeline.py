@@ -0,0 +1,206 @@
+"""
+完整流程的离线基准：回放录制的 AKShare/新浪响应，邮件发到本地SMTP替身
+
+每次在新的解释器进程中执行 fetch_and_send.main()，从该次运行写出的指标文件（见 tracing）中
+读取各阶段和各上游调用的耗时，汇总为中位数和最大值。默认每次使用新的缓存目录（冷启动）；
+--warm 时所有运行共用一个缓存目录并强制发送，观察磁盘缓存和条件请求命中后的耗时。
+
+回归跟踪：--save 把中位数保存为JSON，之后用 --baseline 对比，
+有指标比基线慢超过 --threshold 时以非零状态退出，可以放进CI。
+--profile 额外执行一次并用 cProfile 记录，打印累计耗时最高的函数。
+
+用法:
+  python benchmarks/bench_pipeline.py [--runs 5] [--replay 录制目录] [--latency] [--warm]
+                                      [--subscribers N] [--save 结果.json] [--baseline 结果.json]
+                                      [--profile 输出.prof]
+录制方法见 benchmarks/akshare_replay.py；不指定 --replay 时使用合成数据。
+"""
+import argparse
+import glob
+import json
+import os
+import pstats
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+SCRIPTS_DIR = os.path.join(BENCH_DIR, '..', 'scripts')
+sys.path.insert(0, SCRIPTS_DIR)
+
+import akshare_replay  # noqa: E402
+from smtp_stub import SMTPStub  # noqa: E402
+
+# 子进程中执行的代码：装上回放的 akshare 后运行 main()
+CHILD = f"""
+import os, sys
+sys.path.insert(0, {BENCH_DIR!r})
+import akshare_replay
+akshare_replay.install(os.environ.get('REPLAY_DIR') or None, latency=os.environ.get('REPLAY_LATENCY') == '1')
+import fetch_and_send
+if os.environ.get('BENCH_PROFILE'):
+    import cProfile
+    cProfile.run('ok = fetch_and_send.main()', os.environ['BENCH_PROFILE'])
+else:
+    ok = fetch_and_send.main()
+sys.exit(0 if ok else 1)
+"""
+
+# 比基线慢但绝对差值小于此值（秒）的不算回归，避免毫秒级的抖动误报
+MIN_REGRESSION = 0.005
+
+
+def make_subscribers(count):
+    from fetch_and_send import INDICATORS, SECTOR_BOARDS
+    indices = [k for k, spec in INDICATORS.items() if spec['kind'] == 'index']
+    fx = [k for k, spec in INDICATORS.items() if spec['kind'] == 'fx']
+    sectors = list(SECTOR_BOARDS)
+    return [{
+        'email': f"reader{i}@example.com",
+        'watchlist': {
+            'indices': indices[:1 + i % len(indices)],
+            'fx': fx[i % len(fx):],
+            'sectors': [sectors[i % len(sectors)]],
+        },
+    } for i in range(count)]
+
+
+def run_once(env, cache_dir, profile=None):
+    env = dict(env, CACHE_DIR=cache_dir)
+    if profile:
+        env['BENCH_PROFILE'] = profile
+    start = time.perf_counter()
+    result = subprocess.run([sys.executable, '-c', CHILD], cwd=SCRIPTS_DIR, env=env,
+                            capture_output=True, text=True)
+    wall = time.perf_counter() - start
+    if result.returncode != 0:
+        print(result.stdout[-2000:])
+        print(result.stderr[-2000:])
+        raise RuntimeError(f"main() 运行失败，退出码 {result.returncode}")
+    paths = sorted(glob.glob(os.path.join(cache_dir, 'metrics', 'run-*.json')))
+    with open(paths[-1], 'r', encoding='utf-8') as f:
+        metrics = json.load(f)
+    return wall, metrics
+
+
+def flatten_metrics(wall, metrics):
+    """一次运行的 {指标: 秒}：wall、total、各阶段，以及按路径汇总的每个 span"""
+    values = {'wall': wall, 'total': metrics['total']}
+    for name, seconds in metrics['stages'].items():
+        values[f"stage:{name}"] = seconds
+    for span in metrics['spans']:
+        if span['parent'] is None:
+            continue
+        path = f"{span['parent']}/{span['name']}"
+        values[path] = values.get(path, 0.0) + span['duration']
+    return values
+
+
+def summarize(runs):
+    names = []
+    for values in runs:
+        names += [name for name in values if name not in names]
+    return {name: {
+        'median': statistics.median(values.get(name, 0.0) for values in runs),
+        'max': max(values.get(name, 0.0) for values in runs),
+    } for name in names}
+
+
+def compare(summary, baseline, threshold):
+    """打印与基线的对比，返回变慢超过阈值的指标"""
+    regressions = []
+    print(f"\n与基线对比（阈值 +{threshold:.0%}）:")
+    for name, stats in summary.items():
+        if name not in baseline:
+            continue
+        old, new = baseline[name], stats['median']
+        change = (new - old) / old if old else 0.0
+        mark = ''
+        if new > old * (1 + threshold) and new - old > MIN_REGRESSION:
+            regressions.append(name)
+            mark = '  <- 回归'
+        print(f"  {name:<52}{old * 1000:>10.1f}ms -> {new * 1000:>8.1f}ms  {change:+7.1%}{mark}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="完整流程的离线基准")
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--replay', help="akshare_replay.py 录制的目录，缺省时使用合成数据")
+    parser.add_argument('--latency', action='store_true', help="按录制时的耗时回放每次调用")
+    parser.add_argument('--warm', action='store_true', help="各次运行共用缓存目录")
+    parser.add_argument('--subscribers', type=int, default=0, help="生成N位订阅者，按关注列表渲染")
+    parser.add_argument('--save', help="把各指标的中位数保存为基线")
+    parser.add_argument('--baseline', help="与之前保存的基线对比")
+    parser.add_argument('--threshold', type=float, default=0.2)
+    parser.add_argument('--profile', help="额外执行一次并把 cProfile 结果写入该文件")
+    args = parser.parse_args()
+
+    recording = akshare_replay.Recording(args.replay)
+    sina = akshare_replay.SinaReplayServer(recording, latency=args.latency).start()
+    stub = SMTPStub().start()
+    env = dict(os.environ, SMTP_HOST='127.0.0.1', SMTP_PORT=str(stub.port), SMTP_STARTTLS='0',
+               SMTP_RATE_LIMIT='0', EMAIL_USER='bench@example.com', EMAIL_PASSWORD='secret',
+               TO_EMAIL='reader@example.com', SINA_QUOTE_URL=sina.url,
+               REPLAY_DIR=args.replay or '', REPLAY_LATENCY='1' if args.latency else '0')
+    env.pop('SUBSCRIBERS_FILE', None)
+    env.pop('SUBSCRIBERS', None)
+    recipients = 1
+    if args.subscribers:
+        env['SUBSCRIBERS'] = json.dumps(make_subscribers(args.subscribers))
+        recipients = args.subscribers
+    if args.warm:
+        env['FORCE_SEND'] = '1'
+
+    root = tempfile.mkdtemp(prefix='bench_pipeline_')
+    runs = []
+    try:
+        for i in range(args.runs):
+            cache_dir = os.path.join(root, 'warm' if args.warm else f"run{i}")
+            sent = len(stub.messages)
+            wall, metrics = run_once(env, cache_dir)
+            if len(stub.messages) - sent != recipients:
+                raise RuntimeError(f"应发送 {recipients} 封邮件，实际 {len(stub.messages) - sent} 封")
+            runs.append(flatten_metrics(wall, metrics))
+        if args.profile:
+            run_once(env, os.path.join(root, 'profile'), profile=os.path.abspath(args.profile))
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+        sina.shutdown()
+        stub.shutdown()
+
+    summary = summarize(runs)
+    source = args.replay or '合成数据'
+    print(f"{args.runs} 次运行（{source}，{'热' if args.warm else '冷'}缓存，{recipients} 位收件人）")
+    print(f"{'指标':<54}{'中位数':>10}{'最大值':>10}")
+    for name, stats in summary.items():
+        print(f"  {name:<52}{stats['median'] * 1000:>8.1f}ms{stats['max'] * 1000:>8.1f}ms")
+
+    if args.profile:
+        print(f"\ncProfile 结果已写入 {args.profile}，累计耗时最高的函数:")
+        pstats.Stats(args.profile).sort_stats('cumulative').print_stats(25)
+
+    # 只有同样配置下的结果才可比
+    config = {'replay': args.replay, 'latency': args.latency, 'warm': args.warm, 'recipients': recipients}
+    if args.save:
+        with open(args.save, 'w', encoding='utf-8') as f:
+            json.dump({'config': config, 'median': {name: stats['median'] for name, stats in summary.items()}},
+                      f, ensure_ascii=False, indent=1)
+        print(f"基线已保存到 {args.save}")
+
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        if baseline.get('config') != config:
+            print(f"注意: 基线的运行配置 {baseline.get('config')} 与本次 {config} 不同")
+        regressions = compare(summary, baseline['median'], args.threshold)
+        if regressions:
+            print(f"有 {len(regressions)} 项指标变慢超过 {args.threshold:.0%}: {', '.join(regressions)}")
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,88 @@
+"""
+嵌套字典 vs QuoteTable 的内存占用和构建/遍历耗时
+
+用随机生成的全市场行情表，分别按原来的逐行 float(...) 方式构建 {代码: {'value','change','change_pct'}}
+和用 extract_source 构建 QuoteTable，测量常驻内存（tracemalloc）、构建耗时以及
+flatten_rule_fields 遍历一遍的耗时。
+
+用法: python benchmarks/bench_quote_table.py [品种数]
+"""
+import os
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'scripts'))
+
+import fetch_and_send  # noqa: E402
+from analysis_rules import flatten_rule_fields  # noqa: E402
+
+
+def make_frame(size, seed=0):
+    rng = np.random.default_rng(seed)
+    price = rng.uniform(2, 300, size).round(2)
+    change = (price * rng.normal(0, 0.02, size)).round(2)
+    return pd.DataFrame({
+        '代码': [f"{i:06d}" for i in range(size)],
+        '最新价': price,
+        '涨跌额': change,
+        '涨跌幅': (change / (price - change) * 100).round(2),
+    })
+
+
+def legacy_quotes(frame, items):
+    """原来的做法：reindex 后逐行转换为字典"""
+    rows = frame.set_index('代码').reindex([spec['symbol'] for spec in items.values()])
+    quotes = {}
+    for key, (_, row) in zip(items, rows.iterrows()):
+        if pd.isna(row['最新价']):
+            continue
+        quotes[key] = {
+            'value': float(row['最新价']),
+            'change': float(row['涨跌额']),
+            'change_pct': float(row['涨跌幅']),
+        }
+    return quotes
+
+
+def measure(func):
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = func()
+    elapsed = time.perf_counter() - start
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, elapsed, current
+
+
+def main():
+    size = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    frame = make_frame(size)
+    fetch_and_send.SOURCE_CODE_COLUMNS.setdefault('bench', '代码')
+    items = {f"S{i}": {'symbol': code} for i, code in enumerate(frame['代码'])}
+
+    legacy, legacy_time, legacy_mem = measure(lambda: legacy_quotes(frame, items))
+    table, table_time, table_mem = measure(lambda: fetch_and_send.extract_source('bench', frame, items))
+    assert len(legacy) == len(table) == size
+
+    start = time.perf_counter()
+    flatten_rule_fields({'market': legacy})
+    legacy_walk = time.perf_counter() - start
+    start = time.perf_counter()
+    flatten_rule_fields({'market': table})
+    table_walk = time.perf_counter() - start
+
+    print(f"{size} 个品种")
+    print(f"{'':<12}{'常驻内存':>12}{'每品种':>10}{'构建':>10}{'遍历':>10}")
+    for name, mem, build, walk in (('嵌套字典', legacy_mem, legacy_time, legacy_walk),
+                                   ('QuoteTable', table_mem, table_time, table_walk)):
+        print(f"{name:<12}{mem / 1024:>10.0f}KB{mem / size:>9.0f}B"
+              f"{build * 1000:>8.1f}ms{walk * 1000:>8.1f}ms")
+    print(f"内存降低 {legacy_mem / table_mem:.1f} 倍，构建加速 {legacy_time / table_time:.1f} 倍")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,302 @@
+"""
+报告渲染的微基准：预编译模板 vs 原先逐段字符串拼接的实现
+
+用同一份样例数据分别渲染多次，比较单份报告的平均耗时，并确认两者输出一致。
+
+用法: python benchmarks/bench_render.py [渲染次数]
+"""
+import os
+import sys
+import timeit
+from datetime import datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'scripts'))
+
+import fetch_and_send
+import report_template
+
+
+def quote(value, change, change_pct):
+    return {'value': value, 'change': change, 'change_pct': change_pct}
+
+
+SAMPLE_DATA = {
+    'domestic_market': {
+        'SHANGHAI': quote(3050.12, 12.3, 0.4),
+        'SZ_COMP': quote(9800.5, -20.1, -0.2),
+        'CHINEXT': quote(1900.2, 5.1, 0.27),
+        'RISING_STOCKS': 3200,
+        'FALLING_STOCKS': 1700,
+        'LIMIT_UP': 60,
+        'LIMIT_DOWN': 5,
+    },
+    'capital_flows': {
+        'NORTHBOUND_NET': 35.2,
+        'NORTHBOUND_SH': 20.1,
+        'NORTHBOUND_SZ': 15.1,
+        'TURNOVER': 10500.3,
+        'MARGIN_TRADING': 15500,
+    },
+    'global_markets': {
+        'USD/CNY': quote(7.18, -0.01, -0.14),
+        'USD_INDEX': quote(104.1, -0.2, -0.19),
+        'S&P_500': quote(5000.1, 30, 0.6),
+        'NASDAQ': quote(16000, 100, 0.63),
+        'NIKKEI': quote(36000, -50, -0.14),
+        'A50_INDEX': quote(12000, 30, 0.25),
+        'VIX': quote(15.2, -0.3, -1.9),
+    },
+    'policy_sentiment': {
+        'RECENT_POLICY': '稳增长',
+        'KEY_NEWS': '降准',
+        'SECTOR_PERFORMANCE': {'AI_CHIP': 2.5, 'NEW_ENERGY': -1.5, 'CONSUMER': 0.3},
+    },
+}
+
+
+def legacy_create_email_html(data, analysis):
+    """
+    创建HTML格式的邮件内容，按照四个部分组织
+    """
+    today = datetime.now().strftime("%Y-%m-%d")
+    
+    # 先处理分析文本，将换行符替换为HTML换行标签
+    analysis_html = analysis.replace('\n', '<br>')
+    
+    html_content = f"""
+    <html>
+    <head>
+        <style>
+            body {{ font-family: Arial, sans-serif; line-height: 1.6; color: #333; max-width: 900px; margin: 0 auto; }}
+            .header {{ background: linear-gradient(135deg, #667eea 0%, #764ba2 100%); color: white; padding: 20px; border-radius: 8px; margin-bottom: 20px; }}
+            .section {{ margin-bottom: 25px; padding: 15px; border: 1px solid #e0e0e0; border-radius: 8px; }}
+            .section h2 {{ color: #4a4a4a; border-bottom: 2px solid #667eea; padding-bottom: 8px; }}
+            table {{ width: 100%; border-collapse: collapse; margin: 15px 0; }}
+            th, td {{ padding: 12px; text-align: left; border-bottom: 1px solid #ddd; }}
+            th {{ background-color: #f8f9fa; }}
+            .positive {{ color: #28a745; font-weight: bold; }}
+            .negative {{ color: #dc3545; font-weight: bold; }}
+            .neutral {{ color: #6c757d; }}
+            .analysis {{ background-color: #f8f9fa; padding: 20px; border-radius: 8px; }}
+            .highlight {{ background-color: #fff3cd; padding: 15px; border-radius: 6px; border-left: 4px solid #ffc107; }}
+            .footer {{ text-align: center; margin-top: 30px; color: #6c757d; font-size: 14px; }}
+            .section-title {{ font-size: 1.5em; color: #4a4a4a; margin-top: 30px; margin-bottom: 15px; padding-bottom: 10px; border-bottom: 2px solid #667eea; }}
+        </style>
+    </head>
+    <body>
+        <div class="header">
+            <h1>📈 新手投资者每日必看市场报告</h1>
+            <p>生成时间: {datetime.now().strftime("%Y-%m-%d %H:%M:%S")}</p>
+        </div>
+    """
+    
+    # 1. 国内市场数据
+    html_content += """
+        <div class="section">
+            <div class="section-title">📊 国内市场（核心晴雨表）</div>
+            <table>
+                <tr><th>指标</th><th>数值</th><th>涨跌</th><th>涨跌幅</th></tr>
+    """
+    domestic = data['domestic_market']
+    for index in ['SHANGHAI', 'SZ_COMP', 'CHINEXT']:
+        values = domestic[index]
+        change_class = "positive" if values['change'] > 0 else "negative" if values['change'] < 0 else "neutral"
+        change_sign = "+" if values['change'] > 0 else ""
+        index_name = {
+            'SHANGHAI': '上证指数',
+            'SZ_COMP': '深证成指',
+            'CHINEXT': '创业板指'
+        }.get(index, index)
+        html_content += f"""
+            <tr>
+                <td>{index_name}</td>
+                <td>{values['value']}</td>
+                <td class="{change_class}">{change_sign}{values['change']}</td>
+                <td class="{change_class}">{change_sign}{values['change_pct']}%</td>
+            </tr>
+        """
+    
+    # 添加涨跌家数数据
+    html_content += f"""
+            <tr><td colspan="4"><hr></td></tr>
+            <tr>
+                <td>上涨家数</td>
+                <td colspan="3" class="positive">{domestic['RISING_STOCKS']}家</td>
+            </tr>
+            <tr>
+                <td>下跌家数</td>
+                <td colspan="3" class="negative">{domestic['FALLING_STOCKS']}家</td>
+            </tr>
+            <tr>
+                <td>涨停家数</td>
+                <td colspan="3" class="positive">{domestic['LIMIT_UP']}家</td>
+            </tr>
+            <tr>
+                <td>跌停家数</td>
+                <td colspan="3" class="negative">{domestic['LIMIT_DOWN']}家</td>
+            </tr>
+    """
+    html_content += "</table></div>"
+    
+    # 2. 资金动向数据
+    html_content += """
+        <div class="section">
+            <div class="section-title">💰 资金动向（市场发动机）</div>
+            <table>
+                <tr><th>指标</th><th>数值</th><th>说明</th></tr>
+    """
+    capital = data['capital_flows']
+    html_content += f"""
+            <tr>
+                <td>北向资金净流入</td>
+                <td class="{'positive' if capital['NORTHBOUND_NET'] > 0 else 'negative'}">{capital['NORTHBOUND_NET']}亿元</td>
+                <td>外资流向指标，正值表示净流入</td>
+            </tr>
+            <tr>
+                <td>沪股通净流入</td>
+                <td>{capital['NORTHBOUND_SH']}亿元</td>
+                <td>外资在上海市场的流向</td>
+            </tr>
+            <tr>
+                <td>深股通净流入</td>
+                <td>{capital['NORTHBOUND_SZ']}亿元</td>
+                <td>外资在深圳市场的流向</td>
+            </tr>
+            <tr>
+                <td>两市成交额</td>
+                <td>{capital['TURNOVER']}亿元</td>
+                <td>市场活跃度指标</td>
+            </tr>
+            <tr>
+                <td>融资融券余额</td>
+                <td>{capital['MARGIN_TRADING']}亿元</td>
+                <td>杠杆资金水平</td>
+            </tr>
+    """
+    html_content += "</table></div>"
+    
+    # 3. 全球市场数据
+    html_content += """
+        <div class="section">
+            <div class="section-title">🌍 全球市场（外部环境）</div>
+            <table>
+                <tr><th>指标</th><th>数值</th><th>涨跌</th><th>涨跌幅</th></tr>
+    """
+    global_markets = data['global_markets']
+    for indicator in ['USD/CNY', 'USD_INDEX', 'S&P_500', 'NASDAQ', 'NIKKEI', 'A50_INDEX', 'VIX']:
+        if indicator in global_markets:
+            values = global_markets[indicator]
+            change_class = "positive" if values['change'] > 0 else "negative" if values['change'] < 0 else "neutral"
+            change_sign = "+" if values['change'] > 0 else ""
+            indicator_name = {
+                'USD/CNY': '美元/人民币',
+                'USD_INDEX': '美元指数',
+                'S&P_500': '标普500指数',
+                'NASDAQ': '纳斯达克指数',
+                'NIKKEI': '日经225指数',
+                'A50_INDEX': '富时A50指数',
+                'VIX': '恐慌指数(VIX)'
+            }.get(indicator, indicator)
+            html_content += f"""
+                <tr>
+                    <td>{indicator_name}</td>
+                    <td>{values['value']}</td>
+                    <td class="{change_class}">{change_sign}{values['change']}</td>
+                    <td class="{change_class}">{change_sign}{values['change_pct']}%</td>
+                </tr>
+            """
+    html_content += "</table></div>"
+    
+    # 4. 政策与情绪数据
+    html_content += """
+        <div class="section">
+            <div class="section-title">📰 政策与情绪（方向盘与催化剂）</div>
+            <table>
+                <tr><th>类别</th><th>内容</th></tr>
+                <tr>
+                    <td>近期政策焦点</td>
+                    <td>{}</td>
+                </tr>
+                <tr>
+                    <td>重要新闻</td>
+                    <td>{}</td>
+                </tr>
+            </table>
+    """.format(data['policy_sentiment']['RECENT_POLICY'], data['policy_sentiment']['KEY_NEWS'])
+    
+    # 板块表现
+    html_content += """
+            <h3>📊 板块表现</h3>
+            <table>
+                <tr><th>板块</th><th>涨跌幅</th><th>表现评价</th></tr>
+    """
+    sectors = data['policy_sentiment']['SECTOR_PERFORMANCE']
+    for sector, performance in sectors.items():
+        sector_name = {
+            'AI_CHIP': '人工智能芯片',
+            'NEW_ENERGY': '新能源',
+            'CONSUMER': '食品饮料'
+        }.get(sector, sector)
+        
+        change_class = "positive" if performance > 0 else "negative" if performance < 0 else "neutral"
+        change_sign = "+" if performance > 0 else ""
+        
+        if performance > 2:
+            evaluation = "表现强势，受政策或资金青睐"
+        elif performance < -1:
+            evaluation = "表现疲软，需关注原因"
+        else:
+            evaluation = "表现平稳"
+            
+        html_content += f"""
+            <tr>
+                <td>{sector_name}</td>
+                <td class="{change_class}">{change_sign}{performance}%</td>
+                <td>{evaluation}</td>
+            </tr>
+        """
+    html_content += "</table></div>"
+    
+    # 添加市场分析和解读
+    html_content += f"""
+        <div class="analysis">
+            <div class="section-title">🧠 市场分析与解读</div>
+            <div class="highlight">
+                {analysis_html}
+            </div>
+        </div>
+    """
+    
+    html_content += """
+        <div class="footer">
+            <p>⚠️ 免责声明: 本报告仅供参考，不构成投资建议。市场有风险，投资需谨慎。</p>
+            <p>📧 本邮件由GitHub Actions自动生成并发送</p>
+        </div>
+    </body>
+    </html>
+    """
+    
+    return html_content
+
+
+def main():
+    number = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    analysis = fetch_and_send.generate_market_analysis(SAMPLE_DATA)
+    generated_at = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+    legacy = legacy_create_email_html(SAMPLE_DATA, analysis)
+    current = report_template.render_report(SAMPLE_DATA, analysis, generated_at)
+    same = legacy.replace(legacy.split('生成时间: ')[1].split('<')[0], generated_at) == current
+    print(f"输出一致: {same}")
+
+    legacy_time = timeit.timeit(lambda: legacy_create_email_html(SAMPLE_DATA, analysis), number=number)
+
+    template_time = timeit.timeit(
+        lambda: report_template.render_report(SAMPLE_DATA, analysis, generated_at), number=number
+    )
+    print(f"原实现:     平均每份 {legacy_time / number * 1e6:8.1f} us")
+    print(f"预编译模板: 平均每份 {template_time / number * 1e6:8.1f} us")
+    print(f"提速 {legacy_time / template_time:.1f} 倍")
+
+if __name__ == '__main__':
+    main()
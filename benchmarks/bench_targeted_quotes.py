@@ -0,0 +1,112 @@
+"""
+单品种报价接口 vs 全市场下载的基准测试
+
+在本地启动一个回放服务：
+  /list=...      返回录制的新浪批量报价（每个品种一行）
+  /us_spot?page= 返回录制格式的美股列表分页（每页20条，与 stock_us_spot 的翻页方式一致）
+分别测量两种方式取到标普500的耗时和峰值内存。
+
+用法: python benchmarks/bench_targeted_quotes.py [页数]
+"""
+import json
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'scripts'))
+
+PAGE_SIZE = 20
+
+SINA_LINES = {
+    'gb_$inx': '标普500指数,5026.61,0.57,2024-02-09 16:14:00,28.70,5004.17,5030.06,5000.34',
+    'gb_ixic': '纳斯达克,15990.66,1.25,2024-02-09 16:14:00,196.95,15865.42,16000.00,15860.00',
+    'znb_NKY': '日经225指数,36897.42,34.14,0.09,36900.00,36700.00',
+    'znb_VIX': 'VIX恐慌指数,12.93,-0.13,-1.00,13.20,12.80',
+    'DINIW': '06:00:00,104.0900,104.1200,104.1300,0,104.13,104.30,103.95,104.09,美元指数',
+    'hf_CHA50CFD': '11862.00,,11860.00,11865.00,11900.00,11800.00,15:00:00,11820.00,11830.00',
+}
+
+
+def us_spot_page(page):
+    rows = []
+    for i in range(PAGE_SIZE):
+        n = (page - 1) * PAGE_SIZE + i
+        symbol = '.INX' if n == 0 else f"S{n:05d}"
+        rows.append({
+            'name': f"Stock {n}", 'cname': f"股票{n}", 'category': '科技', 'symbol': symbol,
+            'price': '101.25', 'diff': '1.25', 'chg': '1.25', 'preclose': '100.00',
+            'open': '100.50', 'high': '102.00', 'low': '99.80', 'amplitude': '2.20%',
+            'volume': '1234567', 'mktcap': '123456789012', 'pe': '25.3', 'market': 'NASDAQ',
+            'category_id': '1',
+        })
+    return {'count': PAGE_SIZE, 'data': rows}
+
+
+class ReplayHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # 缓冲响应头和响应体一次写出，避免小包被 Nagle 算法拖慢
+    wbufsize = -1
+
+    def do_GET(self):
+        if self.path.startswith('/list='):
+            codes = self.path[len('/list='):].split(',')
+            body = ''.join(f'var hq_str_{c}="{SINA_LINES.get(c, "")}";\n' for c in codes).encode('gbk')
+        else:
+            page = int(self.path.rsplit('=', 1)[1])
+            body = json.dumps(us_spot_page(page)).encode()
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def measure(func):
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = func()
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, elapsed, peak
+
+
+def main():
+    pages = int(sys.argv[1]) if len(sys.argv) > 1 else 300
+    server = ThreadingHTTPServer(('127.0.0.1', 0), ReplayHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{server.server_address[1]}"
+
+    os.environ['SINA_QUOTE_URL'] = f"{base}/list="
+    import fetch_and_send
+    import pandas as pd
+
+    session = fetch_and_send.get_http_session()
+
+    def full_market():
+        rows = []
+        for page in range(1, pages + 1):
+            rows.extend(session.get(f"{base}/us_spot?page={page}").json()['data'])
+        df = pd.DataFrame(rows)
+        return df[df['symbol'] == '.INX'].iloc[0]['price']
+
+    def targeted():
+        codes = [spec['quote'] for spec in fetch_and_send.INDICATORS.values() if spec.get('quote')]
+        return fetch_and_send.fetch_sina_quotes(codes)['gb_$inx']['value']
+
+    _, full_time, full_peak = measure(full_market)
+    _, target_time, target_peak = measure(targeted)
+    server.shutdown()
+
+    print(f"全市场下载({pages}页): {full_time * 1000:9.1f} ms, 峰值内存 {full_peak / 1024:9.1f} KiB")
+    print(f"单品种批量报价:      {target_time * 1000:9.1f} ms, 峰值内存 {target_peak / 1024:9.1f} KiB")
+    print(f"耗时降低 {full_time / target_time:.0f} 倍, 峰值内存降低 {full_peak / target_peak:.0f} 倍")
+
+
+if __name__ == '__main__':
+    main()
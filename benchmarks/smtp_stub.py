@@ -0,0 +1,111 @@
+"""
+本地SMTP替身，用于离线测试和基准测试邮件投递
+
+只实现投递需要的最小命令集（EHLO/HELO、AUTH、MAIL、RCPT、DATA、RSET、NOOP、QUIT），
+不做STARTTLS，收到的邮件保存在 server.messages 中。
+connect_delay 模拟每次建连的握手和登录耗时，fail_first 让前N次 MAIL 返回 421 以测试重试，
+auth_fail 让所有 AUTH 返回 535（密码错误），auth_attempts 记录收到的登录次数；
+auth_methods 为 EHLO 中声明的认证方式，为空时不声明 AUTH 扩展。
+
+单独运行: python benchmarks/smtp_stub.py [端口]
+"""
+import socketserver
+import sys
+import threading
+import time
+
+
+class SMTPStubHandler(socketserver.StreamRequestHandler):
+
+    def reply(self, line):
+        self.wfile.write(f"{line}\r\n".encode())
+
+    def handle(self):
+        server = self.server
+        time.sleep(server.connect_delay)
+        with server.lock:
+            server.connections += 1
+        self.reply("220 stub ESMTP ready")
+        sender, recipients = None, []
+        while True:
+            raw = self.rfile.readline()
+            if not raw:
+                return
+            line = raw.decode('utf-8', 'replace').rstrip('\r\n')
+            command = line.split(' ', 1)[0].upper()
+            if command == 'EHLO':
+                auth = f"250-AUTH {server.auth_methods}\r\n" if server.auth_methods else ""
+                self.wfile.write(f"250-stub\r\n{auth}250 8BITMIME\r\n".encode())
+            elif command == 'HELO':
+                self.reply("250 stub")
+            elif command == 'AUTH':
+                with server.lock:
+                    server.auth_attempts += 1
+                if server.auth_fail:
+                    self.reply("535 5.7.8 Authentication credentials invalid")
+                else:
+                    self.reply("235 2.7.0 Authentication successful")
+            elif command == 'MAIL':
+                with server.lock:
+                    fail = server.fail_first > 0
+                    if fail:
+                        server.fail_first -= 1
+                if fail:
+                    self.reply("421 4.7.0 Try again later")
+                    continue
+                sender, recipients = line[10:].strip('<>'), []
+                self.reply("250 OK")
+            elif command == 'RCPT':
+                recipients.append(line[8:].strip('<>'))
+                self.reply("250 OK")
+            elif command == 'DATA':
+                self.reply("354 End data with <CR><LF>.<CR><LF>")
+                body = []
+                while True:
+                    data_line = self.rfile.readline()
+                    if not data_line or data_line == b".\r\n":
+                        break
+                    body.append(data_line)
+                with server.lock:
+                    server.messages.append((sender, recipients, b''.join(body)))
+                self.reply("250 OK queued")
+            elif command == 'RSET':
+                sender, recipients = None, []
+                self.reply("250 OK")
+            elif command == 'NOOP':
+                self.reply("250 OK")
+            elif command == 'QUIT':
+                self.reply("221 Bye")
+                return
+            else:
+                self.reply("502 Command not implemented")
+
+
+class SMTPStub(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, port=0, connect_delay=0.0, fail_first=0, auth_fail=False, auth_methods='PLAIN LOGIN'):
+        super().__init__(('127.0.0.1', port), SMTPStubHandler)
+        self.connect_delay = connect_delay
+        self.fail_first = fail_first
+        self.auth_fail = auth_fail
+        self.auth_methods = auth_methods
+        self.auth_attempts = 0
+        self.messages = []
+        self.connections = 0
+        self.lock = threading.Lock()
+
+    @property
+    def port(self):
+        return self.server_address[1]
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+
+if __name__ == '__main__':
+    stub = SMTPStub(int(sys.argv[1]) if len(sys.argv) > 1 else 2525)
+    print(f"SMTP stub listening on 127.0.0.1:{stub.port}")
+    stub.serve_forever()
@@ -0,0 +1,537 @@
+"""
+声明式的市场分析规则及其向量化执行引擎
+
+规则以数据的形式描述（字段、阈值、文案），编译后在 NumPy 数组上求值：
+- 单日报告：把当天的数据看作长度为1的数组，按规则顺序输出分析文本；
+- 历史回测：把历史上每天的数据排成数组，一次调用算出每条信号在所有交易日是否触发，
+  并统计触发后目标指数的表现。
+
+字段命名与 flatten_rule_fields 一致：行情类指标为 '<指标>.value/change/change_pct'，
+计数/金额类指标直接用指标名，板块为 'SECTOR_PERFORMANCE.<板块>'，
+滚动统计为 'stats.<序列>.<统计量>'。
+"""
+import operator
+from collections.abc import Mapping
+
+import numpy as np
+
+# 板块的中文名称；CONSUMER 按东方财富"食品饮料"行业板块计算（见 fetch_and_send.SECTOR_BOARDS），名称与之一致
+SECTOR_NAMES = {
+    'AI_CHIP': '人工智能芯片',
+    'NEW_ENERGY': '新能源',
+    'CONSUMER': '食品饮料'
+}
+
+# 板块表现的评价阈值和评语，分析文本与HTML报告共用
+SECTOR_STRONG_PCT = 2
+SECTOR_WEAK_PCT = -1
+SECTOR_STRONG_TEXT = "表现强势，受政策或资金青睐"
+SECTOR_WEAK_TEXT = "表现疲软，需关注原因"
+SECTOR_STEADY_TEXT = "表现平稳"
+
+
+def sector_evaluation(performance):
+    """返回板块涨跌幅对应的评语"""
+    if performance > SECTOR_STRONG_PCT:
+        return SECTOR_STRONG_TEXT
+    if performance < SECTOR_WEAK_PCT:
+        return SECTOR_WEAK_TEXT
+    return SECTOR_STEADY_TEXT
+
+# ForEach 中代表当前元素的字段名
+ITEM_FIELD = '$item'
+
+
+class Expr:
+    """字段表达式，可以在标量或 NumPy 数组上求值"""
+
+    def fields(self):
+        raise NotImplementedError
+
+    def __call__(self, env):
+        raise NotImplementedError
+
+    def _binary(self, op, other, reverse=False):
+        other = other if isinstance(other, Expr) else Const(other)
+        return BinOp(op, other, self) if reverse else BinOp(op, self, other)
+
+    def __gt__(self, other): return self._binary(operator.gt, other)
+    def __ge__(self, other): return self._binary(operator.ge, other)
+    def __lt__(self, other): return self._binary(operator.lt, other)
+    def __le__(self, other): return self._binary(operator.le, other)
+    def __ne__(self, other): return self._binary(operator.ne, other)
+    def __and__(self, other): return self._binary(operator.and_, other)
+    def __or__(self, other): return self._binary(operator.or_, other)
+    def __add__(self, other): return self._binary(operator.add, other)
+    def __sub__(self, other): return self._binary(operator.sub, other)
+    def __mul__(self, other): return self._binary(operator.mul, other)
+    def __truediv__(self, other): return self._binary(operator.truediv, other)
+    def __radd__(self, other): return self._binary(operator.add, other, reverse=True)
+    def __rsub__(self, other): return self._binary(operator.sub, other, reverse=True)
+    def __rmul__(self, other): return self._binary(operator.mul, other, reverse=True)
+    def __rtruediv__(self, other): return self._binary(operator.truediv, other, reverse=True)
+
+    __hash__ = object.__hash__
+
+
+class F(Expr):
+    """引用一个数据字段"""
+
+    def __init__(self, name):
+        self.name = name
+
+    def fields(self):
+        return {self.name}
+
+    def __call__(self, env):
+        return env[self.name]
+
+
+class Const(Expr):
+    def __init__(self, value):
+        self.value = value
+
+    def fields(self):
+        return set()
+
+    def __call__(self, env):
+        return self.value
+
+
+class BinOp(Expr):
+    def __init__(self, op, left, right):
+        self.op = op
+        self.left = left
+        self.right = right
+
+    def fields(self):
+        return self.left.fields() | self.right.fields()
+
+    def __call__(self, env):
+        return self.op(self.left(env), self.right(env))
+
+
+ITEM = F(ITEM_FIELD)
+
+
+class Rule:
+    """
+    一条分析规则：条件满足时输出一行文案
+
+    when 为None表示无条件输出；params 为文案中的占位符及其取值表达式。
+    规则引用的任一字段缺失时，该规则既不触发也不输出。
+    """
+
+    def __init__(self, name, when, text, **params):
+        self.name = name
+        self.when = when
+        self.text = text
+        self.params = params
+
+    def fields(self):
+        fields = set(self.when.fields()) if self.when is not None else set()
+        for expr in self.params.values():
+            fields |= expr.fields()
+        return fields
+
+
+class Text(Rule):
+    """固定文案（章节标题、投资建议等）"""
+
+    def __init__(self, text):
+        super().__init__(None, None, text)
+
+
+class FirstMatch:
+    """依次检查若干规则，只输出第一条满足条件的（相当于 if/elif/else）"""
+
+    def __init__(self, *rules):
+        self.rules = rules
+
+    def fields(self):
+        fields = set()
+        for rule in self.rules:
+            fields |= rule.fields()
+        return fields
+
+
+class ForEach:
+    """
+    对所有以 prefix 开头的字段逐个应用同一组 FirstMatch 规则
+
+    规则中用 ITEM 引用当前字段的值，文案中的 {name} 为 labels 中对应的名称。
+    """
+
+    def __init__(self, prefix, *rules, header=None, labels=None):
+        self.prefix = prefix
+        self.group = FirstMatch(*rules)
+        self.header = header
+        self.labels = labels or {}
+
+
+# 与报告中"市场分析与解读"一节一一对应的规则表
+MARKET_RULES = [
+    # 1. 国内市场分析
+    Text("# 📊 国内市场分析（核心晴雨表）"),
+    FirstMatch(
+        Rule('大盘指数双双上涨', (F('SHANGHAI.change_pct') > 0) & (F('SZ_COMP.change_pct') > 0),
+             "✅ **大盘指数双双上涨** - 上证指数和深证成指均收涨，市场整体情绪积极。"),
+        Rule('大盘指数双双下跌', (F('SHANGHAI.change_pct') < 0) & (F('SZ_COMP.change_pct') < 0),
+             "⚠️ **大盘指数双双下跌** - 市场整体表现疲软，需要关注下跌原因和后续走势。"),
+        Rule('大盘指数分化', None,
+             "🔸 **大盘指数分化** - 主要指数走势不一，显示市场内部结构分化。"),
+    ),
+    FirstMatch(
+        Rule('上证指数位于20日均线上方',
+             (F('stats.SHANGHAI.ma20') != 0) & (F('SHANGHAI.value') >= F('stats.SHANGHAI.ma20')),
+             "📊 **上证指数位于20日均线上方** - 20日均线 {ma20:.2f}，偏离 {deviation:+.2f}%",
+             ma20=F('stats.SHANGHAI.ma20'),
+             deviation=(F('SHANGHAI.value') / F('stats.SHANGHAI.ma20') - 1) * 100),
+        Rule('上证指数位于20日均线下方', F('stats.SHANGHAI.ma20') != 0,
+             "📊 **上证指数位于20日均线下方** - 20日均线 {ma20:.2f}，偏离 {deviation:+.2f}%",
+             ma20=F('stats.SHANGHAI.ma20'),
+             deviation=(F('SHANGHAI.value') / F('stats.SHANGHAI.ma20') - 1) * 100),
+    ),
+    FirstMatch(
+        Rule('市场普涨格局', F('RISING_STOCKS') / (F('RISING_STOCKS') + F('FALLING_STOCKS')) * 100 > 60,
+             "✅ **市场普涨格局** - 上涨家数占比超过60%，市场赚钱效应较好。"),
+        Rule('市场普跌格局', F('RISING_STOCKS') / (F('RISING_STOCKS') + F('FALLING_STOCKS')) * 100 < 40,
+             "⚠️ **市场普跌格局** - 下跌家数占比较多，市场整体情绪偏谨慎。"),
+        Rule('市场涨跌互现', None,
+             "🔸 **市场涨跌互现** - 上涨和下跌家数基本持平，市场呈现结构性行情。"),
+    ),
+    Rule(None, None, "📈 **涨停家数**: {limit_up}家 | 📉 **跌停家数**: {limit_down}家",
+         limit_up=F('LIMIT_UP'), limit_down=F('LIMIT_DOWN')),
+    FirstMatch(
+        Rule('市场炒作热情高', (F('LIMIT_UP') > 50) & (F('LIMIT_DOWN') < 10),
+             "✅ **市场炒作热情高** - 涨停家数较多而跌停家数较少，显示市场风险偏好较强。"),
+        Rule('市场恐慌情绪上升', (F('LIMIT_UP') < 20) & (F('LIMIT_DOWN') > 20),
+             "⚠️ **市场恐慌情绪上升** - 跌停家数明显多于涨停家数，需要警惕市场风险。"),
+    ),
+
+    # 2. 资金动向分析
+    Text("\n# 💰 资金动向分析（市场发动机）"),
+    FirstMatch(
+        Rule('北向资金大幅净流入', F('NORTHBOUND_NET') > 30,
+             "✅ **北向资金大幅净流入** - '聪明钱'大幅流入，通常对市场有积极影响，特别是其重点布局的板块。"),
+        Rule('北向资金大幅净流出', F('NORTHBOUND_NET') < -30,
+             "⚠️ **北向资金大幅净流出** - 外资流出可能对市场构成压力，需要关注流出原因和持续性。"),
+        Rule('北向资金小幅波动', None,
+             "🔸 **北向资金小幅波动** - 外资流向对市场影响中性。"),
+    ),
+    FirstMatch(
+        Rule('市场成交活跃', F('TURNOVER') > 10000,
+             "✅ **市场成交活跃** - 成交额超过万亿，显示市场参与度高，资金活跃。"),
+        Rule('市场成交萎缩', F('TURNOVER') < 8000,
+             "⚠️ **市场成交萎缩** - 成交额较低，可能反映市场观望情绪浓厚。"),
+    ),
+    Rule(None, F('stats.TURNOVER.ma20') != 0, "📊 **成交额较20日均值**: {ratio:+.1f}%",
+         ratio=(F('TURNOVER') / F('stats.TURNOVER.ma20') - 1) * 100),
+    Rule(None, None, "📊 **两融余额**: {margin}亿元 - 杠杆资金水平{leverage:.1f}%",
+         margin=F('MARGIN_TRADING'), leverage=(F('MARGIN_TRADING') - 15000) / 500),
+
+    # 3. 全球市场分析
+    Text("\n# 🌍 全球市场分析（外部环境）"),
+    FirstMatch(
+        Rule('美元走弱，人民币相对走强', (F('USD_INDEX.change') < 0) & (F('USD/CNY.change') < 0),
+             "✅ **美元走弱，人民币相对走强** - 美元指数下跌，同时人民币对美元升值，这通常有利于A股市场，特别是那些有美元负债和进口依赖型企业。"),
+        Rule('美元走强，人民币承压', (F('USD_INDEX.change') > 0) & (F('USD/CNY.change') > 0),
+             "⚠️ **美元走强，人民币承压** - 美元指数上涨带动人民币贬值，这可能对A股市场构成压力，特别是外资可能会流出。"),
+    ),
+    FirstMatch(
+        Rule('美股大幅上涨', F('S&P_500.change_pct') > 0.5,
+             "✅ **美股大幅上涨** - 隔夜美股表现强劲，特别是纳斯达克指数上涨明显，这对今日A股科技板块情绪有积极影响。"),
+        Rule('美股显著下跌', F('S&P_500.change_pct') < -0.5,
+             "⚠️ **美股显著下跌** - 隔夜美股下跌可能对今日A股开盘造成压力，需要关注市场风险偏好变化。"),
+    ),
+    Rule(None, None, "📈 **富时A50指数**: {value} ({change_pct:+.2f}%) - 作为A股先行指标，其表现对开盘有预示作用。",
+         value=F('A50_INDEX.value'), change_pct=F('A50_INDEX.change_pct')),
+    FirstMatch(
+        Rule('市场恐慌指数较低', F('VIX.value') < 18,
+             "✅ **市场恐慌指数较低** - VIX指数低于18，显示市场情绪稳定，风险偏好较高。"),
+        Rule('市场恐慌指数升高', F('VIX.value') > 25,
+             "⚠️ **市场恐慌指数升高** - VIX指数超过25，显示市场担忧情绪上升，需要谨慎操作。"),
+    ),
+    Rule(None, F('stats.VIX.count') >= 20, "📊 **VIX历史分位**: 处于近{count}个交易日的{rank:.0f}%分位",
+         count=F('stats.VIX.count'), rank=F('stats.VIX.pct_rank')),
+
+    # 4. 政策与情绪分析
+    Text("\n# 📰 政策与情绪分析（方向盘与催化剂）"),
+    Rule(None, None, "🏛️ **近期政策焦点**: {policy}", policy=F('RECENT_POLICY')),
+    Rule(None, None, "📢 **重要新闻**: {news}", news=F('KEY_NEWS')),
+    ForEach(
+        'SECTOR_PERFORMANCE.',
+        Rule('板块表现强势', ITEM > SECTOR_STRONG_PCT,
+             "  ✅ {name}: +{performance:.2f}% - " + SECTOR_STRONG_TEXT, performance=ITEM),
+        Rule('板块表现疲软', ITEM < SECTOR_WEAK_PCT,
+             "  ⚠️ {name}: {performance:.2f}% - " + SECTOR_WEAK_TEXT, performance=ITEM),
+        Rule('板块表现平稳', None,
+             "  🔸 {name}: {performance:+.2f}% - " + SECTOR_STEADY_TEXT, performance=ITEM),
+        header="📊 **板块表现**:",
+        labels=SECTOR_NAMES,
+    ),
+
+    # 投资建议
+    Text("\n# 💡 今日投资建议"),
+    Text("1. **关注北向资金流向** - 密切跟踪外资动向，特别是其重点增持的板块"),
+    Text("2. **注意板块轮动** - 市场可能在不同板块间轮动，避免追高"),
+    Text("3. **控制仓位风险** - 在不确定性中保持适度仓位，留有进退空间"),
+    Text("4. **关注政策受益板块** - 特别是人工智能、新能源等受政策支持的领域"),
+    Text("\n---"),
+    Text("**免责声明**: 本分析仅供参考，不构成投资建议。市场有风险，投资需谨慎。"),
+]
+
+
+def flatten_rule_fields(data):
+    """
+    把报告数据展开为规则使用的 {字段: 标量}
+
+    缺失或为None的数据不会出现在结果中，引用它们的规则会被跳过
+    """
+    fields = {}
+    for category, items in data.items():
+        if not isinstance(items, Mapping):
+            continue
+        if category == 'stats':
+            for series, summary in items.items():
+                for name, value in summary.items():
+                    if value is not None:
+                        fields[f"stats.{series}.{name}"] = value
+            continue
+        if hasattr(items, 'flat_items'):
+            # QuoteTable：按列展开
+            for key, sub_key, value in items.flat_items():
+                if value is None:
+                    continue
+                fields[key if sub_key is None else f"{key}.{sub_key}"] = value
+            continue
+        for key, item in items.items():
+            if isinstance(item, Mapping):
+                for sub_key, value in item.items():
+                    if value is not None:
+                        fields[f"{key}.{sub_key}"] = value
+            elif item is not None:
+                fields[key] = item
+    return fields
+
+
+def _as_array(value):
+    if isinstance(value, (int, float, np.number)) and not isinstance(value, bool):
+        return np.array([value], dtype=np.float64)
+    return np.array([value], dtype=object)
+
+
+class _ArrayEnv(dict):
+    """缺失字段返回全NaN数组的求值环境"""
+
+    def __init__(self, arrays, length):
+        super().__init__(arrays)
+        self.length = length
+
+    def __missing__(self, name):
+        return np.full(self.length, np.nan)
+
+
+class RuleEngine:
+    """编译后的规则集"""
+
+    def __init__(self, rules):
+        self.rules = rules
+        self.labels = {}
+        self.fields = set()
+        for item in rules:
+            if isinstance(item, ForEach):
+                self.labels.update(item.labels)
+            group = item.group if isinstance(item, ForEach) else item
+            self.fields |= {f for f in group.fields() if f != ITEM_FIELD}
+
+    @staticmethod
+    def _valid(env, fields):
+        """每一行上所有字段是否都存在且为有限数值"""
+        mask = np.ones(env.length, dtype=bool)
+        for name in fields:
+            if name not in env:
+                return np.zeros(env.length, dtype=bool)
+            values = env[name]
+            if values.dtype == object:
+                mask &= np.array([v is not None for v in values], dtype=bool)
+            else:
+                mask &= np.isfinite(values)
+        return mask
+
+    def _evaluate_group(self, env, rules):
+        """按 if/elif/else 语义求出组内每条规则触发的布尔数组"""
+        fields = set()
+        for rule in rules:
+            fields |= rule.fields()
+        remaining = self._valid(env, fields)
+        fired = []
+        with np.errstate(divide='ignore', invalid='ignore'):
+            for rule in rules:
+                if rule.when is None:
+                    hit = remaining.copy()
+                else:
+                    hit = remaining & np.asarray(rule.when(env), dtype=bool)
+                remaining = remaining & ~hit
+                fired.append(hit)
+        return fired
+
+    def _walk(self, env):
+        """依次产出 (规则, ForEach绑定的字段, 元素名, 触发数组)"""
+        for item in self.rules:
+            if isinstance(item, ForEach):
+                keys = [name for name in env
+                        if name.startswith(item.prefix) and '.' not in name[len(item.prefix):]]
+                # 与原先的实现一致，没有元素时也输出标题
+                if item.header is not None:
+                    yield Text(item.header), None, None, np.ones(env.length, dtype=bool)
+                for key in keys:
+                    item_env = _ArrayEnv(env, env.length)
+                    item_env[ITEM_FIELD] = env[key]
+                    for rule, hit in zip(item.group.rules, self._evaluate_group(item_env, item.group.rules)):
+                        yield rule, key, key[len(item.prefix):], hit
+            else:
+                rules = item.rules if isinstance(item, FirstMatch) else (item,)
+                for rule, hit in zip(rules, self._evaluate_group(env, rules)):
+                    yield rule, None, None, hit
+
+    def evaluate(self, arrays):
+        """
+        在历史数组上一次性求出所有信号
+
+        arrays 为 {字段: 等长数组}，返回 {信号名: 布尔数组}；
+        ForEach 中的信号名为 '<信号>[<元素>]'
+        """
+        length = len(next(iter(arrays.values()))) if arrays else 0
+        env = _ArrayEnv(arrays, length)
+        signals = {}
+        for rule, _, label, hit in self._walk(env):
+            if rule.name is None:
+                continue
+            name = rule.name if label is None else f"{rule.name}[{label}]"
+            signals[name] = hit
+        return signals
+
+    def render(self, data):
+        """按规则顺序生成单日的分析文本行"""
+        values = flatten_rule_fields(data)
+        env = _ArrayEnv({name: _as_array(value) for name, value in values.items()}, 1)
+        lines = []
+        for rule, key, label, hit in self._walk(env):
+            if not hit[0]:
+                continue
+            scope = values if key is None else {**values, ITEM_FIELD: values[key]}
+            params = {name: expr(scope) for name, expr in rule.params.items()}
+            if label is not None:
+                params['name'] = self.labels.get(label, label)
+            lines.append(rule.text.format(**params))
+        return lines
+
+
+def compile_rules(rules=MARKET_RULES):
+    return RuleEngine(rules)
+
+
+MARKET_ENGINE = compile_rules()
+
+
+def load_history_fields(store, fields):
+    """
+    从 HistoryStore 读出规则需要的字段，按日期对齐成等长数组
+
+    '<指标>.change'/'change_pct' 由相邻两天的 value 计算，
+    'stats.<序列>.maN' 与 RollingStatsBook 一样按序列自己的最近N条记录计算：
+    数据源超时等原因缺少的日子没有均线，但不会让之后的均线都变成NaN。
+    其余统计量不提供（相关规则不参与回测）。
+    返回 (dates, arrays)
+    """
+    wanted = set()
+    prefixes = [name for name in fields if name.endswith('.')]
+    for name in fields:
+        if name in prefixes:
+            continue
+        if name.startswith('stats.'):
+            wanted.add(name.split('.')[1])
+        elif name.endswith(('.value', '.change', '.change_pct')):
+            wanted.add(name.rsplit('.', 1)[0])
+        else:
+            wanted.add(name)
+    for series in store.series():
+        if any(series.startswith(p) for p in prefixes) or series in wanted:
+            wanted.add(series)
+
+    columns = {series: store.columns(series) for series in sorted(wanted)}
+    columns = {series: c for series, c in columns.items() if len(c[0])}
+    if not columns:
+        return np.empty(0, dtype=np.int32), {}
+
+    dates = np.unique(np.concatenate([np.asarray(c[0]) for c in columns.values()]))
+    arrays = {}
+    for series, (series_dates, series_values) in columns.items():
+        rows = np.searchsorted(dates, series_dates)
+        aligned = np.full(len(dates), np.nan)
+        aligned[rows] = series_values
+        previous = np.concatenate([[np.nan], aligned[:-1]])
+        arrays[series] = aligned
+        arrays[f"{series}.value"] = aligned
+        with np.errstate(divide='ignore', invalid='ignore'):
+            arrays[f"{series}.change"] = aligned - previous
+            arrays[f"{series}.change_pct"] = (aligned / previous - 1) * 100
+        cumsum = np.cumsum(np.insert(np.asarray(series_values, dtype=np.float64), 0, 0.0))
+        for n in (5, 20, 60):
+            ma = np.full(len(dates), np.nan)
+            if len(rows) >= n:
+                ma[rows[n - 1:]] = (cumsum[n:] - cumsum[:-n]) / n
+            arrays[f"stats.{series}.ma{n}"] = ma
+    return dates, arrays
+
+
+def backtest(store, engine=MARKET_ENGINE, target='SHANGHAI', horizon=1):
+    """
+    在全部历史上回测每条信号
+
+    返回按触发次数排序的列表，每项包含信号名、触发次数、触发后 horizon 天
+    目标序列的平均涨跌幅(%)和上涨概率(%)
+    """
+    fields = set(engine.fields)
+    fields |= {item.prefix for item in engine.rules if isinstance(item, ForEach)}
+    fields.add(f"{target}.value")
+    dates, arrays = load_history_fields(store, fields)
+    if not len(dates):
+        return []
+
+    target_values = arrays[f"{target}.value"]
+    forward = np.full(len(dates), np.nan)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        forward[:-horizon] = (target_values[horizon:] / target_values[:-horizon] - 1) * 100
+
+    results = []
+    for name, hit in engine.evaluate(arrays).items():
+        outcome = forward[hit & np.isfinite(forward)]
+        results.append({
+            'signal': name,
+            'fired': int(hit.sum()),
+            'days': len(dates),
+            'avg_forward_pct': float(outcome.mean()) if len(outcome) else None,
+            'win_rate': float((outcome > 0).mean() * 100) if len(outcome) else None,
+        })
+    results.sort(key=lambda r: r['fired'], reverse=True)
+    return results
+
+
+if __name__ == '__main__':
+    import sys
+
+    from history_store import HistoryStore
+
+    history_dir = sys.argv[1] if len(sys.argv) > 1 else None
+    if history_dir is None:
+        import fetch_and_send
+        history_dir = fetch_and_send.HISTORY_DIR
+    horizon = int(sys.argv[2]) if len(sys.argv) > 2 else 1
+
+    print(f"{'信号':<24}{'触发次数':>8}{'后续平均涨跌':>12}{'上涨概率':>10}")
+    for r in backtest(HistoryStore(history_dir), horizon=horizon):
+        avg = f"{r['avg_forward_pct']:+.2f}%" if r['avg_forward_pct'] is not None else '-'
+        win = f"{r['win_rate']:.0f}%" if r['win_rate'] is not None else '-'
+        print(f"{r['signal']:<24}{r['fired']:>8}{avg:>12}{win:>10}")
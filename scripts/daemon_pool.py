@@ -0,0 +1,49 @@
+"""
+在守护线程中执行上游请求的执行器
+
+concurrent.futures.ThreadPoolExecutor 的工作线程在解释器退出时会被逐个 join，
+即使已经 shutdown(wait=False)：一个被放弃（超时或被对冲抢先）但仍挂着的请求会让整个进程
+一直等到它返回。DaemonExecutor 提供同样的 submit/shutdown 接口，每个任务在单独的守护线程中执行，
+进程退出时不再等待这些线程。返回的是标准的 Future，可以直接用 concurrent.futures.wait 等待。
+"""
+import threading
+from concurrent.futures import Future
+
+
+class DaemonExecutor:
+
+    def __init__(self, max_workers=None):
+        self._slots = threading.BoundedSemaphore(max_workers) if max_workers else None
+        self._futures = []
+
+    def _run(self, future, func, args):
+        if self._slots is not None:
+            self._slots.acquire()
+        try:
+            if not future.set_running_or_notify_cancel():
+                return
+            try:
+                result = func(*args)
+            except BaseException as e:
+                future.set_exception(e)
+            else:
+                future.set_result(result)
+        finally:
+            if self._slots is not None:
+                self._slots.release()
+
+    def submit(self, func, *args):
+        future = Future()
+        self._futures.append(future)
+        threading.Thread(target=self._run, args=(future, func, args), daemon=True).start()
+        return future
+
+    def shutdown(self, wait=True, cancel_futures=False):
+        """cancel_futures 为真时取消尚未开始的任务；wait 为假时不等待正在执行的任务"""
+        if cancel_futures:
+            for future in self._futures:
+                future.cancel()
+        if wait:
+            for future in self._futures:
+                if not future.cancelled():
+                    future.exception()
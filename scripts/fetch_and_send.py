@@ -1,213 +1,723 @@
-import smtplib
-import requests
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
-from datetime import datetime, timedelta
+from collections.abc import Mapping
+from concurrent.futures import FIRST_COMPLETED, wait
+from datetime import datetime, timedelta, timezone
+import argparse
+import bisect
 import os
 import json
-import pandas as pd
-import numpy as np
+import pickle
+import time
+
+# pandas、akshare、requests 等较重的依赖只在真正获取数据时才导入（见 fetch_financial_data），
+# 只渲染或试运行时不必为它们付出启动时间
+import analysis_rules
+import hedging
+import mailer
+import report_cache
+import report_template
+import subscriptions
+import tracing
+from daemon_pool import DaemonExecutor
+from history_store import HistoryStore, atomic_write, date_key
+from quotes import QUOTE_FIELDS, QuoteTable
+from rolling_stats import RollingStatsBook
 
 # 获取环境变量中的敏感信息
 email_user = os.getenv('EMAIL_USER')
 email_password = os.getenv('EMAIL_PASSWORD')
 to_email = os.getenv('TO_EMAIL')
 
-def fetch_financial_data():
+# 每个数据源的默认超时时间（秒），可通过环境变量 SOURCE_TIMEOUT 覆盖
+SOURCE_TIMEOUT = float(os.getenv('SOURCE_TIMEOUT', '30'))
+
+# 个别数据源需要翻页下载，单独放宽超时
+SOURCE_TIMEOUTS = {
+    'stock_us_spot': 120,
+}
+
+def run_fetch_tasks(tasks, max_workers=None):
     """
-    使用AKShare获取实时金融数据
+    在守护线程中并发执行相互独立的数据源请求
+
+    tasks: {数据源名称: (无参可调用对象, 超时秒数)}，超时为None时使用SOURCE_TIMEOUT
+    返回 (results, timings)：
+        results 只包含成功返回的数据源；
+        timings 记录每个数据源的状态('ok'/'error'/'timeout')、耗时和错误信息
+    单个数据源失败或超时不会影响其他数据源的结果。
+    超时只是不再等待该请求，线程本身停不下来；守护线程不会在进程退出时被 join（见 daemon_pool），
+    请求本身由 HTTP 会话的默认超时兜底（见 http_cache.HTTP_TIMEOUT）。
     """
+    results = {}
+    timings = {}
+    if not tasks:
+        return results, timings
+
+    def timed_call(func):
+        start = time.perf_counter()
+        value = func()
+        return value, time.perf_counter() - start
+
+    executor = DaemonExecutor(max_workers=max_workers or len(tasks))
+    submitted = time.perf_counter()
+    pending = {}
+    deadlines = {}
+    limits = {}
+    for name, (func, timeout) in tasks.items():
+        future = executor.submit(timed_call, func)
+        pending[future] = name
+        limits[name] = timeout if timeout is not None else SOURCE_TIMEOUT
+        deadlines[future] = submitted + limits[name]
+
     try:
-        import akshare as ak
-        
-        # 获取上证指数实时行情
-        sh_index_df = ak.stock_zh_index_spot()
-        sh_index = sh_index_df[sh_index_df['代码'] == 'sh000001'].iloc[0]
-        
-        # 获取深证成指实时行情
-        sz_index_df = ak.stock_zh_index_spot()
-        sz_index = sz_index_df[sh_index_df['代码'] == 'sz399001'].iloc[0]
-        
-        # 获取美元兑人民币汇率
-        forex_df = ak.currency_boc_sina()
-        usd_cny = forex_df[forex_df['币种'] == '美元'].iloc[0]
-        
-        # 获取美国标普500指数（通过新浪财经）
-        sp500_df = ak.stock_us_spot()
-        sp500 = sp500_df[sp500_df['代码'] == '.INX'].iloc[0]
-        
-        # 组织数据
-        data = {
-            'domestic_market': {
-                'SHANGHAI': {
-                    'value': float(sh_index['最新价']),
-                    'change': float(sh_index['涨跌额']),
-                    'change_pct': float(sh_index['涨跌幅'])
-                },
-                'SZ_COMP': {
-                    'value': float(sz_index['最新价']),
-                    'change': float(sz_index['涨跌额']),
-                    'change_pct': float(sz_index['涨跌幅'])
-                },
-                # 其他数据...
-            },
-            'global_markets': {
-                'USD/CNY': {
-                    'value': float(usd_cny['现汇卖出价']),
-                    'change': 0,  # 需要计算
-                    'change_pct': 0  # 需要计算
-                },
-                'S&P_500': {
-                    'value': float(sp500['最新价']),
-                    'change': float(sp500['涨跌额']),
-                    'change_pct': float(sp500['涨跌幅'])
+        while pending:
+            now = time.perf_counter()
+            # 先处理已经超时的数据源
+            for future in [f for f in pending if deadlines[f] <= now and not f.done()]:
+                name = pending.pop(future)
+                future.cancel()
+                timings[name] = {
+                    'status': 'timeout',
+                    'elapsed': now - submitted,
+                    'error': f"超过{limits[name]:g}秒未返回",
                 }
-                # 其他数据...
+            if not pending:
+                break
+
+            wait_for = max(0.0, min(deadlines[f] for f in pending) - now)
+            done, _ = wait(list(pending), timeout=wait_for, return_when=FIRST_COMPLETED)
+            for future in done:
+                name = pending.pop(future)
+                try:
+                    value, elapsed = future.result()
+                    results[name] = value
+                    timings[name] = {'status': 'ok', 'elapsed': elapsed, 'error': None}
+                except Exception as e:
+                    timings[name] = {
+                        'status': 'error',
+                        'elapsed': time.perf_counter() - submitted,
+                        'error': str(e),
+                    }
+    finally:
+        # 不等待超时的线程结束，直接放弃它们的结果
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    return results, timings
+
+def print_fetch_report(timings):
+    """按耗时从高到低打印每个数据源的获取情况，并标出瓶颈数据源（被对冲放弃的不算）"""
+    if not timings:
+        return
+    print("数据源耗时统计:")
+    ordered = sorted(timings.items(), key=lambda item: item[1]['elapsed'], reverse=True)
+    bottleneck = next((name for name, info in ordered if info['status'] != 'abandoned'), None)
+    for name, info in ordered:
+        line = f"  {name}: {info['status']} {info['elapsed']:.2f}s"
+        if info['error']:
+            line += f" ({info['error']})"
+        if name == bottleneck and len(ordered) > 1:
+            line += " <- 瓶颈"
+        print(line)
+
+# 本地缓存目录，默认位于仓库根目录下的 .cache
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CACHE_DIR = os.getenv('CACHE_DIR', os.path.join(BASE_DIR, '.cache'))
+
+# 数据源结果在磁盘上的缓存有效期（秒），设为0可关闭缓存
+SOURCE_CACHE_TTL = float(os.getenv('SOURCE_CACHE_TTL', '300'))
+
+# 行情类数据源通用的列映射：报告字段 -> 数据源列名
+QUOTE_COLUMNS = {'value': '最新价', 'change': '涨跌额', 'change_pct': '涨跌幅'}
+
+# 每个数据源中用作代码索引的列
+SOURCE_CODE_COLUMNS = {
+    'stock_zh_index_spot': '代码',
+    'currency_boc_sina': '币种',
+    'stock_us_spot': '代码',
+    'stock_zh_index_spot_em': '代码',
+    'index_global_spot_em': '代码',
+}
+
+# 需要传参的数据源
+SOURCE_ARGS = {
+    'stock_zh_index_spot_em': {'symbol': '沪深重要指数'},
+}
+
+# 备用数据源规格：全市场数据源写 source/symbol（列映射默认 QUOTE_COLUMNS），
+# 新浪单品种行情写 quote，scale 用于统一单位
+def _em_index(symbol):
+    return {'source': 'stock_zh_index_spot_em', 'symbol': symbol}
+
+def _em_global(symbol):
+    return {'source': 'index_global_spot_em', 'symbol': symbol}
+
+# 指标注册表：指标 -> 所属分类、类型（指数 index / 汇率 fx，对应订阅者关注列表中的 indices/fx）、
+# 数据源、代码和列映射
+# 同一数据源每次运行只请求一次，列映射中缺少的字段填0；
+# alternates 为备用数据源，主数据源超过其 p95 延迟仍未返回时依次对冲
+INDICATORS = {
+    'SHANGHAI': {'category': 'domestic_market', 'kind': 'index', 'source': 'stock_zh_index_spot',
+                 'symbol': 'sh000001', 'columns': QUOTE_COLUMNS,
+                 'alternates': [_em_index('000001'), {'quote': 's_sh000001'}]},
+    'SZ_COMP': {'category': 'domestic_market', 'kind': 'index', 'source': 'stock_zh_index_spot',
+                'symbol': 'sz399001', 'columns': QUOTE_COLUMNS,
+                'alternates': [_em_index('399001'), {'quote': 's_sz399001'}]},
+    'CHINEXT': {'category': 'domestic_market', 'kind': 'index', 'source': 'stock_zh_index_spot',
+                'symbol': 'sz399006', 'columns': QUOTE_COLUMNS,
+                'alternates': [_em_index('399006'), {'quote': 's_sz399006'}]},
+    # 中行汇率表没有涨跌字段，需要结合历史数据计算；中行按每100美元报价。
+    # 备用的新浪在岸人民币是中间价，与现汇卖出价基准不同，涨跌用它自己的（见 update_history）
+    'USD/CNY': {'category': 'global_markets', 'kind': 'fx', 'source': 'currency_boc_sina',
+                'symbol': '美元', 'columns': {'value': '现汇卖出价'},
+                'alternates': [{'quote': 'fx_susdcny', 'scale': 100}]},
+    # 以下指标优先走新浪单品种行情接口(quote)，其次是备用数据源，最后才是全市场数据源
+    'S&P_500': {'category': 'global_markets', 'kind': 'index', 'source': 'stock_us_spot',
+                'symbol': '.INX', 'columns': QUOTE_COLUMNS, 'quote': 'gb_$inx',
+                'alternates': [_em_global('SPX')]},
+    'NASDAQ': {'category': 'global_markets', 'kind': 'index', 'source': 'stock_us_spot',
+               'symbol': '.IXIC', 'columns': QUOTE_COLUMNS, 'quote': 'gb_ixic',
+               'alternates': [_em_global('NDX')]},
+    'NIKKEI': {'category': 'global_markets', 'kind': 'index', 'source': None, 'quote': 'znb_NKY',
+               'alternates': [_em_global('N225')]},
+    'VIX': {'category': 'global_markets', 'kind': 'index', 'source': None, 'quote': 'znb_VIX'},
+    'USD_INDEX': {'category': 'global_markets', 'kind': 'fx', 'source': None, 'quote': 'DINIW',
+                  'alternates': [_em_global('UDI')]},
+    'A50_INDEX': {'category': 'global_markets', 'kind': 'index', 'source': None, 'quote': 'hf_CHA50CFD'},
+}
+
+# 新浪行情接口，可通过环境变量指向本地回放服务做基准测试
+SINA_QUOTE_URL = os.getenv('SINA_QUOTE_URL', 'https://hq.sinajs.cn/list=')
+SINA_HEADERS = {'Referer': 'https://finance.sina.com.cn/'}
+
+# 条件请求的响应缓存目录
+HTTP_CACHE_DIR = os.path.join(CACHE_DIR, 'http')
+
+_http_session = None
+
+def get_http_session():
+    """
+    返回进程内共享的HTTP会话：复用 keep-alive 连接，带重试，
+    对带 ETag/Last-Modified 的响应使用条件请求
+    """
+    global _http_session
+    if _http_session is None:
+        import http_cache
+        _http_session = http_cache.CachedSession(HTTP_CACHE_DIR)
+    return _http_session
+
+def _quote_from_prev_close(price, prev_close):
+    change = price - prev_close
+    return {
+        'value': price,
+        'change': round(change, 4),
+        'change_pct': round(change / prev_close * 100, 2) if prev_close else 0
+    }
+
+def parse_sina_quote(code, fields):
+    """按新浪各类行情代码的字段布局解析出 {'value','change','change_pct'}"""
+    if code.startswith('gb_'):
+        # 美股/美股指数: 名称,最新价,涨跌幅,时间,涨跌额,...
+        return {'value': float(fields[1]), 'change': float(fields[4]), 'change_pct': float(fields[2])}
+    if code.startswith('znb_'):
+        # 全球指数: 名称,最新价,涨跌额,涨跌幅,...
+        return {'value': float(fields[1]), 'change': float(fields[2]), 'change_pct': float(fields[3])}
+    if code.startswith('s_'):
+        # A股指数简版行情: 名称,最新价,涨跌额,涨跌幅,...
+        return {'value': float(fields[1]), 'change': float(fields[2]), 'change_pct': float(fields[3])}
+    if code.startswith('hf_'):
+        # 外盘期货: 最新价,,买价,卖价,最高,最低,时间,昨收,...
+        return _quote_from_prev_close(float(fields[0]), float(fields[7]))
+    # 外汇(如美元指数DINIW、fx_susdcny): 时间,最新价,卖价,昨收,...
+    return _quote_from_prev_close(float(fields[1]), float(fields[3]))
+
+def fetch_sina_quotes(codes, timeout=10):
+    """
+    通过新浪行情接口一次批量获取若干品种的实时报价
+
+    返回 {新浪代码: 报价字典}，接口中没有数据或无法解析的代码不会出现在结果中
+    """
+    if not codes:
+        return {}
+    response = get_http_session().get(SINA_QUOTE_URL + ','.join(codes), headers=SINA_HEADERS, timeout=timeout)
+    response.raise_for_status()
+    response.encoding = 'gbk'
+
+    quotes = {}
+    for line in response.text.splitlines():
+        # var hq_str_gb_$inx="标普500指数,5000.12,...";
+        if not line.startswith('var hq_str_') or '="' not in line:
+            continue
+        code, _, payload = line[len('var hq_str_'):].partition('="')
+        payload = payload.rstrip('";')
+        if not payload:
+            continue
+        try:
+            quotes[code] = parse_sina_quote(code, payload.split(','))
+        except (IndexError, ValueError):
+            continue
+    return quotes
+
+def _source_cache_path(source):
+    return os.path.join(CACHE_DIR, 'sources', f"{source}.pkl")
+
+def load_cached_source(source, ttl=SOURCE_CACHE_TTL):
+    """读取未过期的数据源缓存，不存在或已过期时返回None"""
+    if ttl <= 0:
+        return None
+    path = _source_cache_path(source)
+    try:
+        if time.time() - os.path.getmtime(path) > ttl:
+            return None
+        with open(path, 'rb') as f:
+            return pickle.load(f)
+    except (OSError, pickle.UnpicklingError, EOFError):
+        return None
+
+def save_cached_source(source, frame):
+    """把数据源结果写入磁盘缓存，先写临时文件再替换，避免留下半截文件"""
+    if SOURCE_CACHE_TTL <= 0:
+        return
+    atomic_write(_source_cache_path(source),
+                 lambda f: pickle.dump(frame, f, protocol=pickle.HIGHEST_PROTOCOL), '数据源缓存', binary=True)
+
+# 报告跟踪的板块：板块 -> (东方财富板块类型, 板块名称)
+SECTOR_BOARDS = {
+    'AI_CHIP': ('concept', 'AI芯片'),
+    'NEW_ENERGY': ('concept', '新能源'),
+    'CONSUMER': ('industry', '食品饮料'),
+}
+
+# 板块成分变化很慢，默认每7天刷新一次
+SECTOR_REFRESH_INTERVAL = float(os.getenv('SECTOR_REFRESH_DAYS', '7')) * 86400
+
+def _sector_membership_path():
+    return os.path.join(CACHE_DIR, 'sector_membership.json')
+
+def load_sector_membership(ak, sectors=SECTOR_BOARDS):
+    """
+    读取板块成分表，只重新获取缓存中缺失或超过刷新周期的板块
+
+    返回 {板块: [股票代码, ...]}，获取失败的板块沿用旧缓存（如有）
+    """
+    path = _sector_membership_path()
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            cache = json.load(f)
+    except (OSError, ValueError):
+        cache = {}
+
+    fetchers = {
+        'concept': getattr(ak, 'stock_board_concept_cons_em', None),
+        'industry': getattr(ak, 'stock_board_industry_cons_em', None),
+    }
+    now = time.time()
+    tasks = {}
+    for sector, (kind, board) in sectors.items():
+        entry = cache.get(sector)
+        if entry and entry.get('board') == board and now - entry.get('fetched_at', 0) < SECTOR_REFRESH_INTERVAL:
+            continue
+        func = fetchers.get(kind)
+        if func is not None:
+            call = (lambda func=func, board=board: func(symbol=board))
+            tasks[sector] = (tracing.traced(f"source:{func.__name__}", call, board=board), None)
+
+    if tasks:
+        frames, timings = run_fetch_tasks(tasks)
+        for sector, info in timings.items():
+            if info['status'] != 'ok':
+                print(f"获取板块成分时出错: {sector} {info['error']}")
+        for sector, frame in frames.items():
+            cache[sector] = {
+                'board': sectors[sector][1],
+                'fetched_at': now,
+                'codes': frame['代码'].astype(str).tolist(),
             }
-            # 其他类别数据...
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'w', encoding='utf-8') as f:
+                json.dump(cache, f, ensure_ascii=False)
+        except OSError as e:
+            print(f"写入板块成分缓存时出错: {e}")
+
+    return {sector: cache[sector]['codes'] for sector in sectors if sector in cache}
+
+# A股交易日历；日历覆盖到当年年底，默认每30天刷新一次
+TRADE_CALENDAR_REFRESH_INTERVAL = float(os.getenv('TRADE_CALENDAR_REFRESH_DAYS', '30')) * 86400
+
+# 交易日按北京时间划分，收盘（15:00）之后当天才算一个完整的交易日
+BEIJING_TZ = timezone(timedelta(hours=8))
+MARKET_CLOSE_HOUR = 15
+
+def _trade_calendar_path():
+    return os.path.join(CACHE_DIR, 'trade_calendar.json')
+
+def load_trade_calendar(ak=None):
+    """
+    读取A股交易日历（ak.tool_trade_date_hist_sina），缓存超过刷新周期或不覆盖今天时重新获取
+
+    返回升序的 YYYYMMDD 整数列表；获取失败时沿用旧缓存，没有缓存时返回None
+    """
+    path = _trade_calendar_path()
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            cache = json.load(f)
+    except (OSError, ValueError):
+        cache = {}
+    dates = cache.get('dates') or []
+    now = time.time()
+    if dates and now - cache.get('fetched_at', 0) < TRADE_CALENDAR_REFRESH_INTERVAL \
+            and dates[-1] >= date_key(datetime.now(BEIJING_TZ)):
+        return dates
+
+    if ak is None:
+        try:
+            import akshare as ak
+        except ImportError as e:
+            print(f"获取交易日历时出错: {e}")
+            return dates or None
+    func = getattr(ak, 'tool_trade_date_hist_sina', None)
+    if func is None:
+        return dates or None
+    frames, timings = run_fetch_tasks({'trade_calendar': (tracing.traced(f"source:{func.__name__}", func), None)})
+    if 'trade_calendar' not in frames:
+        print(f"获取交易日历时出错: {timings['trade_calendar']['error']}")
+        return dates or None
+
+    import pandas as pd
+    days = pd.to_datetime(frames['trade_calendar']['trade_date'], errors='coerce').dropna()
+    dates = sorted({date_key(day) for day in days})
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({'fetched_at': now, 'dates': dates}, f)
+    except OSError as e:
+        print(f"写入交易日历缓存时出错: {e}")
+    return dates
+
+def market_trade_date(calendar=None, now=None):
+    """
+    本次行情数据所属的交易日（YYYYMMDD）：截至 now 最近一个已经收盘的交易日
+
+    早上运行时取前一个交易日，周末和节假日取节前最后一个交易日。
+    calendar 为 load_trade_calendar 的结果，没有日历时只跳过周末
+    """
+    now = now or datetime.now(BEIJING_TZ)
+    day = now.date() if now.hour >= MARKET_CLOSE_HOUR else now.date() - timedelta(days=1)
+    if calendar:
+        pos = bisect.bisect_right(calendar, date_key(day))
+        if pos:
+            return calendar[pos - 1]
+    while day.weekday() >= 5:
+        day -= timedelta(days=1)
+    return date_key(day)
+
+# 对冲请求使用的数据源延迟直方图，随缓存目录一起在多次运行之间保留
+LATENCY_PATH = os.path.join(CACHE_DIR, 'latency.json')
+
+# 新浪批量报价接口在数据源链中的名称
+SINA_QUOTES = 'sina_quotes'
+
+def indicator_providers(key):
+    """
+    返回指标的数据源链 [(数据源, 取值规格), ...]，按优先级排列
+
+    有单品种行情代码(quote)的指标：新浪报价 -> 备用数据源 -> 全市场数据源(source)；
+    其余指标：数据源(source) -> 备用数据源
+    """
+    spec = INDICATORS[key]
+    alternates = [(SINA_QUOTES if 'quote' in alt else alt['source'], alt) for alt in spec.get('alternates', [])]
+    primary = [(spec['source'], spec)] if spec.get('source') else []
+    if spec.get('quote'):
+        return [(SINA_QUOTES, spec)] + alternates + primary
+    return primary + alternates
+
+def extract_source(source, frame, items):
+    """
+    从一个全市场数据源中批量提取指标
+
+    items 为 {指标: 取值规格}，规格中的 symbol 为代码，columns 为列映射（默认 QUOTE_COLUMNS）。
+    数据源只按代码列建立一次索引，再用一次 reindex 取出所有指标对应的行，
+    各字段按列号整列取出后直接写入 QuoteTable；
+    返回 QuoteTable，找不到代码的指标不出现在结果中
+    """
+    import numpy as np
+    import pandas as pd
+
+    code_col = SOURCE_CODE_COLUMNS[source]
+    keys = list(items)
+    mappings = [items[key].get('columns', QUOTE_COLUMNS) for key in keys]
+    columns = sorted({col for mapping in mappings for col in mapping.values()})
+    indexed = frame.drop_duplicates(subset=code_col).set_index(code_col)
+    rows = indexed.reindex(
+        [items[key]['symbol'] for key in keys],
+        columns=columns
+    ).apply(pd.to_numeric, errors='coerce').to_numpy(dtype=np.float64)
+
+    # 列映射中没有的字段取一列全NaN，读取时按0处理
+    padded = np.column_stack([rows, np.full(len(keys), np.nan)])
+    column_index = {col: i for i, col in enumerate(columns)}
+    values = np.column_stack([
+        padded[np.arange(len(keys)), [column_index.get(m.get(field), len(columns)) for m in mappings]]
+        for field in QUOTE_FIELDS
+    ])
+    found = ~np.isnan(values[:, 0])
+    return QuoteTable.from_arrays([key for key, ok in zip(keys, found) if ok], values[found])
+
+def extract_sina_quotes(sina_quotes, items):
+    """从新浪批量报价中取出指标，规格中的 scale 用于统一单位（如中行汇率按每100外币报价）"""
+    result = QuoteTable(len(items))
+    for key, spec in items.items():
+        quote = sina_quotes.get(spec['quote'])
+        if quote is None:
+            continue
+        scale = spec.get('scale', 1)
+        result[key] = {
+            'value': round(quote['value'] * scale, 4),
+            'change': round(quote['change'] * scale, 4),
+            'change_pct': quote['change_pct'],
         }
-        
-        return data
-        
-    except Exception as e:
+    return result
+
+def _unavailable_source(source):
+    def fetch():
+        raise AttributeError(f"当前AKShare版本不提供该接口: {source}")
+    return fetch
+
+def fetch_indicator_data(indicators, ak, extra_sources=()):
+    """
+    按各指标的数据源链获取数据，主数据源迟迟不返回时对冲到备用数据源
+
+    同一数据源每次运行只请求一次，结果由所有指标共享；全市场数据源优先读取磁盘缓存。
+    extra_sources 为不对应单个指标、但需要整体获取的数据源（如全市场快照）
+    返回 (quotes, frames, timings, winners)
+    """
+    chains = {}
+    items = {}
+    for key in indicators:
+        chain = indicator_providers(key)
+        if not chain:
+            continue
+        chains[key] = [provider for provider, _ in chain]
+        for provider, spec in chain:
+            items.setdefault(provider, {})[key] = spec
+
+    providers = {}
+    ready = {}
+    for source in set(items) | set(extra_sources):
+        if source == SINA_QUOTES:
+            codes = sorted({spec['quote'] for spec in items[source].values()})
+            call = (lambda codes=codes: fetch_sina_quotes(codes))
+            providers[source] = (tracing.traced(f"source:{source}", call, codes=len(codes)), SOURCE_TIMEOUT)
+            continue
+        cached = load_cached_source(source)
+        if cached is not None:
+            ready[source] = cached
+        func = getattr(ak, source, None)
+        if func is None:
+            func = _unavailable_source(source)
+        elif source in SOURCE_ARGS:
+            func = (lambda func=func, kwargs=SOURCE_ARGS[source]: func(**kwargs))
+        # 每次上游调用单独计时；命中磁盘缓存的数据源不会调用
+        providers[source] = (tracing.traced(f"source:{source}", func), SOURCE_TIMEOUTS.get(source, SOURCE_TIMEOUT))
+
+    def extract(provider, result):
+        if provider not in items:
+            return {}
+        if provider == SINA_QUOTES:
+            return extract_sina_quotes(result, items[provider])
+        return extract_source(provider, result, items[provider])
+
+    book = hedging.LatencyBook(LATENCY_PATH)
+    quotes, winners, frames, timings = hedging.run_hedged(
+        providers, chains, extract, book, ready=ready, required=list(extra_sources)
+    )
+    book.save()
+
+    for source, info in timings.items():
+        if info['status'] == 'ok' and source != SINA_QUOTES:
+            save_cached_source(source, frames[source])
+    frames.pop(SINA_QUOTES, None)
+    return quotes, frames, timings, winners
+
+def fetch_financial_data(indicators=None, sectors=None, providers=None):
+    """
+    使用AKShare获取实时金融数据
+
+    indicators/sectors 为需要获取的指标和板块，默认为 INDICATORS 和 SECTOR_BOARDS 中的全部；
+    各数据源并发获取，某个数据源失败或超时时返回其余部分的数据；
+    所有数据源都失败时返回None。
+    providers 为字典时，填入各指标实际使用的数据源（见 update_history）
+    """
+    indicators = list(INDICATORS) if indicators is None else list(indicators)
+    sectors = list(SECTOR_BOARDS) if sectors is None else list(sectors)
+
+    try:
+        import akshare as ak
+    except ImportError as e:
         print(f"获取金融数据时出错: {e}")
-        # 可以考虑返回None或者部分数据
         return None
+    import http_cache
+    import market_snapshot
+
+    # AKShare 内部的 requests 调用也走共享会话，慢变的参考数据（汇率表、板块成分等）可以命中304
+    session = get_http_session()
+    session.reset_stats()
+    with http_cache.patch_requests(session):
+        with tracing.span('sources'):
+            quotes, frames, timings, winners = fetch_indicator_data(
+                indicators, ak, extra_sources=[market_snapshot.SNAPSHOT_SOURCE]
+            )
+        snapshot = frames.get(market_snapshot.SNAPSHOT_SOURCE)
+        membership = {}
+        if snapshot is not None:
+            try:
+                with tracing.span('sectors'):
+                    membership = load_sector_membership(ak, {key: SECTOR_BOARDS[key] for key in sectors})
+            except Exception as e:
+                print(f"获取板块成分时出错: {e}")
+    print_fetch_report(timings)
+    print(session.report())
+    session.prune()
+    tracing.annotate('sources', timings)
+    tracing.annotate('winners', winners)
+    if providers is not None:
+        providers.update(winners)
+    tracing.annotate('http', dict(session.stats))
+
+    hedged = [f"{key}({provider})" for key, provider in winners.items()
+              if provider != indicator_providers(key)[0][0]]
+    if hedged:
+        print(f"以下指标由备用数据源返回: {', '.join(hedged)}")
+
+    if not frames and not quotes:
+        print("获取金融数据时出错: 所有数据源均不可用")
+        return None
+
+    # 行情类分类使用紧凑的 QuoteTable，用法与字典相同
+    data = {
+        'domestic_market': QuoteTable(),
+        'global_markets': QuoteTable(),
+        # 其他类别数据...
+    }
+
+    for key, quote in quotes.items():
+        data[INDICATORS[key]['category']][key] = quote
+    missing = [key for key in indicators if key not in quotes]
+    if missing:
+        print(f"以下指标缺少数据: {', '.join(missing)}")
+
+    # 涨跌家数、涨跌停家数和成交额都由同一份全市场快照计算
+    if snapshot is not None:
+        try:
+            with tracing.span('breadth'):
+                breadth = market_snapshot.compute_market_breadth(snapshot)
+            data.setdefault('capital_flows', {})['TURNOVER'] = breadth.pop('TURNOVER')
+            data['domestic_market'].update(breadth)
+        except Exception as e:
+            print(f"计算市场宽度时出错: {e}")
+
+        # 板块表现同样由这份快照按成分股分组计算
+        try:
+            with tracing.span('sector_performance'):
+                sector_performance = market_snapshot.compute_sector_performance(snapshot, membership)
+            if sector_performance:
+                data.setdefault('policy_sentiment', {})['SECTOR_PERFORMANCE'] = sector_performance
+        except Exception as e:
+            print(f"计算板块表现时出错: {e}")
+
+    return data
+
+# 每日指标历史，默认放在缓存目录下
+HISTORY_DIR = os.getenv('HISTORY_DIR', os.path.join(CACHE_DIR, 'history'))
+
+def flatten_financial_data(data):
+    """
+    把报告数据展开为 {序列名: 数值}
+
+    行情类指标取 value，计数/金额类指标直接取数值，板块表现记为 'SECTOR_PERFORMANCE.<板块>'
+    """
+    values = {}
+    for name, category in data.items():
+        # 滚动统计是由历史派生的结果，不再写回历史
+        if name == 'stats' or not isinstance(category, Mapping):
+            continue
+        for key, item in category.items():
+            if isinstance(item, Mapping) and 'value' in item:
+                values[key] = float(item['value'])
+            elif isinstance(item, Mapping):
+                for sub_key, sub_value in item.items():
+                    if isinstance(sub_value, (int, float)):
+                        values[f"{key}.{sub_key}"] = float(sub_value)
+            elif isinstance(item, (int, float)) and not isinstance(item, bool):
+                values[key] = float(item)
+    return values
+
+def update_history(data, store=None, day=None, providers=None):
+    """
+    用历史数据补全数据源不提供的涨跌字段，并把本次的指标值追加到历史存储
+
+    历史按行情所属的交易日记录（见 market_trade_date），day 默认为最近一个已收盘的交易日。
+    数据源列映射中没有 change 的指标（如中行汇率），按前一个交易日的值计算日涨跌；
+    providers 为 {指标: 实际使用的数据源}（见 fetch_financial_data）。这类指标由备用数据源返回时，
+    备用数据源的报价基准可能不同（新浪在岸人民币中间价 vs 中行现汇卖出价），与历史相减会得到虚假的涨跌：
+    此时保留备用数据源自己的涨跌，当天的值记在 '<指标>@<数据源>' 序列下，不混入主数据源的序列；
+    同时增量更新各序列的滚动统计，结果放在 data['stats'] 中供分析规则使用。
+    逐个序列判断：序列中已经有这个交易日时（周末、节假日或同一交易日重复运行），不再追加，
+    也不保存它的滚动统计，即使这次由别的数据源返回、数值略有不同；
+    上次因数据源超时而缺少的序列，重跑时照常补上
+    """
+    store = store or HistoryStore(HISTORY_DIR)
+    day = day or market_trade_date(load_trade_calendar())
+
+    series = {}
+    for key, spec in INDICATORS.items():
+        quote = data.get(spec['category'], {}).get(key)
+        if quote is None or 'change' in spec.get('columns', QUOTE_COLUMNS):
+            continue
+        provider = (providers or {}).get(key)
+        if provider is not None and provider != indicator_providers(key)[0][0]:
+            series[key] = f"{key}@{provider}"
+            continue
+        previous = store.previous(key, day)
+        if previous:
+            change = quote['value'] - previous
+            quote['change'] = round(change, 4)
+            quote['change_pct'] = round(change / previous * 100, 2)
+
+    values = flatten_financial_data(data)
+    for key, name in series.items():
+        values[name] = values.pop(key)
+    recorded = {name: value for name, value in values.items() if store.contains(name, day)}
+    fresh = {name: value for name, value in values.items() if name not in recorded}
+    if recorded:
+        print(f"历史中已有交易日 {day} 的 {len(recorded)} 个序列，不再追加")
+    if fresh:
+        try:
+            store.append_snapshot(day, fresh)
+        except OSError as e:
+            print(f"写入历史数据时出错: {e}")
+
+    try:
+        book = RollingStatsBook(os.path.join(store.root, 'rolling_stats.json'))
+        stats = book.update(day, fresh)
+        if fresh:
+            book.save()
+        # 已记录的序列在保存之后更新：同一天重复更新是幂等的，只用于本次报告
+        stats.update(book.update(day, recorded))
+        data['stats'] = stats
+    except OSError as e:
+        print(f"更新滚动统计时出错: {e}")
+    return data
 
 def generate_market_analysis(data):
     """
     生成市场分析和解读，按照新手投资者每日必看清单组织
+
+    分析规则定义在 analysis_rules.MARKET_RULES 中，这里按规则顺序输出当天的文本
     """
     if not data:
         return "今日无法获取市场数据，请手动检查数据源。"
     
-    analysis = []
-    
-    # 1. 国内市场分析
-    analysis.append("# 📊 国内市场分析（核心晴雨表）")
-    
-    sh_index = data['domestic_market']['SHANGHAI']
-    sz_index = data['domestic_market']['SZ_COMP']
-    rising = data['domestic_market']['RISING_STOCKS']
-    falling = data['domestic_market']['FALLING_STOCKS']
-    limit_up = data['domestic_market']['LIMIT_UP']
-    limit_down = data['domestic_market']['LIMIT_DOWN']
-    
-    # 大盘指数分析
-    if sh_index['change_pct'] > 0 and sz_index['change_pct'] > 0:
-        analysis.append("✅ **大盘指数双双上涨** - 上证指数和深证成指均收涨，市场整体情绪积极。")
-    elif sh_index['change_pct'] < 0 and sz_index['change_pct'] < 0:
-        analysis.append("⚠️ **大盘指数双双下跌** - 市场整体表现疲软，需要关注下跌原因和后续走势。")
-    else:
-        analysis.append("🔸 **大盘指数分化** - 主要指数走势不一，显示市场内部结构分化。")
-    
-    # 涨跌家数分析
-    rising_ratio = rising / (rising + falling) * 100
-    if rising_ratio > 60:
-        analysis.append("✅ **市场普涨格局** - 上涨家数占比超过60%，市场赚钱效应较好。")
-    elif rising_ratio < 40:
-        analysis.append("⚠️ **市场普跌格局** - 下跌家数占比较多，市场整体情绪偏谨慎。")
-    else:
-        analysis.append("🔸 **市场涨跌互现** - 上涨和下跌家数基本持平，市场呈现结构性行情。")
-    
-    # 涨跌停家数分析
-    analysis.append(f"📈 **涨停家数**: {limit_up}家 | 📉 **跌停家数**: {limit_down}家")
-    if limit_up > 50 and limit_down < 10:
-        analysis.append("✅ **市场炒作热情高** - 涨停家数较多而跌停家数较少，显示市场风险偏好较强。")
-    elif limit_up < 20 and limit_down > 20:
-        analysis.append("⚠️ **市场恐慌情绪上升** - 跌停家数明显多于涨停家数，需要警惕市场风险。")
-    
-    # 2. 资金动向分析
-    analysis.append("\n# 💰 资金动向分析（市场发动机）")
-    
-    northbound = data['capital_flows']['NORTHBOUND_NET']
-    turnover = data['capital_flows']['TURNOVER']
-    margin = data['capital_flows']['MARGIN_TRADING']
-    
-    # 北向资金分析
-    if northbound > 30:
-        analysis.append("✅ **北向资金大幅净流入** - '聪明钱'大幅流入，通常对市场有积极影响，特别是其重点布局的板块。")
-    elif northbound < -30:
-        analysis.append("⚠️ **北向资金大幅净流出** - 外资流出可能对市场构成压力，需要关注流出原因和持续性。")
-    else:
-        analysis.append("🔸 **北向资金小幅波动** - 外资流向对市场影响中性。")
-    
-    # 成交额分析
-    if turnover > 10000:
-        analysis.append("✅ **市场成交活跃** - 成交额超过万亿，显示市场参与度高，资金活跃。")
-    elif turnover < 8000:
-        analysis.append("⚠️ **市场成交萎缩** - 成交额较低，可能反映市场观望情绪浓厚。")
-    
-    # 融资融券分析
-    analysis.append(f"📊 **两融余额**: {margin}亿元 - 杠杆资金水平{(margin-15000)/500:.1f}%")
-    
-    # 3. 全球市场分析
-    analysis.append("\n# 🌍 全球市场分析（外部环境）")
-    
-    usd_cny = data['global_markets']['USD/CNY']
-    usd_index = data['global_markets']['USD_INDEX']
-    sp500 = data['global_markets']['S&P_500']
-    a50 = data['global_markets']['A50_INDEX']
-    vix = data['global_markets']['VIX']
-    
-    # 汇率分析
-    if usd_index['change'] < 0 and usd_cny['change'] < 0:
-        analysis.append("✅ **美元走弱，人民币相对走强** - 美元指数下跌，同时人民币对美元升值，这通常有利于A股市场，特别是那些有美元负债和进口依赖型企业。")
-    elif usd_index['change'] > 0 and usd_cny['change'] > 0:
-        analysis.append("⚠️ **美元走强，人民币承压** - 美元指数上涨带动人民币贬值，这可能对A股市场构成压力，特别是外资可能会流出。")
-    
-    # 美股影响分析
-    if sp500['change_pct'] > 0.5:
-        analysis.append("✅ **美股大幅上涨** - 隔夜美股表现强劲，特别是纳斯达克指数上涨明显，这对今日A股科技板块情绪有积极影响。")
-    elif sp500['change_pct'] < -0.5:
-        analysis.append("⚠️ **美股显著下跌** - 隔夜美股下跌可能对今日A股开盘造成压力，需要关注市场风险偏好变化。")
-    
-    # A50指数分析
-    analysis.append(f"📈 **富时A50指数**: {a50['value']} ({a50['change_pct']:+.2f}%) - 作为A股先行指标，其表现对开盘有预示作用。")
-    
-    # 恐慌指数分析
-    if vix['value'] < 18:
-        analysis.append("✅ **市场恐慌指数较低** - VIX指数低于18，显示市场情绪稳定，风险偏好较高。")
-    elif vix['value'] > 25:
-        analysis.append("⚠️ **市场恐慌指数升高** - VIX指数超过25，显示市场担忧情绪上升，需要谨慎操作。")
-    
-    # 4. 政策与情绪分析
-    analysis.append("\n# 📰 政策与情绪分析（方向盘与催化剂）")
-    
-    policy = data['policy_sentiment']['RECENT_POLICY']
-    news = data['policy_sentiment']['KEY_NEWS']
-    sectors = data['policy_sentiment']['SECTOR_PERFORMANCE']
-    
-    analysis.append(f"🏛️ **近期政策焦点**: {policy}")
-    analysis.append(f"📢 **重要新闻**: {news}")
-    
-    # 板块表现分析
-    analysis.append("📊 **板块表现**:")
-    for sector, performance in sectors.items():
-        sector_name = {
-            'AI_CHIP': '人工智能芯片',
-            'NEW_ENERGY': '新能源',
-            'CONSUMER': '大消费'
-        }.get(sector, sector)
-        
-        if performance > 2:
-            analysis.append(f"  ✅ {sector_name}: +{performance:.2f}% - 表现强势，受政策或资金青睐")
-        elif performance < -1:
-            analysis.append(f"  ⚠️ {sector_name}: {performance:.2f}% - 表现疲软，需关注原因")
-        else:
-            analysis.append(f"  🔸 {sector_name}: {performance:+.2f}% - 表现平稳")
-    
-    # 投资建议
-    analysis.append("\n# 💡 今日投资建议")
-    analysis.append("1. **关注北向资金流向** - 密切跟踪外资动向，特别是其重点增持的板块")
-    analysis.append("2. **注意板块轮动** - 市场可能在不同板块间轮动，避免追高")
-    analysis.append("3. **控制仓位风险** - 在不确定性中保持适度仓位，留有进退空间")
-    analysis.append("4. **关注政策受益板块** - 特别是人工智能、新能源等受政策支持的领域")
-    
-    analysis.append("\n---")
-    analysis.append("**免责声明**: 本分析仅供参考，不构成投资建议。市场有风险，投资需谨慎。")
-    
-    return "\n".join(analysis)
+    return "\n".join(analysis_rules.MARKET_ENGINE.render(data))
 
 def format_number(num):
     """格式化数字，保留两位小数并添加正负号"""
@@ -216,275 +726,271 @@ def format_number(num):
 def create_email_html(data, analysis):
     """
     创建HTML格式的邮件内容，按照四个部分组织
+
+    模板的静态部分在 report_template 中预先生成，这里只填入数据
     """
-    today = datetime.now().strftime("%Y-%m-%d")
-    
-    # 先处理分析文本，将换行符替换为HTML换行标签
-    analysis_html = analysis.replace('\n', '<br>')
-    
-    html_content = f"""
-    <html>
-    <head>
-        <style>
-            body {{ font-family: Arial, sans-serif; line-height: 1.6; color: #333; max-width: 900px; margin: 0 auto; }}
-            .header {{ background: linear-gradient(135deg, #667eea 0%, #764ba2 100%); color: white; padding: 20px; border-radius: 8px; margin-bottom: 20px; }}
-            .section {{ margin-bottom: 25px; padding: 15px; border: 1px solid #e0e0e0; border-radius: 8px; }}
-            .section h2 {{ color: #4a4a4a; border-bottom: 2px solid #667eea; padding-bottom: 8px; }}
-            table {{ width: 100%; border-collapse: collapse; margin: 15px 0; }}
-            th, td {{ padding: 12px; text-align: left; border-bottom: 1px solid #ddd; }}
-            th {{ background-color: #f8f9fa; }}
-            .positive {{ color: #28a745; font-weight: bold; }}
-            .negative {{ color: #dc3545; font-weight: bold; }}
-            .neutral {{ color: #6c757d; }}
-            .analysis {{ background-color: #f8f9fa; padding: 20px; border-radius: 8px; }}
-            .highlight {{ background-color: #fff3cd; padding: 15px; border-radius: 6px; border-left: 4px solid #ffc107; }}
-            .footer {{ text-align: center; margin-top: 30px; color: #6c757d; font-size: 14px; }}
-            .section-title {{ font-size: 1.5em; color: #4a4a4a; margin-top: 30px; margin-bottom: 15px; padding-bottom: 10px; border-bottom: 2px solid #667eea; }}
-        </style>
-    </head>
-    <body>
-        <div class="header">
-            <h1>📈 新手投资者每日必看市场报告</h1>
-            <p>生成时间: {datetime.now().strftime("%Y-%m-%d %H:%M:%S")}</p>
-        </div>
-    """
-    
-    # 1. 国内市场数据
-    html_content += """
-        <div class="section">
-            <div class="section-title">📊 国内市场（核心晴雨表）</div>
-            <table>
-                <tr><th>指标</th><th>数值</th><th>涨跌</th><th>涨跌幅</th></tr>
-    """
-    domestic = data['domestic_market']
-    for index in ['SHANGHAI', 'SZ_COMP', 'CHINEXT']:
-        values = domestic[index]
-        change_class = "positive" if values['change'] > 0 else "negative" if values['change'] < 0 else "neutral"
-        change_sign = "+" if values['change'] > 0 else ""
-        index_name = {
-            'SHANGHAI': '上证指数',
-            'SZ_COMP': '深证成指',
-            'CHINEXT': '创业板指'
-        }.get(index, index)
-        html_content += f"""
-            <tr>
-                <td>{index_name}</td>
-                <td>{values['value']}</td>
-                <td class="{change_class}">{change_sign}{values['change']}</td>
-                <td class="{change_class}">{change_sign}{values['change_pct']}%</td>
-            </tr>
-        """
-    
-    # 添加涨跌家数数据
-    html_content += f"""
-            <tr><td colspan="4"><hr></td></tr>
-            <tr>
-                <td>上涨家数</td>
-                <td colspan="3" class="positive">{domestic['RISING_STOCKS']}家</td>
-            </tr>
-            <tr>
-                <td>下跌家数</td>
-                <td colspan="3" class="negative">{domestic['FALLING_STOCKS']}家</td>
-            </tr>
-            <tr>
-                <td>涨停家数</td>
-                <td colspan="3" class="positive">{domestic['LIMIT_UP']}家</td>
-            </tr>
-            <tr>
-                <td>跌停家数</td>
-                <td colspan="3" class="negative">{domestic['LIMIT_DOWN']}家</td>
-            </tr>
-    """
-    html_content += "</table></div>"
-    
-    # 2. 资金动向数据
-    html_content += """
-        <div class="section">
-            <div class="section-title">💰 资金动向（市场发动机）</div>
-            <table>
-                <tr><th>指标</th><th>数值</th><th>说明</th></tr>
-    """
-    capital = data['capital_flows']
-    html_content += f"""
-            <tr>
-                <td>北向资金净流入</td>
-                <td class="{'positive' if capital['NORTHBOUND_NET'] > 0 else 'negative'}">{capital['NORTHBOUND_NET']}亿元</td>
-                <td>外资流向指标，正值表示净流入</td>
-            </tr>
-            <tr>
-                <td>沪股通净流入</td>
-                <td>{capital['NORTHBOUND_SH']}亿元</td>
-                <td>外资在上海市场的流向</td>
-            </tr>
-            <tr>
-                <td>深股通净流入</td>
-                <td>{capital['NORTHBOUND_SZ']}亿元</td>
-                <td>外资在深圳市场的流向</td>
-            </tr>
-            <tr>
-                <td>两市成交额</td>
-                <td>{capital['TURNOVER']}亿元</td>
-                <td>市场活跃度指标</td>
-            </tr>
-            <tr>
-                <td>融资融券余额</td>
-                <td>{capital['MARGIN_TRADING']}亿元</td>
-                <td>杠杆资金水平</td>
-            </tr>
-    """
-    html_content += "</table></div>"
-    
-    # 3. 全球市场数据
-    html_content += """
-        <div class="section">
-            <div class="section-title">🌍 全球市场（外部环境）</div>
-            <table>
-                <tr><th>指标</th><th>数值</th><th>涨跌</th><th>涨跌幅</th></tr>
-    """
-    global_markets = data['global_markets']
-    for indicator in ['USD/CNY', 'USD_INDEX', 'S&P_500', 'NASDAQ', 'NIKKEI', 'A50_INDEX', 'VIX']:
-        if indicator in global_markets:
-            values = global_markets[indicator]
-            change_class = "positive" if values['change'] > 0 else "negative" if values['change'] < 0 else "neutral"
-            change_sign = "+" if values['change'] > 0 else ""
-            indicator_name = {
-                'USD/CNY': '美元/人民币',
-                'USD_INDEX': '美元指数',
-                'S&P_500': '标普500指数',
-                'NASDAQ': '纳斯达克指数',
-                'NIKKEI': '日经225指数',
-                'A50_INDEX': '富时A50指数',
-                'VIX': '恐慌指数(VIX)'
-            }.get(indicator, indicator)
-            html_content += f"""
-                <tr>
-                    <td>{indicator_name}</td>
-                    <td>{values['value']}</td>
-                    <td class="{change_class}">{change_sign}{values['change']}</td>
-                    <td class="{change_class}">{change_sign}{values['change_pct']}%</td>
-                </tr>
-            """
-    html_content += "</table></div>"
-    
-    # 4. 政策与情绪数据
-    html_content += """
-        <div class="section">
-            <div class="section-title">📰 政策与情绪（方向盘与催化剂）</div>
-            <table>
-                <tr><th>类别</th><th>内容</th></tr>
-                <tr>
-                    <td>近期政策焦点</td>
-                    <td>{}</td>
-                </tr>
-                <tr>
-                    <td>重要新闻</td>
-                    <td>{}</td>
-                </tr>
-            </table>
-    """.format(data['policy_sentiment']['RECENT_POLICY'], data['policy_sentiment']['KEY_NEWS'])
-    
-    # 板块表现
-    html_content += """
-            <h3>📊 板块表现</h3>
-            <table>
-                <tr><th>板块</th><th>涨跌幅</th><th>表现评价</th></tr>
-    """
-    sectors = data['policy_sentiment']['SECTOR_PERFORMANCE']
-    for sector, performance in sectors.items():
-        sector_name = {
-            'AI_CHIP': '人工智能芯片',
-            'NEW_ENERGY': '新能源',
-            'CONSUMER': '大消费'
-        }.get(sector, sector)
-        
-        change_class = "positive" if performance > 0 else "negative" if performance < 0 else "neutral"
-        change_sign = "+" if performance > 0 else ""
-        
-        if performance > 2:
-            evaluation = "表现强势，受政策或资金青睐"
-        elif performance < -1:
-            evaluation = "表现疲软，需关注原因"
-        else:
-            evaluation = "表现平稳"
-            
-        html_content += f"""
-            <tr>
-                <td>{sector_name}</td>
-                <td class="{change_class}">{change_sign}{performance}%</td>
-                <td>{evaluation}</td>
-            </tr>
-        """
-    html_content += "</table></div>"
-    
-    # 添加市场分析和解读
-    html_content += f"""
-        <div class="analysis">
-            <div class="section-title">🧠 市场分析与解读</div>
-            <div class="highlight">
-                {analysis_html}
-            </div>
-        </div>
+    generated_at = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    return report_template.render_report(data, analysis, generated_at)
+
+def parse_recipients(value):
+    """解析逗号分隔的收件人列表"""
+    return [addr.strip() for addr in (value or '').split(',') if addr.strip()]
+
+def send_email(subject, html_content, recipients=None):
     """
-    
-    html_content += """
-        <div class="footer">
-            <p>⚠️ 免责声明: 本报告仅供参考，不构成投资建议。市场有风险，投资需谨慎。</p>
-            <p>📧 本邮件由GitHub Actions自动生成并发送</p>
-        </div>
-    </body>
-    </html>
+    使用QQ邮箱SMTP发送邮件
+
+    recipients 默认取 TO_EMAIL（可用逗号分隔多个地址）
     """
-    
-    return html_content
+    recipients = recipients or parse_recipients(to_email)
+    return send_reports(subject, {recipient: html_content for recipient in recipients})
 
-def send_email(subject, html_content):
+def send_reports(subject, reports, delivered=None):
     """
-    使用QQ邮箱SMTP发送邮件
+    把 {收件人: HTML内容} 中的报告分别发给各自的收件人
+
+    所有收件人通过同一个连接池投递，每个连接只做一次STARTTLS和登录；
+    delivered 为集合时，发送成功的收件人会加入其中
     """
+    recipients = list(reports)
+    if not recipients:
+        print("发送邮件时出错: 未配置收件人")
+        return False
+
+    pool = mailer.SMTPConnectionPool(email_user, email_password)
     try:
-        msg = MIMEMultipart('alternative')
-        msg['Subject'] = subject
-        msg['From'] = email_user
-        msg['To'] = to_email
-
-        # 添加HTML内容
-        part_html = MIMEText(html_content, 'html')
-        msg.attach(part_html)
-
-        # 连接QQ邮箱SMTP服务器并发送
-        server = smtplib.SMTP('smtp.qq.com', 587)
-        server.starttls()
-        server.login(email_user, email_password)
-        server.sendmail(email_user, to_email, msg.as_string())
-        server.quit()
-
-        print("邮件发送成功！")
-        return True
+        errors = mailer.deliver([(r, subject, reports[r]) for r in recipients], email_user, pool)
     except Exception as e:
         print(f"发送邮件时出错: {e}")
         return False
+    finally:
+        pool.close()
+
+    if delivered is not None:
+        delivered.update(r for r, e in errors.items() if not e)
+    failed = {r: e for r, e in errors.items() if e}
+    for recipient, error in failed.items():
+        print(f"发送邮件给 {recipient} 时出错: {error}")
+    if failed:
+        return False
+
+    print("邮件发送成功！" if len(recipients) == 1 else f"邮件发送成功！共 {len(recipients)} 位收件人")
+    return True
+
+# 最近一次获取到的报告数据，--render-only/--dry-run 用它代替实时获取
+LAST_DATA_PATH = os.path.join(CACHE_DIR, 'last_data.json')
+REPORT_OUTPUT = os.getenv('REPORT_OUTPUT', os.path.join(CACHE_DIR, 'report.html'))
+
+# 每位收件人最近一次收到的报告，以及按数据哈希缓存的渲染结果
+DELIVERY_LOG_PATH = os.path.join(CACHE_DIR, 'deliveries.json')
+REPORT_CACHE_DIR = os.path.join(CACHE_DIR, 'reports')
 
-def main():
-    """主函数，协调数据获取和邮件发送"""
-    print("开始获取金融数据并生成分析报告...")
+# 不随A股休市的境外行情，A股长假期间照常变动，计入报告标识（见 report_cache.report_key）；
+# 在岸人民币与A股同一日历，中行汇率表在假期里的跳动不算新行情
+OFFSHORE_INDICATORS = ('S&P_500', 'NASDAQ', 'NIKKEI', 'VIX', 'USD_INDEX', 'A50_INDEX')
+
+# 数据没有变化时也重新发送，手动触发工作流时可以打开
+FORCE_SEND = os.getenv('FORCE_SEND', '0') == '1'
+
+# 每次运行的分段计时写入该目录（见 tracing）；METRICS_IN_REPORT=1 时在邮件页脚附上耗时摘要
+METRICS_DIR = os.getenv('METRICS_DIR', os.path.join(CACHE_DIR, 'metrics'))
+METRICS_IN_REPORT = os.getenv('METRICS_IN_REPORT', '0') == '1'
+
+def _json_default(value):
+    # QuoteTable/QuoteView 等映射
+    if isinstance(value, Mapping):
+        return dict(value)
+    # NumPy 标量
+    if hasattr(value, 'item'):
+        return value.item()
+    raise TypeError(f"无法序列化的类型: {type(value).__name__}")
+
+def offshore_values(data):
+    """报告数据中境外行情的 {指标: 最新价}"""
+    values = {}
+    for key in OFFSHORE_INDICATORS:
+        quote = data.get(INDICATORS[key]['category'], {}).get(key)
+        if quote is not None:
+            values[key] = quote['value']
+    return values
+
+def report_coverage(data, watchlist=None):
+    """
+    报告中有数据的序列（见 flatten_financial_data）
+
+    watchlist 为订阅者的关注列表时只计其中关注的品种，其他人的品种补全后不必给他重发
+    """
+    if watchlist is not None:
+        data = subscriptions.personalize(
+            data, *subscriptions.resolve_watchlist(watchlist, INDICATORS, SECTOR_BOARDS))
+    return flatten_financial_data(data).keys()
+
+def save_report_data(data, path=LAST_DATA_PATH):
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, default=_json_default)
+    except (OSError, TypeError) as e:
+        print(f"保存报告数据时出错: {e}")
+
+def load_report_data(path=LAST_DATA_PATH):
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"读取最近一次的报告数据时出错: {e}")
+        return None
 
-    # 获取数据
-    financial_data = fetch_financial_data()
+def main(render_only=False, dry_run=False, output=None, force=None):
+    """
+    主函数，协调数据获取和邮件发送
+
+    render_only: 用最近一次保存的数据渲染报告并写入 output（默认 REPORT_OUTPUT），不发送
+    dry_run: 用最近一次保存的数据生成所有邮件，只打印将要发送的内容，不连接SMTP
+    这两种模式都不获取数据，也不会导入 akshare。
+    正常运行时，收件人已经收到过同一个交易日、境外行情也相同的报告，且这次没有多出上次缺少的数据，
+    则不再渲染和发送；force 为真时照常发送，并且不复用已渲染的报告
+    各阶段和每个上游数据源的耗时写入 METRICS_DIR 下的指标文件
+    """
+    tracing.start_run()
+    try:
+        return _run(render_only, dry_run, output, force)
+    finally:
+        tracing.finish_run(METRICS_DIR)
+
+def _with_timing_note(html):
+    """METRICS_IN_REPORT 打开时在页脚附上到目前为止的耗时摘要"""
+    tracer = tracing.active()
+    if not METRICS_IN_REPORT or tracer is None:
+        return html
+    summary = tracer.summary()
+    return report_template.add_footer_note(html, f"⏱️ {summary}") if summary else html
+
+def _run(render_only, dry_run, output, force):
+    force = FORCE_SEND if force is None else force
+    offline = render_only or dry_run
+    subscribers = subscriptions.load_subscribers()
+
+    tracing.annotate('mode', 'render-only' if render_only else 'dry-run' if dry_run else 'send')
+
+    if offline:
+        print("使用最近一次保存的数据生成分析报告...")
+        with tracing.span('load'):
+            financial_data = load_report_data()
+    else:
+        print("开始获取金融数据并生成分析报告...")
+
+        # 配置了订阅者时，只获取所有人关注品种的并集，每个品种获取一次
+        providers = {}
+        with tracing.span('fetch'):
+            if subscribers:
+                indicators, sectors = subscriptions.watched_instruments(subscribers, INDICATORS, SECTOR_BOARDS)
+                print(f"共 {len(subscribers)} 位订阅者，关注 {len(indicators)} 个指标和 {len(sectors)} 个板块")
+                financial_data = fetch_financial_data(indicators, sectors, providers=providers)
+            else:
+                financial_data = fetch_financial_data(providers=providers)
     
     if not financial_data:
         print("无法获取金融数据")
         return False
 
-    # 生成市场分析
-    market_analysis = generate_market_analysis(financial_data)
-    
-    # 生成邮件内容
+    if not offline:
+        # 历史按行情所属的交易日记录：节假日重跑时数据源不同、数值略有差异，仍是同一天的行情
+        trade_day = market_trade_date(load_trade_calendar())
+        tracing.annotate('trade_date', trade_day)
+
+        # 记录历史并补全日涨跌
+        with tracing.span('history'):
+            update_history(financial_data, day=trade_day, providers=providers)
+            save_report_data(financial_data)
+
+        # 报告按交易日和境外行情标识，A股休市期间境外市场有变化时照常发送
+        report_id = report_cache.report_key(trade_day, offshore_values(financial_data))
+
+    if render_only:
+        with tracing.span('analysis'):
+            market_analysis = generate_market_analysis(financial_data)
+        with tracing.span('render'):
+            html = create_email_html(financial_data, market_analysis)
+        output = output or REPORT_OUTPUT
+        with open(output, 'w', encoding='utf-8') as f:
+            f.write(_with_timing_note(html))
+        print(f"报告已写入 {output}")
+        return True
+
     today_str = datetime.now().strftime("%Y-%m-%d")
     email_subject = f"📈 新手投资者每日必看市场报告 ({today_str})"
-    email_html_body = create_email_html(financial_data, market_analysis)
 
-    # 发送邮件
-    success = send_email(email_subject, email_html_body)
+    if subscribers:
+        variants = {s['email']: subscriptions.watchlist_variant(s['watchlist']) for s in subscribers}
+        watchlists = {s['email']: s['watchlist'] for s in subscribers}
+    else:
+        variants = {r: subscriptions.watchlist_variant({}) for r in parse_recipients(to_email)}
+        watchlists = {r: None for r in variants}
+
+    # 跳过已经收到过同样报告的收件人，全部收到过时不再渲染
+    log = cache = None
+    pending = list(variants)
+    if not offline:
+        # 每位收件人的报告中有数据的序列，上次个别数据源失败时，补全后的重跑照常发送
+        coverage = {r: report_coverage(financial_data, watchlists[r]) for r in variants}
+        log = report_cache.DeliveryLog(DELIVERY_LOG_PATH)
+        cache = report_cache.ArtifactCache(REPORT_CACHE_DIR, report_cache.report_data_hash(financial_data),
+                                           refresh=force)
+        if not force:
+            pending = [r for r in variants
+                       if not log.delivered(r, report_cache.delivery_key(report_id, variants[r]), coverage[r])]
+            if variants and not pending:
+                print(f"交易日 {trade_day} 的报告已经发送过、境外行情也没有变化，跳过渲染和发送（可用 --force 强制重新发送）")
+                return True
+            if len(pending) < len(variants):
+                print(f"{len(variants) - len(pending)} 位收件人已收到相同的报告，本次跳过")
+
+    if subscribers:
+        # 按各自的关注列表并行渲染个性化报告
+        generated_at = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        pending_set = set(pending)
+        with tracing.span('render', reports=len(pending_set)):
+            reports = subscriptions.render_reports(
+                financial_data, [s for s in subscribers if s['email'] in pending_set], generated_at,
+                INDICATORS, SECTOR_BOARDS, cache=cache
+            )
+    else:
+        variant = subscriptions.watchlist_variant({})
+        email_html_body = cache.get(variant) if cache is not None else None
+        if email_html_body is None:
+            # 生成市场分析
+            with tracing.span('analysis'):
+                market_analysis = generate_market_analysis(financial_data)
+
+            # 生成邮件内容
+            with tracing.span('render', reports=1):
+                email_html_body = create_email_html(financial_data, market_analysis)
+            if cache is not None:
+                cache.put(variant, email_html_body)
+        reports = {recipient: email_html_body for recipient in pending}
+    if cache is not None and cache.hits:
+        print(f"复用了 {cache.hits} 份已渲染的报告")
+        tracing.annotate('cached_reports', cache.hits)
+
+    # 耗时摘要在缓存之后加入，缓存的报告中不含某一次运行的耗时
+    if METRICS_IN_REPORT:
+        reports = {recipient: _with_timing_note(html) for recipient, html in reports.items()}
+
+    if dry_run:
+        print(f"试运行，不发送邮件。主题: {email_subject}")
+        for recipient, html in reports.items():
+            print(f"  {recipient}: {len(html)} 字符")
+        return True
+
+    # 发送邮件，并记录发送成功的收件人
+    delivered = set()
+    with tracing.span('send', recipients=len(reports)):
+        success = send_reports(email_subject, reports, delivered=delivered)
+    tracing.annotate('delivered', len(delivered))
+    for recipient in delivered:
+        log.record(recipient, report_cache.delivery_key(report_id, variants[recipient]), coverage[recipient])
+    log.save()
     if not success:
         raise Exception("邮件发送失败，请检查配置。")
     
@@ -492,5 +998,13 @@ def main():
     return True
 
 if __name__ == '__main__':
-    main()
-
+    parser = argparse.ArgumentParser(description="获取金融数据并发送每日市场报告")
+    parser.add_argument('--render-only', action='store_true',
+                        help="用最近一次保存的数据渲染报告到文件，不获取数据也不发送")
+    parser.add_argument('--dry-run', action='store_true',
+                        help="用最近一次保存的数据生成邮件，只打印将要发送的内容")
+    parser.add_argument('--output', help="--render-only 时报告的输出路径")
+    parser.add_argument('--force', action='store_true', default=None,
+                        help="同样的报告已经发送过时也重新发送，并且不复用已渲染的报告")
+    args = parser.parse_args()
+    main(render_only=args.render_only, dry_run=args.dry_run, output=args.output, force=args.force)
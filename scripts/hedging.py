@@ -0,0 +1,227 @@
+"""
+多数据源对冲请求
+
+每个指标可以按优先级列出多个数据源（如新浪、东方财富、中国银行）。先只请求主数据源，
+主数据源在其历史 p95 延迟内没有返回时，再向下一个数据源发出对冲请求，最先返回有效数据的胜出；
+数据源报错或返回的数据中没有该指标时，立即切换到下一个。
+
+各数据源的延迟记录在按对数分桶的直方图中并持久化到磁盘，旧样本按指数衰减，
+对冲等待时间随数据源近期的表现自动调整。
+"""
+import bisect
+import json
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, wait
+
+from daemon_pool import DaemonExecutor
+from history_store import atomic_write
+
+# 样本不足时使用的对冲等待时间（秒）
+HEDGE_DEFAULT_DELAY = float(os.getenv('HEDGE_DEFAULT_DELAY', '10'))
+HEDGE_MIN_SAMPLES = int(os.getenv('HEDGE_MIN_SAMPLES', '5'))
+HEDGE_QUANTILE = 0.95
+
+# 每记录一个新样本，旧样本的权重乘以该系数，相当于只看最近约50次
+LATENCY_DECAY = 0.98
+
+# 直方图各桶的上界：50毫秒到约190秒，相邻桶相差25%；最后还有一个溢出桶
+LATENCY_BOUNDS = [round(0.05 * 1.25 ** i, 4) for i in range(38)]
+
+
+class LatencyHistogram:
+    """单个数据源的延迟直方图"""
+
+    def __init__(self, counts=None, samples=0):
+        if counts is None or len(counts) != len(LATENCY_BOUNDS) + 1:
+            counts = [0.0] * (len(LATENCY_BOUNDS) + 1)
+            samples = 0
+        self.counts = list(counts)
+        self.samples = samples
+
+    def record(self, seconds):
+        self.counts = [count * LATENCY_DECAY for count in self.counts]
+        self.counts[bisect.bisect_left(LATENCY_BOUNDS, seconds)] += 1
+        self.samples += 1
+
+    def quantile(self, q):
+        """返回 q 分位所在桶的上界，落在溢出桶时返回最大的上界"""
+        target = q * sum(self.counts)
+        cumulative = 0.0
+        for bound, count in zip(LATENCY_BOUNDS, self.counts):
+            cumulative += count
+            if cumulative >= target:
+                return bound
+        return LATENCY_BOUNDS[-1]
+
+    def to_dict(self):
+        return {'counts': [round(count, 6) for count in self.counts], 'samples': self.samples}
+
+
+class LatencyBook:
+    """所有数据源的延迟直方图，保存在一个JSON文件中"""
+
+    def __init__(self, path):
+        self.path = path
+        self.histograms = {}
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                raw = json.load(f)
+            for provider, entry in raw.items():
+                self.histograms[provider] = LatencyHistogram(entry.get('counts'), entry.get('samples', 0))
+        except (OSError, ValueError, AttributeError):
+            pass
+
+    def histogram(self, provider):
+        if provider not in self.histograms:
+            self.histograms[provider] = LatencyHistogram()
+        return self.histograms[provider]
+
+    def record(self, provider, seconds):
+        self.histogram(provider).record(seconds)
+
+    def hedge_delay(self, provider):
+        """向下一个数据源发出对冲请求前等待的秒数"""
+        histogram = self.histograms.get(provider)
+        if histogram is None or histogram.samples < HEDGE_MIN_SAMPLES:
+            return HEDGE_DEFAULT_DELAY
+        return histogram.quantile(HEDGE_QUANTILE)
+
+    def save(self):
+        state = {p: h.to_dict() for p, h in self.histograms.items()}
+        return atomic_write(self.path, lambda f: json.dump(state, f, ensure_ascii=False), '数据源延迟统计')
+
+
+def run_hedged(providers, chains, extract, book, ready=None, required=(), max_workers=None):
+    """
+    按数据源链并发获取指标，超过主数据源的 p95 延迟后对冲到下一个数据源
+
+    providers: {数据源: (无参可调用对象, 超时秒数)}
+    chains: {指标: [数据源, ...]}，按优先级排列
+    extract: (数据源, 返回结果) -> {指标: 取值}，从一个数据源的结果中取出所有能取到的指标
+    book: LatencyBook，成功、超时和被放弃的请求都会记录延迟（后两者记为截至放弃时的耗时）
+    ready: {数据源: 结果}，已有结果（如命中磁盘缓存）的数据源，轮到时直接使用
+    required: 不属于任何指标、但需要完整获取的数据源（如全市场快照）
+    返回 (values, winners, results, timings)：
+        values 为 {指标: 取值}，winners 为 {指标: 胜出的数据源}，
+        results 为 {数据源: 返回结果}（只含成功的），
+        timings 与 run_fetch_tasks 相同，另有'cache'和'abandoned'（被其他数据源抢先而放弃）两种状态
+    """
+    ready = ready or {}
+    values, winners, results, timings = {}, {}, {}, {}
+    if not chains and not required:
+        return values, winners, results, timings
+
+    def timed_call(func):
+        start = time.perf_counter()
+        value = func()
+        return value, time.perf_counter() - start
+
+    # 守护线程：被放弃的慢请求不会拖住进程退出
+    executor = DaemonExecutor(max_workers=max_workers or len(providers) or 1)
+    running = {}
+    started = {}
+    extracted = {}
+    stage = {key: 0 for key in chains}
+
+    def finish(name, result):
+        results[name] = result
+        try:
+            extracted[name] = extract(name, result)
+        except Exception as e:
+            print(f"解析数据源 {name} 时出错: {e}")
+            extracted[name] = {}
+
+    def launch(name):
+        if name in started:
+            return
+        started[name] = time.perf_counter()
+        if name in ready:
+            finish(name, ready[name])
+            timings[name] = {'status': 'cache', 'elapsed': 0.0, 'error': None}
+        else:
+            running[executor.submit(timed_call, providers[name][0])] = name
+
+    def settle(key):
+        for name in chains[key][:stage[key] + 1]:
+            if key in extracted.get(name, {}):
+                values[key] = extracted[name][key]
+                winners[key] = name
+                return True
+        return False
+
+    try:
+        for name in required:
+            launch(name)
+        for key, chain in chains.items():
+            launch(chain[0])
+
+        while True:
+            now = time.perf_counter()
+            for future, name in list(running.items()):
+                if now - started[name] >= providers[name][1] and not future.done():
+                    del running[future]
+                    future.cancel()
+                    extracted[name] = {}
+                    book.record(name, providers[name][1])
+                    timings[name] = {
+                        'status': 'timeout',
+                        'elapsed': now - started[name],
+                        'error': f"超过{providers[name][1]:g}秒未返回",
+                    }
+
+            # 已返回的数据源中有该指标即完成；当前数据源失败或超过对冲等待时间，则切换到下一个
+            hedge_deadlines = []
+            changed = True
+            while changed:
+                changed = False
+                for key, chain in chains.items():
+                    if key in values or settle(key) or stage[key] + 1 >= len(chain):
+                        continue
+                    current = chain[stage[key]]
+                    deadline = started[current] + book.hedge_delay(current)
+                    if current in extracted or deadline <= now:
+                        stage[key] += 1
+                        launch(chain[stage[key]])
+                        changed = True
+                    else:
+                        hedge_deadlines.append(deadline)
+
+            waiting = any(
+                key not in values and (
+                    stage[key] + 1 < len(chain) or
+                    any(name not in extracted for name in chain[:stage[key] + 1])
+                )
+                for key, chain in chains.items()
+            ) or any(name not in extracted for name in required)
+            if not waiting or not running:
+                break
+
+            deadlines = hedge_deadlines + [started[name] + providers[name][1] for name in running.values()]
+            done, _ = wait(list(running), timeout=max(0.0, min(deadlines) - now), return_when=FIRST_COMPLETED)
+            for future in done:
+                name = running.pop(future)
+                try:
+                    result, elapsed = future.result()
+                except Exception as e:
+                    extracted[name] = {}
+                    timings[name] = {
+                        'status': 'error',
+                        'elapsed': time.perf_counter() - started[name],
+                        'error': str(e),
+                    }
+                    continue
+                book.record(name, elapsed)
+                timings[name] = {'status': 'ok', 'elapsed': elapsed, 'error': None}
+                finish(name, result)
+    finally:
+        now = time.perf_counter()
+        for name in running.values():
+            elapsed = now - started[name]
+            # 删失样本：真实延迟至少为此，只记录胜出者会让 p95 越来越低、对冲越来越早
+            book.record(name, elapsed)
+            timings[name] = {'status': 'abandoned', 'elapsed': elapsed, 'error': "已由其他数据源返回"}
+        # 不等待被放弃的请求结束
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    return values, winners, results, timings
@@ -0,0 +1,141 @@
+"""
+本地列式历史数据存储
+
+每个序列按列拆成两个定长二进制文件：
+    <序列>.date   int32 日期(YYYYMMDD)，严格递增
+    <序列>.value  float64 数值
+每次运行只在文件末尾追加一条记录；读取时用 np.memmap 映射，
+查找"前一个收盘值"或最近N天窗口只会触及文件末尾的少量页面，不需要把全部历史读进内存。
+
+atomic_write 是各处缓存、状态和指标文件共用的整文件写入方式。
+"""
+import os
+import threading
+from urllib.parse import quote, unquote
+
+import numpy as np
+
+DATE_DTYPE = np.dtype('<i4')
+VALUE_DTYPE = np.dtype('<f8')
+
+
+def atomic_write(path, write, label, binary=False):
+    """
+    先写临时文件再替换为 path，避免留下半截文件；多个线程同时写同一个文件时互不干扰
+
+    write(f) 向打开的文件写入内容，binary 为假时按UTF-8文本打开。
+    写入失败时打印 "写入<label>时出错"，删除临时文件并返回False
+    """
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        with open(tmp_path, 'wb' if binary else 'w', encoding=None if binary else 'utf-8') as f:
+            write(f)
+        os.replace(tmp_path, path)
+        return True
+    except OSError as e:
+        print(f"写入{label}时出错: {e}")
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        return False
+
+
+def date_key(day):
+    """把 date/datetime 转成 YYYYMMDD 整数"""
+    return day.year * 10000 + day.month * 100 + day.day
+
+
+class HistoryStore:
+    """按序列存放每日数值的列式存储"""
+
+    def __init__(self, root):
+        self.root = root
+
+    def _paths(self, series):
+        name = quote(series, safe='')
+        return (os.path.join(self.root, f"{name}.date"),
+                os.path.join(self.root, f"{name}.value"))
+
+    def series(self):
+        """返回已有的全部序列名"""
+        try:
+            names = os.listdir(self.root)
+        except OSError:
+            return []
+        return sorted(unquote(name[:-len('.date')]) for name in names if name.endswith('.date'))
+
+    def _map(self, path, dtype, length):
+        if length == 0:
+            return np.empty(0, dtype=dtype)
+        return np.memmap(path, dtype=dtype, mode='r', shape=(length,))
+
+    def columns(self, series):
+        """
+        以只读内存映射的方式返回 (dates, values)
+
+        两个文件长度不一致时（例如上次写入中途失败）以较短的为准
+        """
+        date_path, value_path = self._paths(series)
+        try:
+            length = min(os.path.getsize(date_path) // DATE_DTYPE.itemsize,
+                         os.path.getsize(value_path) // VALUE_DTYPE.itemsize)
+        except OSError:
+            length = 0
+        return (self._map(date_path, DATE_DTYPE, length),
+                self._map(value_path, VALUE_DTYPE, length))
+
+    def append(self, series, day, value):
+        """
+        追加一条记录；同一天重复运行时覆盖当天的值，早于最后一条记录的日期会被忽略
+
+        返回是否写入
+        """
+        dates, _ = self.columns(series)
+        length = len(dates)
+        last = int(dates[-1]) if length else None
+        del dates
+        if last is not None and day < last:
+            return False
+
+        date_path, value_path = self._paths(series)
+        os.makedirs(self.root, exist_ok=True)
+        if last == day:
+            with open(value_path, 'r+b') as f:
+                f.seek((length - 1) * VALUE_DTYPE.itemsize)
+                f.write(np.array([value], dtype=VALUE_DTYPE).tobytes())
+            return True
+
+        # 先截掉可能残留的半条记录，再追加
+        for path, dtype, data in ((date_path, DATE_DTYPE, day), (value_path, VALUE_DTYPE, value)):
+            with open(path, 'ab') as f:
+                f.truncate(length * dtype.itemsize)
+                f.write(np.array([data], dtype=dtype).tobytes())
+        return True
+
+    def append_snapshot(self, day, values):
+        """把一次运行得到的 {序列: 数值} 全部追加到当天"""
+        for series, value in values.items():
+            self.append(series, day, value)
+
+    def contains(self, series, day):
+        """序列中是否已有 day 这一天的记录"""
+        dates, _ = self.columns(series)
+        pos = int(np.searchsorted(dates, day, side='left'))
+        return pos < len(dates) and int(dates[pos]) == day
+
+    def previous(self, series, day):
+        """返回严格早于 day 的最近一条记录的数值，没有时返回None"""
+        dates, values = self.columns(series)
+        pos = int(np.searchsorted(dates, day, side='left'))
+        if pos == 0:
+            return None
+        return float(values[pos - 1])
+
+    def window(self, series, day, n):
+        """返回截至 day（含当天）最近 n 条记录的 (dates, values) 副本"""
+        dates, values = self.columns(series)
+        end = int(np.searchsorted(dates, day, side='right'))
+        start = max(0, end - n)
+        return np.array(dates[start:end]), np.array(values[start:end])
@@ -0,0 +1,204 @@
+"""
+带连接池、条件请求和重试的HTTP层
+
+- 连接池：所有请求共用一个 requests.Session，复用 keep-alive 连接；
+- 条件请求：GET 响应带 ETag 或 Last-Modified 时，把响应体保存到本地缓存，
+  下次请求同一地址时带上 If-None-Match / If-Modified-Since，服务器返回 304 时直接用缓存的响应体；
+- 重试：连接错误和 429/5xx 响应按指数退避重试（只重试 GET/HEAD）；
+- 超时：调用方没有指定 timeout 的请求（AKShare 内部的请求大多如此）使用默认超时，不会无限期挂起；
+- 统计：记录本次运行的请求数、304次数、下载和节省的响应体字节数。
+
+AKShare 内部直接调用 requests.get/post，patch_requests() 在 with 块内把它们转到这个会话上。
+"""
+import hashlib
+import os
+import pickle
+import threading
+import time
+from contextlib import contextmanager
+
+import requests
+from requests.adapters import HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+from urllib3.util.retry import Retry
+
+from history_store import atomic_write
+
+HTTP_MAX_RETRIES = int(os.getenv('HTTP_MAX_RETRIES', '3'))
+HTTP_BACKOFF = float(os.getenv('HTTP_BACKOFF', '0.5'))
+HTTP_POOL_SIZE = int(os.getenv('HTTP_POOL_SIZE', '16'))
+
+# 未指定 timeout 的请求的默认超时（秒），连接和每次读取分别计时；0 表示不设超时
+HTTP_TIMEOUT = float(os.getenv('HTTP_TIMEOUT', '20'))
+
+# 超过这么多天没有用到的缓存响应会被清理
+HTTP_CACHE_MAX_AGE = float(os.getenv('HTTP_CACHE_MAX_AGE_DAYS', '14')) * 86400
+
+# 缓存的响应头中去掉这些字段：缓存的响应体已经解压，长度也可能与原始传输不同
+_DROPPED_HEADERS = ('content-encoding', 'content-length', 'transfer-encoding')
+
+
+class CachedSession(requests.Session):
+    """
+    支持条件请求的 requests.Session
+
+    cache_dir 为None时只做连接池和重试，不缓存响应
+    """
+
+    def __init__(self, cache_dir=None, pool_size=None, max_retries=None, backoff=None, timeout=None):
+        super().__init__()
+        self.timeout = HTTP_TIMEOUT if timeout is None else timeout
+        retry = Retry(
+            total=HTTP_MAX_RETRIES if max_retries is None else max_retries,
+            backoff_factor=HTTP_BACKOFF if backoff is None else backoff,
+            status_forcelist=(429, 500, 502, 503, 504),
+            allowed_methods=frozenset(['GET', 'HEAD']),
+            raise_on_status=False,
+        )
+        size = pool_size or HTTP_POOL_SIZE
+        adapter = HTTPAdapter(pool_connections=size, pool_maxsize=size, max_retries=retry)
+        self.mount('http://', adapter)
+        self.mount('https://', adapter)
+        self.cache_dir = cache_dir
+        self.lock = threading.Lock()
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.stats = {'requests': 0, 'conditional': 0, 'not_modified': 0,
+                      'bytes_downloaded': 0, 'bytes_saved': 0}
+
+    def _count(self, **deltas):
+        with self.lock:
+            for name, delta in deltas.items():
+                self.stats[name] += delta
+
+    def _cache_path(self, url):
+        return os.path.join(self.cache_dir, hashlib.sha1(url.encode('utf-8')).hexdigest() + '.pkl')
+
+    def _load(self, url):
+        try:
+            with open(self._cache_path(url), 'rb') as f:
+                entry = pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError):
+            return None
+        if entry.get('url') != url:
+            return None
+        # 服务器返回的头名大小写不一（etag/ETag），按不区分大小写查找
+        entry['headers'] = CaseInsensitiveDict(entry['headers'])
+        return entry
+
+    def _store(self, url, response):
+        entry = {
+            'url': url,
+            'headers': {k: v for k, v in response.headers.items() if k.lower() not in _DROPPED_HEADERS},
+            'content': response.content,
+            'encoding': response.encoding,
+        }
+        atomic_write(self._cache_path(url), lambda f: pickle.dump(entry, f, protocol=pickle.HIGHEST_PROTOCOL),
+                     'HTTP缓存', binary=True)
+
+    @staticmethod
+    def _from_cache(entry, response):
+        """用缓存的响应体和304响应中更新过的头构造一个200响应"""
+        cached = requests.Response()
+        cached.status_code = 200
+        cached.reason = 'OK'
+        cached.url = response.url
+        cached.request = response.request
+        cached.headers = CaseInsensitiveDict(entry['headers'])
+        cached.headers.update({k: v for k, v in response.headers.items() if k.lower() not in _DROPPED_HEADERS})
+        cached._content = entry['content']
+        cached.encoding = entry['encoding']
+        cached.elapsed = response.elapsed
+        cached.from_cache = True
+        return cached
+
+    def request(self, method, url, *args, **kwargs):
+        if kwargs.get('timeout') is None and self.timeout > 0:
+            kwargs['timeout'] = self.timeout
+        if kwargs.get('stream'):
+            # 流式下载不读取响应体，也不缓存
+            self._count(requests=1)
+            return super().request(method, url, *args, **kwargs)
+        if self.cache_dir is None or method.upper() != 'GET':
+            response = super().request(method, url, *args, **kwargs)
+            self._count(requests=1, bytes_downloaded=len(response.content))
+            return response
+
+        # 带查询参数的完整地址作为缓存键
+        full_url = requests.Request('GET', url, params=kwargs.get('params')).prepare().url
+        entry = self._load(full_url)
+        conditional = False
+        if entry is not None:
+            headers = dict(kwargs.get('headers') or {})
+            etag = entry['headers'].get('ETag')
+            last_modified = entry['headers'].get('Last-Modified')
+            if etag:
+                headers['If-None-Match'] = etag
+            if last_modified:
+                headers['If-Modified-Since'] = last_modified
+            conditional = bool(etag or last_modified)
+            kwargs['headers'] = headers
+
+        response = super().request(method, url, *args, **kwargs)
+        if conditional:
+            self._count(conditional=1)
+        if response.status_code == 304 and conditional:
+            self._count(requests=1, not_modified=1, bytes_saved=len(entry['content']))
+            os.utime(self._cache_path(full_url))
+            return self._from_cache(entry, response)
+
+        self._count(requests=1, bytes_downloaded=len(response.content))
+        if response.status_code == 200 and ('ETag' in response.headers or 'Last-Modified' in response.headers):
+            self._store(full_url, response)
+        return response
+
+    def prune(self, max_age=None):
+        """删除长时间没有用到的缓存响应"""
+        if self.cache_dir is None:
+            return
+        max_age = HTTP_CACHE_MAX_AGE if max_age is None else max_age
+        now = time.time()
+        try:
+            names = os.listdir(self.cache_dir)
+        except OSError:
+            return
+        for name in names:
+            path = os.path.join(self.cache_dir, name)
+            try:
+                if now - os.path.getmtime(path) > max_age:
+                    os.remove(path)
+            except OSError:
+                pass
+
+    def report(self):
+        """本次运行的统计摘要"""
+        s = self.stats
+        return (f"HTTP请求 {s['requests']} 次，其中条件请求 {s['conditional']} 次、304 {s['not_modified']} 次；"
+                f"下载 {s['bytes_downloaded'] / 1024:.1f} KB，节省 {s['bytes_saved'] / 1024:.1f} KB")
+
+
+@contextmanager
+def patch_requests(session):
+    """在 with 块内把 requests 模块级的 get/post/head/request 转到 session 上"""
+    originals = {name: getattr(requests, name) for name in ('request', 'get', 'post', 'head')}
+
+    def request(method, url, **kwargs):
+        return session.request(method, url, **kwargs)
+
+    def get(url, params=None, **kwargs):
+        return session.request('GET', url, params=params, **kwargs)
+
+    def post(url, data=None, json=None, **kwargs):
+        return session.request('POST', url, data=data, json=json, **kwargs)
+
+    def head(url, **kwargs):
+        kwargs.setdefault('allow_redirects', False)
+        return session.request('HEAD', url, **kwargs)
+
+    requests.request, requests.get, requests.post, requests.head = request, get, post, head
+    try:
+        yield session
+    finally:
+        for name, func in originals.items():
+            setattr(requests, name, func)
@@ -0,0 +1,233 @@
+"""
+批量邮件投递：复用已认证的SMTP连接，限制并发和发送速率，按收件人重试临时失败
+
+连接参数可通过环境变量配置，指向本地SMTP替身即可离线测试：
+    SMTP_HOST (默认 smtp.qq.com)、SMTP_PORT (默认 587)、SMTP_STARTTLS (默认 1)
+"""
+import os
+import queue
+import smtplib
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+
+SMTP_HOST = os.getenv('SMTP_HOST', 'smtp.qq.com')
+SMTP_PORT = int(os.getenv('SMTP_PORT', '587'))
+SMTP_STARTTLS = os.getenv('SMTP_STARTTLS', '1') != '0'
+SMTP_TIMEOUT = float(os.getenv('SMTP_TIMEOUT', '30'))
+
+# 连接池大小即最大并发；速率为每秒最多发送的邮件数，0表示不限制
+SMTP_POOL_SIZE = int(os.getenv('SMTP_POOL_SIZE', '3'))
+SMTP_RATE_LIMIT = float(os.getenv('SMTP_RATE_LIMIT', '5'))
+SMTP_MAX_RETRIES = int(os.getenv('SMTP_MAX_RETRIES', '3'))
+
+# 单个连接发送这么多封后主动重建，避免触发服务商的单连接上限
+MESSAGES_PER_CONNECTION = int(os.getenv('SMTP_MESSAGES_PER_CONNECTION', '50'))
+
+
+def build_message(sender, recipient, subject, html_content):
+    msg = MIMEMultipart('alternative')
+    msg['Subject'] = subject
+    msg['From'] = sender
+    msg['To'] = recipient
+    msg.attach(MIMEText(html_content, 'html'))
+    return msg.as_string()
+
+
+def is_transient(error):
+    """
+    判断是否为值得重试的临时错误：断线、超时或4xx响应
+
+    smtplib.SMTPException 是 OSError 的子类，所以先排除其余的SMTP错误（不支持STARTTLS/AUTH、
+    没有可用的认证方式等），剩下的 OSError 才是网络层面的错误
+    """
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        return all(400 <= code < 500 for code, _ in error.recipients.values())
+    if isinstance(error, smtplib.SMTPResponseException):
+        return 400 <= error.smtp_code < 500
+    if isinstance(error, smtplib.SMTPServerDisconnected):
+        return True
+    if isinstance(error, smtplib.SMTPException):
+        return False
+    return isinstance(error, OSError)
+
+
+def is_fatal(error):
+    """
+    判断建立连接时的错误是否影响整批投递：认证失败、不支持STARTTLS/AUTH，
+    以及其他非临时的SMTP错误（5xx问候或EHLO响应、没有可用的认证方式等）
+
+    这类错误换一个收件人也一样会失败，继续尝试只会反复登录失败，可能导致邮箱账号被锁定
+    """
+    if isinstance(error, (smtplib.SMTPAuthenticationError, smtplib.SMTPNotSupportedError)):
+        return True
+    if isinstance(error, (smtplib.SMTPConnectError, smtplib.SMTPHeloError)):
+        return not is_transient(error)
+    # login() 找不到双方都支持的认证方式等情况抛出的是 SMTPException 本身
+    return type(error) is smtplib.SMTPException
+
+
+class DeliveryAborted(Exception):
+    """连接池遇到致命错误后，其余的投递不再建立连接"""
+
+
+class RateLimiter:
+    """令牌桶限速，rate 为每秒允许的次数，<=0 时不限速"""
+
+    def __init__(self, rate, burst=1):
+        self.rate = rate
+        self.capacity = max(1, burst)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        if self.rate <= 0:
+            return
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait_for = (1 - self.tokens) / self.rate
+            time.sleep(wait_for)
+
+
+class SMTPConnectionPool:
+    """
+    已认证SMTP连接的连接池
+
+    连接在首次需要时建立（含STARTTLS和登录），用完放回池中复用；
+    发送出错的连接直接丢弃，下次按需重建。
+    第一个连接成功建立之前，建连逐个进行：账号或服务器配置有问题时只会尝试一次。
+    建立连接时遇到致命错误（见 is_fatal）后，之后借出连接都直接抛出 DeliveryAborted，不再尝试登录。
+    """
+
+    def __init__(self, user, password, host=None, port=None, size=None, starttls=None, timeout=None):
+        self.user = user
+        self.password = password
+        self.host = host or SMTP_HOST
+        self.port = port or SMTP_PORT
+        self.size = size or SMTP_POOL_SIZE
+        self.starttls = SMTP_STARTTLS if starttls is None else starttls
+        self.timeout = timeout or SMTP_TIMEOUT
+        self.idle = queue.LifoQueue()
+        self.slots = threading.BoundedSemaphore(self.size)
+        self.sent_on = {}
+        self.connections_opened = 0
+        self.failed = None
+        self.verified = False
+        self.lock = threading.Lock()
+        self.connect_lock = threading.Lock()
+
+    def _connect(self):
+        server = None
+        try:
+            server = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+            if self.starttls:
+                server.starttls()
+            if self.user:
+                server.login(self.user, self.password)
+        except Exception as e:
+            if server is not None:
+                self._close(server)
+            if is_fatal(e):
+                self.failed = e
+            raise
+        with self.lock:
+            self.connections_opened += 1
+        self.sent_on[id(server)] = 0
+        return server
+
+    def _open(self):
+        """建立新连接；还没有连接成功过时持锁建立，其他线程等它的结果"""
+        if not self.verified:
+            with self.connect_lock:
+                if self.failed is not None:
+                    raise DeliveryAborted(f"投递已中止: {self.failed}")
+                if not self.verified:
+                    server = self._connect()
+                    self.verified = True
+                    return server
+        return self._connect()
+
+    def _close(self, server):
+        self.sent_on.pop(id(server), None)
+        try:
+            server.quit()
+        except Exception:
+            server.close()
+
+    @contextmanager
+    def connection(self):
+        """借出一个连接；with 块内抛出异常时该连接被丢弃"""
+        self.slots.acquire()
+        server = None
+        try:
+            if self.failed is not None:
+                raise DeliveryAborted(f"投递已中止: {self.failed}")
+            try:
+                server = self.idle.get_nowait()
+            except queue.Empty:
+                server = self._open()
+            yield server
+        except BaseException:
+            if server is not None:
+                self._close(server)
+            server = None
+            raise
+        finally:
+            if server is not None:
+                self.sent_on[id(server)] = self.sent_on.get(id(server), 0) + 1
+                if self.sent_on[id(server)] >= MESSAGES_PER_CONNECTION:
+                    self._close(server)
+                else:
+                    self.idle.put(server)
+            self.slots.release()
+
+    def close(self):
+        while True:
+            try:
+                self._close(self.idle.get_nowait())
+            except queue.Empty:
+                break
+
+
+def deliver(messages, sender, pool, concurrency=None, rate_limit=None, max_retries=None, backoff=1.0):
+    """
+    并发投递一批邮件
+
+    messages 为 [(收件人, 主题, HTML内容), ...]；并发数默认等于连接池大小。
+    每个收件人独立重试临时错误（指数退避），永久错误不重试；
+    认证失败等致命错误会中止整批投递，其余收件人直接记为失败。
+    返回 {收件人: 错误信息或None}
+    """
+    concurrency = concurrency or pool.size
+    limiter = RateLimiter(SMTP_RATE_LIMIT if rate_limit is None else rate_limit)
+    max_retries = SMTP_MAX_RETRIES if max_retries is None else max_retries
+
+    def send_one(recipient, subject, html_content):
+        body = build_message(sender, recipient, subject, html_content)
+        for attempt in range(max_retries + 1):
+            limiter.acquire()
+            try:
+                with pool.connection() as server:
+                    server.sendmail(sender, [recipient], body)
+                return None
+            except Exception as e:
+                if attempt >= max_retries or not is_transient(e):
+                    return str(e) or e.__class__.__name__
+                time.sleep(backoff * (2 ** attempt))
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        futures = {
+            recipient: executor.submit(send_one, recipient, subject, html_content)
+            for recipient, subject, html_content in messages
+        }
+        return {recipient: future.result() for recipient, future in futures.items()}
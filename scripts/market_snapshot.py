@@ -0,0 +1,121 @@
+"""
+基于一次全市场A股快照计算的衍生指标
+
+快照来自 AKShare 的 stock_zh_a_spot_em（约5000只股票），
+所有统计都在 NumPy 数组上一次性完成，不再逐只股票或逐板块请求上游。
+"""
+import numpy as np
+import pandas as pd
+
+# 全市场A股快照数据源
+SNAPSHOT_SOURCE = 'stock_zh_a_spot_em'
+
+# 涨跌停幅度：主板10%，创业板/科创板20%，北交所30%，主板ST股5%
+MAIN_BOARD_LIMIT = 0.10
+GROWTH_BOARD_LIMIT = 0.20
+BSE_LIMIT = 0.30
+ST_LIMIT = 0.05
+
+# 创业板(300/301)和科创板(688/689)的代码前缀
+GROWTH_BOARD_PREFIXES = ['300', '301', '302', '688', '689']
+# 北交所代码前缀(8xxxxx, 4xxxxx, 92xxxx)
+BSE_PREFIXES = ['8', '4', '92']
+
+
+def _numeric_column(snapshot, column):
+    return pd.to_numeric(snapshot[column], errors='coerce').to_numpy(dtype=np.float64)
+
+
+def price_limit_ratios(codes, names):
+    """
+    按板块计算每只股票的涨跌停幅度
+
+    codes/names 为字符串数组；创业板和科创板的ST股同样按20%计算
+    """
+    prefix3 = codes.astype('U3')
+    growth = np.isin(prefix3, GROWTH_BOARD_PREFIXES)
+    bse = np.isin(codes.astype('U1'), BSE_PREFIXES) | np.isin(codes.astype('U2'), BSE_PREFIXES)
+    st = np.char.find(np.char.upper(names), 'ST') >= 0
+
+    limits = np.full(codes.shape, MAIN_BOARD_LIMIT)
+    limits[st] = ST_LIMIT
+    limits[growth] = GROWTH_BOARD_LIMIT
+    limits[bse] = BSE_LIMIT
+    return limits
+
+
+def compute_market_breadth(snapshot):
+    """
+    从全市场快照一次性计算涨跌家数、涨跌停家数和两市成交额
+
+    涨跌停价按交易所规则以昨收乘以(1±幅度)后四舍五入到分；
+    停牌(无最新价)的股票不计入，上市首日无涨跌幅限制的新股(N/C开头)不计入涨跌停。
+    成交额单位为亿元。
+    """
+    codes = snapshot['代码'].to_numpy(dtype=str)
+    names = snapshot['名称'].to_numpy(dtype=str)
+    price = _numeric_column(snapshot, '最新价')
+    prev_close = _numeric_column(snapshot, '昨收')
+    amount = _numeric_column(snapshot, '成交额')
+
+    trading = np.isfinite(price) & np.isfinite(prev_close) & (prev_close > 0)
+    limited = trading & ~np.isin(names.astype('U1'), ['N', 'C'])
+
+    limits = price_limit_ratios(codes, names)
+    limit_up_price = np.floor(prev_close * (1 + limits) * 100 + 0.5) / 100
+    limit_down_price = np.floor(prev_close * (1 - limits) * 100 + 0.5) / 100
+
+    # 用半分的容差比较，避免浮点误差
+    with np.errstate(invalid='ignore'):
+        rising = trading & (price > prev_close)
+        falling = trading & (price < prev_close)
+        limit_up = limited & (price >= limit_up_price - 0.005)
+        limit_down = limited & (price <= limit_down_price + 0.005)
+
+    return {
+        'RISING_STOCKS': int(rising.sum()),
+        'FALLING_STOCKS': int(falling.sum()),
+        'FLAT_STOCKS': int((trading & ~rising & ~falling).sum()),
+        'LIMIT_UP': int(limit_up.sum()),
+        'LIMIT_DOWN': int(limit_down.sum()),
+        'TURNOVER': round(float(np.nansum(amount)) / 1e8, 2),
+    }
+
+
+def compute_sector_performance(snapshot, membership):
+    """
+    按板块成分计算市值加权涨跌幅
+
+    membership 为 {板块: [股票代码, ...]}，所有板块的成分拼成一张(板块, 代码)表后，
+    用 bincount 一次完成分组加权求和，板块数量增加时不会多出上游请求。
+    返回 {板块: 涨跌幅(%)}，没有可用成分股的板块不出现在结果中。
+    """
+    sectors = list(membership)
+    if not sectors:
+        return {}
+
+    member_codes = np.concatenate([np.asarray(membership[s], dtype=str) for s in sectors])
+    sector_ids = np.repeat(np.arange(len(sectors)), [len(membership[s]) for s in sectors])
+
+    snapshot = snapshot.drop_duplicates(subset='代码')
+    code_index = pd.Index(snapshot['代码'].to_numpy(dtype=str))
+    positions = code_index.get_indexer(member_codes)
+    pct = _numeric_column(snapshot, '涨跌幅')
+    market_cap = _numeric_column(snapshot, '总市值')
+
+    found = positions >= 0
+    sector_ids = sector_ids[found]
+    positions = positions[found]
+    member_pct = pct[positions]
+    member_cap = market_cap[positions]
+    valid = np.isfinite(member_pct) & np.isfinite(member_cap) & (member_cap > 0)
+
+    weights = np.bincount(sector_ids[valid], weights=member_cap[valid], minlength=len(sectors))
+    weighted = np.bincount(sector_ids[valid], weights=member_pct[valid] * member_cap[valid],
+                           minlength=len(sectors))
+
+    return {
+        sector: round(float(weighted[i] / weights[i]), 2)
+        for i, sector in enumerate(sectors)
+        if weights[i] > 0
+    }
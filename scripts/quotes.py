@@ -0,0 +1,192 @@
+"""
+紧凑的行情容器
+
+一组品种的 value/change/change_pct 存放在一个 NumPy 结构化数组中，品种代码通过索引字典映射到行号，
+每个品种只占 24 字节，不再是一个字典加三个 float 对象。
+
+为了兼容原来 {'value','change','change_pct'} 嵌套字典的用法，QuoteTable 和 QuoteView
+都实现了 Mapping 接口：table[key]['value']、table.get(key)、.items()、按字段赋值都照常可用，
+generate_market_analysis、create_email_html 等代码无需改动。
+
+同一分类下还有涨跌家数这类非行情的标量（如 RISING_STOCKS），它们以普通值的形式另外保存。
+"""
+from collections.abc import Mapping, MutableMapping
+
+import numpy as np
+
+QUOTE_FIELDS = ('value', 'change', 'change_pct')
+QUOTE_DTYPE = np.dtype([(field, '<f8') for field in QUOTE_FIELDS])
+
+
+def is_quote(value):
+    """是否为行情（含 value 字段的映射）"""
+    return isinstance(value, Mapping) and 'value' in value
+
+
+class QuoteView(MutableMapping):
+    """
+    QuoteTable 中一行的字典视图
+
+    读写直接作用在结构化数组上；缺失的字段存为NaN，读取时与原来的字典一样返回0
+    """
+
+    __slots__ = ('_table', '_row')
+
+    def __init__(self, table, row):
+        self._table = table
+        self._row = row
+
+    def __getitem__(self, field):
+        if field not in QUOTE_DTYPE.fields:
+            raise KeyError(field)
+        value = float(self._table._data[field][self._row])
+        return 0 if value != value else value
+
+    def __setitem__(self, field, value):
+        if field not in QUOTE_DTYPE.fields:
+            raise KeyError(field)
+        self._table._data[field][self._row] = value
+
+    def __delitem__(self, field):
+        raise TypeError("行情字段不能删除")
+
+    def __iter__(self):
+        return iter(QUOTE_FIELDS)
+
+    def __len__(self):
+        return len(QUOTE_FIELDS)
+
+    def __repr__(self):
+        return repr(dict(self))
+
+    def to_dict(self):
+        return dict(self)
+
+
+class QuoteTable(MutableMapping):
+    """
+    以品种代码为键的行情表
+
+    赋值为行情（含 value 的映射）时写入结构化数组，其他值（如涨跌家数）作为普通标量保存；
+    遍历时先按写入顺序给出行情，再给出标量
+    """
+
+    def __init__(self, capacity=16):
+        self._data = np.full(max(1, capacity), np.nan, dtype=QUOTE_DTYPE)
+        self._index = {}
+        self._extras = {}
+
+    @classmethod
+    def from_arrays(cls, symbols, values):
+        """由代码列表和 (n, 3) 数组一次性构建；数组按 QUOTE_FIELDS 的顺序排列，缺失值为NaN"""
+        table = cls(len(symbols))
+        table.set_many(symbols, values)
+        return table
+
+    def _row_for(self, symbol):
+        row = self._index.get(symbol)
+        if row is None:
+            row = len(self._index)
+            if row >= len(self._data):
+                grown = np.full(len(self._data) * 2, np.nan, dtype=QUOTE_DTYPE)
+                grown[:row] = self._data[:row]
+                self._data = grown
+            self._index[symbol] = row
+            self._extras.pop(symbol, None)
+        return row
+
+    def set_many(self, symbols, values):
+        """批量写入行情"""
+        values = np.asarray(values, dtype=np.float64).reshape(len(symbols), len(QUOTE_FIELDS))
+        rows = np.fromiter((self._row_for(symbol) for symbol in symbols), dtype=np.intp, count=len(symbols))
+        for i, field in enumerate(QUOTE_FIELDS):
+            self._data[field][rows] = values[:, i]
+
+    def __getitem__(self, key):
+        row = self._index.get(key)
+        if row is not None:
+            return QuoteView(self, row)
+        return self._extras[key]
+
+    def __setitem__(self, key, value):
+        if not is_quote(value):
+            if key in self._index:
+                raise TypeError(f"{key} 已是行情，不能改为标量")
+            self._extras[key] = value
+            return
+        row = self._row_for(key)
+        if isinstance(value, QuoteView):
+            self._data[row] = value._table._data[value._row]
+            return
+        self._data[row] = tuple(value.get(field, np.nan) for field in QUOTE_FIELDS)
+
+    def __delitem__(self, key):
+        if key in self._extras:
+            del self._extras[key]
+            return
+        row = self._index.pop(key)
+        # 后面的行整体前移一行，行号与 symbols 的顺序保持一致（array、__reduce__ 依赖这一点）
+        last = len(self._index)
+        self._data[row:last] = self._data[row + 1:last + 1]
+        self._data[last] = np.nan
+        for symbol, r in self._index.items():
+            if r > row:
+                self._index[symbol] = r - 1
+
+    def __iter__(self):
+        yield from self._index
+        yield from self._extras
+
+    def __len__(self):
+        return len(self._index) + len(self._extras)
+
+    def __contains__(self, key):
+        return key in self._index or key in self._extras
+
+    def __repr__(self):
+        return repr(self.to_dict())
+
+    @property
+    def symbols(self):
+        return list(self._index)
+
+    @property
+    def array(self):
+        """行情部分的结构化数组（与 symbols 顺序一致），不复制"""
+        return self._data[:len(self._index)]
+
+    @property
+    def nbytes(self):
+        return self._data.nbytes
+
+    def flat_items(self):
+        """
+        按 (键, 字段, 值) 遍历全部数据，标量的字段为None
+
+        按列一次性转换为 Python 浮点数，比逐行取 QuoteView 快得多，用于展开规则字段
+        """
+        columns = [self.array[field].tolist() for field in QUOTE_FIELDS]
+        for key, row in self._index.items():
+            for field, column in zip(QUOTE_FIELDS, columns):
+                value = column[row]
+                yield key, field, 0 if value != value else value
+        for key, value in self._extras.items():
+            yield key, None, value
+
+    def to_dict(self):
+        """转换为原来的嵌套字典"""
+        result = {key: QuoteView(self, row).to_dict() for key, row in self._index.items()}
+        result.update(self._extras)
+        return result
+
+    def __reduce__(self):
+        # 多进程渲染时只传数组和索引
+        return (_rebuild_table, (self.array.copy(), list(self._index), self._extras))
+
+
+def _rebuild_table(data, symbols, extras):
+    table = QuoteTable(len(symbols))
+    table._data[:len(symbols)] = data
+    table._index = {symbol: i for i, symbol in enumerate(symbols)}
+    table._extras = dict(extras)
+    return table
@@ -0,0 +1,146 @@
+"""
+报告的幂等发送：同样的报告不重复渲染和发送
+
+- report_key：一份报告的标识，由行情所属的交易日（见 fetch_and_send.market_trade_date）和
+  不随A股休市的境外行情的哈希组成。节假日重跑时对冲选中了别的数据源、中行汇率表有跳动或
+  个别数据源超时，A股部分仍是同一个交易日的，不应该再发一遍；境外市场在A股长假期间照常交易，
+  这部分行情有变化时报告也随之更新；
+- DeliveryLog：记录每位收件人最近一次收到的报告标识和其中有数据的序列（覆盖范围），
+  标识相同、且这次的数据没有比上次多出序列时不再发送；上次个别数据源失败、重跑补全后照常发送；
+- report_data_hash / ArtifactCache：按 规范化后的报告数据哈希 + 关注列表 + 模板版本 缓存渲染好的HTML，
+  数据完全相同、需要补发时直接复用。
+
+手动重新触发工作流、或节假日行情没有更新时，main() 只获取数据，不会再渲染和占用SMTP额度。
+"""
+import hashlib
+import json
+import os
+import time
+from collections.abc import Mapping
+
+from history_store import atomic_write
+from report_template import TEMPLATE_VERSION
+
+# 渲染缓存的哈希中浮点数保留的小数位
+HASH_FLOAT_DIGITS = 6
+
+# 报告标识中境外行情保留的小数位：不同数据源报出的同一个收盘价只在更小的位数上有差异
+KEY_FLOAT_DIGITS = 2
+
+# 渲染结果的保留天数
+ARTIFACT_MAX_AGE = float(os.getenv('REPORT_CACHE_MAX_AGE_DAYS', '7')) * 86400
+
+
+def _normalize(value, digits):
+    if isinstance(value, Mapping):
+        return {str(k): _normalize(v, digits) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_normalize(v, digits) for v in value]
+    if hasattr(value, 'item') and not isinstance(value, (str, bytes)):
+        # NumPy 标量
+        value = value.item()
+    if isinstance(value, float):
+        if value != value:
+            return None
+        return round(value, digits) + 0.0
+    return value
+
+
+def _hash(value, digits):
+    text = json.dumps(_normalize(value, digits), sort_keys=True, ensure_ascii=False, separators=(',', ':'))
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+def report_data_hash(data):
+    """规范化（排序键、统一浮点精度）后的报告数据的 SHA-256 哈希，包括由历史派生的 stats"""
+    return _hash(data, HASH_FLOAT_DIGITS)
+
+
+def report_key(trade_day, offshore=None):
+    """
+    一份报告内容的标识：行情所属的交易日（YYYYMMDD）+ 境外行情
+
+    offshore 为 {指标: 最新价}，只取不随A股休市的品种；数值按 KEY_FLOAT_DIGITS 取整，
+    不包含由哪个数据源返回
+    """
+    return f"trade-{trade_day}-{_hash(offshore or {}, KEY_FLOAT_DIGITS)[:16]}"
+
+
+def delivery_key(key, variant):
+    """一份报告的标识：同样的报告标识、同样的关注列表即为同一份报告"""
+    return f"{key}/{variant}"
+
+
+class DeliveryLog:
+    """{收件人: 最近一次成功发送的报告标识和覆盖范围}，保存在一个JSON文件中"""
+
+    def __init__(self, path):
+        self.path = path
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                self.entries = json.load(f)
+        except (OSError, ValueError):
+            self.entries = {}
+
+    def delivered(self, recipient, key, coverage=()):
+        """收件人是否已经收到过同一份报告：标识相同，coverage 中的序列上次都已包含"""
+        entry = self.entries.get(recipient)
+        if entry is None or entry.get('key') != key:
+            return False
+        # 没有记录覆盖范围的旧记录只比较标识
+        delivered = entry.get('coverage')
+        return delivered is None or set(coverage) <= set(delivered)
+
+    def record(self, recipient, key, coverage=()):
+        self.entries[recipient] = {'key': key, 'coverage': sorted(coverage),
+                                   'sent_at': time.strftime('%Y-%m-%d %H:%M:%S')}
+
+    def save(self):
+        return atomic_write(self.path, lambda f: json.dump(self.entries, f, ensure_ascii=False, indent=1), '发送记录')
+
+
+class ArtifactCache:
+    """
+    渲染好的HTML报告缓存，键为 数据哈希（见 report_data_hash）+ 变体（关注列表）+ 模板版本
+
+    模板或分析规则改动后递增 report_template.TEMPLATE_VERSION，旧的渲染结果即失效；
+    refresh 为真时（--force）不读取缓存，重新渲染的结果照常写回
+    """
+
+    def __init__(self, root, data_hash, refresh=False):
+        self.root = root
+        self.data_hash = data_hash
+        self.refresh = refresh
+        self.hits = 0
+        self._prune()
+
+    def _path(self, variant):
+        return os.path.join(self.root, f"{self.data_hash[:32]}-{variant}-v{TEMPLATE_VERSION}.html")
+
+    def get(self, variant):
+        if self.refresh:
+            return None
+        try:
+            with open(self._path(variant), 'r', encoding='utf-8') as f:
+                html = f.read()
+        except OSError:
+            return None
+        self.hits += 1
+        return html
+
+    def put(self, variant, html):
+        return atomic_write(self._path(variant), lambda f: f.write(html), '报告缓存')
+
+    def _prune(self):
+        now = time.time()
+        try:
+            names = os.listdir(self.root)
+        except OSError:
+            return
+        for name in names:
+            path = os.path.join(self.root, name)
+            try:
+                if now - os.path.getmtime(path) > ARTIFACT_MAX_AGE:
+                    os.remove(path)
+            except OSError:
+                pass
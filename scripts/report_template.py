@@ -0,0 +1,267 @@
+"""
+预编译的HTML报告模板
+
+静态部分（样式表、各节表头、页脚）在模块加载时生成一次，
+每份报告只按数据格式化表格行，再用 list-join 一次拼接。
+为多位读者渲染个性化报告时，单份报告的开销主要取决于数据本身。
+"""
+
+from analysis_rules import SECTOR_NAMES, sector_evaluation
+
+# 模板版本：模板或分析规则改动、同样的数据会渲染出不同结果时递增，
+# 按版本缓存的旧渲染结果随之失效（见 report_cache）
+TEMPLATE_VERSION = 4
+
+INDEX_NAMES = {
+    'SHANGHAI': '上证指数',
+    'SZ_COMP': '深证成指',
+    'CHINEXT': '创业板指'
+}
+
+GLOBAL_NAMES = {
+    'USD/CNY': '美元/人民币',
+    'USD_INDEX': '美元指数',
+    'S&P_500': '标普500指数',
+    'NASDAQ': '纳斯达克指数',
+    'NIKKEI': '日经225指数',
+    'A50_INDEX': '富时A50指数',
+    'VIX': '恐慌指数(VIX)'
+}
+
+# 涨跌家数：(字段, 名称, 样式)
+BREADTH_ROWS = [
+    ('RISING_STOCKS', '上涨家数', 'positive'),
+    ('FALLING_STOCKS', '下跌家数', 'negative'),
+    ('LIMIT_UP', '涨停家数', 'positive'),
+    ('LIMIT_DOWN', '跌停家数', 'negative'),
+]
+
+# 资金动向：(字段, 名称, 说明)
+CAPITAL_ROWS = [
+    ('NORTHBOUND_NET', '北向资金净流入', '外资流向指标，正值表示净流入'),
+    ('NORTHBOUND_SH', '沪股通净流入', '外资在上海市场的流向'),
+    ('NORTHBOUND_SZ', '深股通净流入', '外资在深圳市场的流向'),
+    ('TURNOVER', '两市成交额', '市场活跃度指标'),
+    ('MARGIN_TRADING', '融资融券余额', '杠杆资金水平'),
+]
+
+_STYLE = """
+    <html>
+    <head>
+        <style>
+            body { font-family: Arial, sans-serif; line-height: 1.6; color: #333; max-width: 900px; margin: 0 auto; }
+            .header { background: linear-gradient(135deg, #667eea 0%, #764ba2 100%); color: white; padding: 20px; border-radius: 8px; margin-bottom: 20px; }
+            .section { margin-bottom: 25px; padding: 15px; border: 1px solid #e0e0e0; border-radius: 8px; }
+            .section h2 { color: #4a4a4a; border-bottom: 2px solid #667eea; padding-bottom: 8px; }
+            table { width: 100%; border-collapse: collapse; margin: 15px 0; }
+            th, td { padding: 12px; text-align: left; border-bottom: 1px solid #ddd; }
+            th { background-color: #f8f9fa; }
+            .positive { color: #28a745; font-weight: bold; }
+            .negative { color: #dc3545; font-weight: bold; }
+            .neutral { color: #6c757d; }
+            .analysis { background-color: #f8f9fa; padding: 20px; border-radius: 8px; }
+            .highlight { background-color: #fff3cd; padding: 15px; border-radius: 6px; border-left: 4px solid #ffc107; }
+            .footer { text-align: center; margin-top: 30px; color: #6c757d; font-size: 14px; }
+            .section-title { font-size: 1.5em; color: #4a4a4a; margin-top: 30px; margin-bottom: 15px; padding-bottom: 10px; border-bottom: 2px solid #667eea; }
+        </style>
+    </head>
+    <body>
+        <div class="header">
+            <h1>📈 新手投资者每日必看市场报告</h1>
+            <p>生成时间: """
+
+_HEADER_END = """</p>
+        </div>
+    """
+
+_DOMESTIC_HEAD = """
+        <div class="section">
+            <div class="section-title">📊 国内市场（核心晴雨表）</div>
+            <table>
+                <tr><th>指标</th><th>数值</th><th>涨跌</th><th>涨跌幅</th></tr>
+    """
+
+_BREADTH_SEPARATOR = """
+            <tr><td colspan="4"><hr></td></tr>"""
+
+_TABLE_END = """
+    </table></div>"""
+
+_CAPITAL_HEAD = """
+        <div class="section">
+            <div class="section-title">💰 资金动向（市场发动机）</div>
+            <table>
+                <tr><th>指标</th><th>数值</th><th>说明</th></tr>
+    """
+
+_GLOBAL_HEAD = """
+        <div class="section">
+            <div class="section-title">🌍 全球市场（外部环境）</div>
+            <table>
+                <tr><th>指标</th><th>数值</th><th>涨跌</th><th>涨跌幅</th></tr>
+    """
+
+_POLICY_TABLE = """
+        <div class="section">
+            <div class="section-title">📰 政策与情绪（方向盘与催化剂）</div>
+            <table>
+                <tr><th>类别</th><th>内容</th></tr>
+                <tr>
+                    <td>近期政策焦点</td>
+                    <td>{policy}</td>
+                </tr>
+                <tr>
+                    <td>重要新闻</td>
+                    <td>{news}</td>
+                </tr>
+            </table>
+    """
+
+_SECTOR_HEAD = """
+            <h3>📊 板块表现</h3>
+            <table>
+                <tr><th>板块</th><th>涨跌幅</th><th>表现评价</th></tr>
+    """
+
+_ANALYSIS = """
+        <div class="analysis">
+            <div class="section-title">🧠 市场分析与解读</div>
+            <div class="highlight">
+                {analysis}
+            </div>
+        </div>
+    """
+
+_FOOTER = """
+        <div class="footer">
+            <p>⚠️ 免责声明: 本报告仅供参考，不构成投资建议。市场有风险，投资需谨慎。</p>
+            <p>📧 本邮件由GitHub Actions自动生成并发送</p>
+        </div>
+    </body>
+    </html>
+    """
+
+# 页脚的最后一行，附加说明（如运行耗时）插在它后面；渲染结果缓存之后再插入，缓存的报告不受影响
+_FOOTER_LAST_LINE = "<p>📧 本邮件由GitHub Actions自动生成并发送</p>"
+
+def add_footer_note(html, note):
+    """在报告页脚末尾追加一行说明；html 中找不到页脚时原样返回"""
+    return html.replace(_FOOTER_LAST_LINE, f"{_FOOTER_LAST_LINE}\n            <p>{note}</p>", 1)
+
+def _change_style(change):
+    """返回 (样式类, 正号)"""
+    if change > 0:
+        return "positive", "+"
+    if change < 0:
+        return "negative", ""
+    return "neutral", ""
+
+
+def _domestic_row(name, value, change, change_pct):
+    cls, sign = _change_style(change)
+    return f"""
+            <tr>
+                <td>{name}</td>
+                <td>{value}</td>
+                <td class="{cls}">{sign}{change}</td>
+                <td class="{cls}">{sign}{change_pct}%</td>
+            </tr>
+        """
+
+
+def _global_row(name, value, change, change_pct):
+    cls, sign = _change_style(change)
+    return f"""
+                <tr>
+                    <td>{name}</td>
+                    <td>{value}</td>
+                    <td class="{cls}">{sign}{change}</td>
+                    <td class="{cls}">{sign}{change_pct}%</td>
+                </tr>
+            """
+
+
+def _breadth_row(name, cls, count):
+    return f"""
+            <tr>
+                <td>{name}</td>
+                <td colspan="3" class="{cls}">{count}家</td>
+            </tr>"""
+
+
+def _capital_row(name, cls, value, note):
+    return f"""
+            <tr>
+                <td>{name}</td>
+                <td{cls}>{value}亿元</td>
+                <td>{note}</td>
+            </tr>"""
+
+
+def _sector_row(name, performance):
+    cls, sign = _change_style(performance)
+    return f"""
+            <tr>
+                <td>{name}</td>
+                <td class="{cls}">{sign}{performance}%</td>
+                <td>{sector_evaluation(performance)}</td>
+            </tr>
+        """
+
+
+def _quote_rows(row, quotes, names):
+    parts = []
+    for key, name in names.items():
+        values = quotes.get(key)
+        if values is not None:
+            parts.append(row(name, values['value'], values['change'], values['change_pct']))
+    return parts
+
+
+def render_report(data, analysis, generated_at):
+    """
+    渲染完整的HTML报告
+
+    generated_at 为页眉中的生成时间字符串；数据中缺失的指标对应的行不输出。
+    """
+    domestic = data.get('domestic_market', {})
+    capital = data.get('capital_flows', {})
+    global_markets = data.get('global_markets', {})
+    policy = data.get('policy_sentiment', {})
+
+    parts = [_STYLE, generated_at, _HEADER_END, _DOMESTIC_HEAD]
+    parts += _quote_rows(_domestic_row, domestic, INDEX_NAMES)
+
+    breadth = [(key, name, cls) for key, name, cls in BREADTH_ROWS if key in domestic]
+    if breadth:
+        parts.append(_BREADTH_SEPARATOR)
+        parts += [_breadth_row(name, cls, domestic[key]) for key, name, cls in breadth]
+        parts.append("\n    ")
+    parts.append("</table></div>")
+
+    parts.append(_CAPITAL_HEAD)
+    for key, name, note in CAPITAL_ROWS:
+        if key not in capital:
+            continue
+        value = capital[key]
+        if key == 'NORTHBOUND_NET':
+            cls = f' class="{"positive" if value > 0 else "negative"}"'
+        else:
+            cls = ''
+        parts.append(_capital_row(name, cls, value, note))
+    parts.append(_TABLE_END)
+
+    parts.append(_GLOBAL_HEAD)
+    parts += _quote_rows(_global_row, global_markets, GLOBAL_NAMES)
+    parts.append("</table></div>")
+
+    parts.append(_POLICY_TABLE.format(policy=policy.get('RECENT_POLICY', '暂无'),
+                                      news=policy.get('KEY_NEWS', '暂无')))
+    parts.append(_SECTOR_HEAD)
+    for sector, performance in policy.get('SECTOR_PERFORMANCE', {}).items():
+        parts.append(_sector_row(SECTOR_NAMES.get(sector, sector), performance))
+    parts.append("</table></div>")
+
+    parts.append(_ANALYSIS.format(analysis=analysis.replace('\n', '<br>')))
+    parts.append(_FOOTER)
+    return ''.join(parts)
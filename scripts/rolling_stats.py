@@ -0,0 +1,149 @@
+"""
+指标的增量滚动统计：5/20/60日均线、20日波动率和近一年历史分位
+
+每个序列只保留最近 RANK_WINDOW 个值及各窗口的滚动和，
+每天的新值通过在线更新加入，单次运行的开销只与指标数量有关，与历史长度无关。
+"""
+import json
+import math
+from bisect import bisect_right, insort
+from collections import deque
+
+from history_store import atomic_write
+
+MA_WINDOWS = (5, 20, 60)
+VOLATILITY_WINDOW = 20
+RANK_WINDOW = 250
+
+
+class SeriesStats:
+    """单个序列的滚动统计状态"""
+
+    __slots__ = ('last_date', 'values', 'sorted_values', 'sums', 'ret_sum', 'ret_sq_sum', 'base')
+
+    def __init__(self):
+        self.last_date = None
+        self.values = deque()
+        self.sorted_values = []
+        self.sums = {n: 0.0 for n in MA_WINDOWS}
+        self.ret_sum = 0.0
+        self.ret_sq_sum = 0.0
+        # 当天更新之前的状态，同一天重复运行时从这里重新计算
+        self.base = None
+
+    def to_dict(self, with_base=True):
+        state = {
+            'last_date': self.last_date,
+            'values': list(self.values),
+            'sums': {str(n): s for n, s in self.sums.items()},
+            'ret_sum': self.ret_sum,
+            'ret_sq_sum': self.ret_sq_sum,
+        }
+        if with_base:
+            state['base'] = self.base
+        return state
+
+    @classmethod
+    def from_dict(cls, state):
+        stats = cls()
+        stats.last_date = state.get('last_date')
+        stats.values = deque(state.get('values', []))
+        stats.sorted_values = sorted(stats.values)
+        stats.sums = {n: float(state.get('sums', {}).get(str(n), 0.0)) for n in MA_WINDOWS}
+        stats.ret_sum = state.get('ret_sum', 0.0)
+        stats.ret_sq_sum = state.get('ret_sq_sum', 0.0)
+        stats.base = state.get('base')
+        return stats
+
+    def _return_at(self, i):
+        """values[i-1] -> values[i] 的日收益率，前值不可用时返回None"""
+        prev = self.values[i - 1]
+        return self.values[i] / prev - 1 if prev else None
+
+    def _push(self, value):
+        values = self.values
+        values.append(value)
+        insort(self.sorted_values, value)
+        length = len(values)
+
+        for n in MA_WINDOWS:
+            self.sums[n] += value
+            if length > n:
+                self.sums[n] -= values[-n - 1]
+
+        if length >= 2:
+            r = self._return_at(length - 1)
+            if r is not None:
+                self.ret_sum += r
+                self.ret_sq_sum += r * r
+        # 移出波动率窗口的那一个收益率
+        if length >= VOLATILITY_WINDOW + 2:
+            r = self._return_at(length - VOLATILITY_WINDOW - 1)
+            if r is not None:
+                self.ret_sum -= r
+                self.ret_sq_sum -= r * r
+
+        if length > RANK_WINDOW:
+            old = values.popleft()
+            del self.sorted_values[bisect_right(self.sorted_values, old) - 1]
+
+    def update(self, day, value):
+        """加入 day 的值；同一天重复调用时以最新的值为准，早于最后日期的值被忽略"""
+        if self.last_date is not None and day < self.last_date:
+            return
+        if day == self.last_date and self.base is not None:
+            restored = SeriesStats.from_dict(self.base)
+            self.values = restored.values
+            self.sorted_values = restored.sorted_values
+            self.sums = restored.sums
+            self.ret_sum = restored.ret_sum
+            self.ret_sq_sum = restored.ret_sq_sum
+        else:
+            self.base = self.to_dict(with_base=False)
+        self.last_date = day
+        self._push(float(value))
+
+    def summary(self):
+        """返回当前的均线、波动率(%)和历史分位(%)，样本不足的项为None"""
+        length = len(self.values)
+        result = {f"ma{n}": (self.sums[n] / n if length >= n else None) for n in MA_WINDOWS}
+
+        count = min(length - 1, VOLATILITY_WINDOW)
+        volatility = None
+        if count >= 2:
+            variance = (self.ret_sq_sum - self.ret_sum ** 2 / count) / (count - 1)
+            volatility = math.sqrt(max(variance, 0.0)) * 100
+        result['volatility'] = volatility
+
+        result['pct_rank'] = (
+            bisect_right(self.sorted_values, self.values[-1]) / length * 100 if length else None
+        )
+        result['count'] = length
+        return result
+
+
+class RollingStatsBook:
+    """所有序列的滚动统计，状态保存在一个JSON文件中"""
+
+    def __init__(self, path):
+        self.path = path
+        self.series = {}
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                states = json.load(f)
+            self.series = {name: SeriesStats.from_dict(state) for name, state in states.items()}
+        except (OSError, ValueError):
+            pass
+
+    def update(self, day, values):
+        """用 {序列: 数值} 更新对应序列，返回这些序列的 {序列: 统计摘要}"""
+        summaries = {}
+        for name, value in values.items():
+            stats = self.series.setdefault(name, SeriesStats())
+            stats.update(day, value)
+            summaries[name] = stats.summary()
+        return summaries
+
+    def save(self):
+        states = {name: stats.to_dict() for name, stats in self.series.items()}
+        return atomic_write(self.path, lambda f: json.dump(states, f), '滚动统计')
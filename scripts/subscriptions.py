@@ -0,0 +1,184 @@
+"""
+订阅者配置与个性化报告
+
+每位订阅者有自己的关注列表（指数、汇率、板块），数据只按所有关注列表的并集获取一次，
+再按各自的关注列表并行渲染报告。配置从环境变量 SUBSCRIBERS（JSON字符串，适合放在
+GitHub Secrets 中）或 SUBSCRIBERS_FILE 指向的JSON文件读取，格式如下：
+
+    [
+        {"email": "a@example.com",
+         "watchlist": {"indices": ["SHANGHAI", "S&P_500"], "fx": ["USD/CNY"], "sectors": ["AI_CHIP"]}},
+        {"email": "b@example.com"}
+    ]
+
+indices/fx 分别对应指标注册表中 kind 为 'index'/'fx' 的指标，sectors 对应板块；
+关注列表中省略的类别表示关注该类别的全部品种，例如只写了 indices 的订阅者会收到列出的指数和全部汇率。
+"""
+import hashlib
+import json
+import os
+from collections.abc import Mapping
+from concurrent.futures import ProcessPoolExecutor
+
+from analysis_rules import MARKET_ENGINE
+from report_template import render_report
+
+WATCHLIST_CATEGORIES = ('indices', 'fx', 'sectors')
+
+# 关注列表中的指标类别 -> 指标注册表中的 kind
+WATCHLIST_KINDS = {'indices': 'index', 'fx': 'fx'}
+
+# 渲染用的进程数，默认等于CPU核数
+RENDER_WORKERS = int(os.getenv('RENDER_WORKERS', '0')) or os.cpu_count() or 1
+
+
+def load_subscribers(path=None):
+    """读取订阅者配置，未配置时返回空列表"""
+    raw = os.getenv('SUBSCRIBERS')
+    path = path or os.getenv('SUBSCRIBERS_FILE')
+    try:
+        if not raw and path:
+            with open(path, 'r', encoding='utf-8') as f:
+                raw = f.read()
+        if not raw:
+            return []
+        subscribers = json.loads(raw)
+    except (OSError, ValueError) as e:
+        print(f"读取订阅者配置时出错: {e}")
+        return []
+
+    valid = []
+    for entry in subscribers:
+        if not isinstance(entry, dict) or not entry.get('email'):
+            print(f"忽略无效的订阅者配置: {entry}")
+            continue
+        valid.append({'email': entry['email'], 'watchlist': entry.get('watchlist') or {}})
+    return valid
+
+
+def _watched(watchlist, category, available):
+    items = watchlist.get(category)
+    if items is None:
+        return set(available)
+    unknown = set(items) - set(available)
+    if unknown:
+        print(f"关注列表中有未知的{category}: {', '.join(sorted(unknown))}")
+    return set(items) & set(available)
+
+
+def resolve_watchlist(watchlist, indicators, sectors):
+    """
+    把关注列表解析为 (指标集合, 板块集合)
+
+    indicators 为指标注册表（每个指标有 kind），sectors 为全部可用的板块；
+    每个类别只在对应 kind 的指标中解析，省略的类别取该 kind 的全部指标
+    """
+    wanted_indicators = set()
+    for category, kind in WATCHLIST_KINDS.items():
+        available = [key for key, spec in indicators.items() if spec.get('kind') == kind]
+        wanted_indicators |= _watched(watchlist, category, available)
+    return wanted_indicators, _watched(watchlist, 'sectors', sectors)
+
+
+def watched_instruments(subscribers, indicators, sectors):
+    """
+    计算所有订阅者关注品种的并集
+
+    indicators/sectors 为指标注册表和全部可用的板块；返回 (指标列表, 板块列表)，顺序与输入一致
+    """
+    wanted_indicators = set()
+    wanted_sectors = set()
+    for subscriber in subscribers:
+        watched, watched_sectors = resolve_watchlist(subscriber['watchlist'], indicators, sectors)
+        wanted_indicators |= watched
+        wanted_sectors |= watched_sectors
+    return ([key for key in indicators if key in wanted_indicators],
+            [key for key in sectors if key in wanted_sectors])
+
+
+def personalize(data, indicators, sectors):
+    """
+    按 resolve_watchlist 解析出的指标和板块集合裁剪报告数据
+
+    行情类指标只保留关注的品种，板块表现只保留关注的板块；
+    涨跌家数、资金动向等全市场数据对所有人保留
+    """
+
+    result = {}
+    for category, items in data.items():
+        if not isinstance(items, Mapping) or category == 'stats':
+            result[category] = items
+            continue
+        filtered = {}
+        for key, item in items.items():
+            if key == 'SECTOR_PERFORMANCE':
+                item = {s: v for s, v in item.items() if s in sectors}
+            elif isinstance(item, Mapping) and 'value' in item:
+                if key not in indicators:
+                    continue
+            filtered[key] = item
+        result[category] = filtered
+    return result
+
+
+def _watchlist_key(watchlist):
+    return tuple(
+        (category, tuple(sorted(watchlist[category])) if watchlist.get(category) is not None else None)
+        for category in WATCHLIST_CATEGORIES
+    )
+
+
+def watchlist_variant(watchlist):
+    """关注列表的短标识，相同的关注列表得到相同的标识"""
+    key = json.dumps(_watchlist_key(watchlist), ensure_ascii=False)
+    return hashlib.sha1(key.encode('utf-8')).hexdigest()[:12]
+
+
+def render_watchlist(data, watched, generated_at):
+    """为一个关注列表渲染分析文本和HTML报告（在工作进程中执行），watched 为 resolve_watchlist 的结果"""
+    personal = personalize(data, *watched)
+    analysis = "\n".join(MARKET_ENGINE.render(personal))
+    return render_report(personal, analysis, generated_at)
+
+
+def render_reports(data, subscribers, generated_at, indicators, sectors, workers=None, cache=None):
+    """
+    为所有订阅者渲染个性化报告，返回 {邮箱: HTML}
+
+    indicators/sectors 同 resolve_watchlist，用于解析各自的关注列表。
+
+    关注列表相同的订阅者共用一份报告；不同的关注列表分布到多个进程中并行渲染。
+    cache 为 report_cache.ArtifactCache 时，已缓存的关注列表直接复用，新渲染的写回缓存
+    """
+    groups = {}
+    for subscriber in subscribers:
+        groups.setdefault(_watchlist_key(subscriber['watchlist']), []).append(subscriber)
+
+    htmls = {}
+    watchlists = {}
+    for key, members in groups.items():
+        watchlist = members[0]['watchlist']
+        html = cache.get(watchlist_variant(watchlist)) if cache is not None else None
+        if html is not None:
+            htmls[key] = html
+        else:
+            watchlists[key] = resolve_watchlist(watchlist, indicators, sectors)
+
+    workers = min(workers or RENDER_WORKERS, len(watchlists))
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            chunksize = max(1, len(watchlists) // (workers * 4))
+            rendered = executor.map(render_watchlist, [data] * len(watchlists), watchlists.values(),
+                                    [generated_at] * len(watchlists), chunksize=chunksize)
+            htmls.update(zip(watchlists, rendered))
+    else:
+        htmls.update((key, render_watchlist(data, watchlist, generated_at)) for key, watchlist in watchlists.items())
+    if cache is not None:
+        for key in watchlists:
+            cache.put(watchlist_variant(groups[key][0]['watchlist']), htmls[key])
+
+    reports = {}
+    for key, members in groups.items():
+        for subscriber in members:
+            reports[subscriber['email']] = htmls[key]
+    return reports
@@ -0,0 +1,209 @@
+"""
+运行过程的分段计时
+
+main() 在每次运行开始时调用 start_run()，之后各阶段用 span() 包住，
+上游数据源的调用用 traced() 包装后交给线程池执行；运行结束后 finish_run() 把所有计时
+写成一个JSON指标文件，summary() 给出可以放进邮件页脚的一行摘要。
+
+没有调用 start_run() 时（如盘中监控、基准测试直接调用内部函数）span()/traced() 不做任何事，
+不会在长时间运行的进程中累积记录。
+
+指标文件结构:
+    {"run_id", "started_at", "total", "stages": {阶段: 秒},
+     "spans": [{"name", "parent", "start", "duration", "status", "error", "attrs"}],
+     "annotations": {...}}
+其中 start 是相对运行开始的秒数；指标文件生成时仍未结束的调用（如超时被放弃的数据源）status 为 'running'。
+"""
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from datetime import datetime
+
+from history_store import atomic_write
+
+# 保留最近多少次运行的指标文件
+METRICS_KEEP = int(os.getenv('METRICS_KEEP', '30'))
+
+# 邮件页脚中的摘要显示哪些阶段及其名称
+STAGE_NAMES = {
+    'fetch': '获取数据',
+    'history': '更新历史',
+    'analysis': '分析',
+    'render': '渲染',
+    'send': '发送',
+}
+
+
+class Span:
+    __slots__ = ('name', 'parent', 'start', 'end', 'status', 'error', 'attrs')
+
+    def __init__(self, name, parent, attrs):
+        self.name = name
+        self.parent = parent
+        self.start = time.perf_counter()
+        self.end = None
+        self.status = 'running'
+        self.error = None
+        self.attrs = attrs
+
+    @property
+    def path(self):
+        names = []
+        span = self
+        while span is not None:
+            names.append(span.name)
+            span = span.parent
+        return '/'.join(reversed(names))
+
+
+class Tracer:
+    """一次运行的全部计时记录，可以在多个线程中同时记录"""
+
+    def __init__(self):
+        now = datetime.now()
+        self.run_id = now.strftime('%Y%m%d-%H%M%S-%f')
+        self.started_at = now.strftime('%Y-%m-%d %H:%M:%S')
+        self.start = time.perf_counter()
+        self.spans = []
+        self.annotations = {}
+        self.lock = threading.Lock()
+        self._local = threading.local()
+
+    def current(self):
+        stack = getattr(self._local, 'stack', None)
+        return stack[-1] if stack else None
+
+    @contextmanager
+    def span(self, name, parent=None, **attrs):
+        """记录 with 块的耗时；parent 默认为当前线程中正在进行的 span"""
+        span = Span(name, parent or self.current(), attrs)
+        with self.lock:
+            self.spans.append(span)
+        stack = self._local.__dict__.setdefault('stack', [])
+        stack.append(span)
+        try:
+            yield span
+            span.status = 'ok'
+        except Exception as e:
+            span.status = 'error'
+            span.error = str(e)
+            raise
+        finally:
+            span.end = time.perf_counter()
+            stack.pop()
+
+    def traced(self, name, func, **attrs):
+        """包装一个要在其他线程中执行的无参调用，父 span 取包装时所在的 span"""
+        parent = self.current()
+
+        def call():
+            with self.span(name, parent=parent, **attrs):
+                return func()
+        return call
+
+    def annotate(self, key, value):
+        """附加到指标文件中的其他信息（HTTP统计、数据源状态等）"""
+        with self.lock:
+            self.annotations[key] = value
+
+    def stages(self):
+        """顶层 span 的耗时，同名的累加"""
+        now = time.perf_counter()
+        totals = {}
+        with self.lock:
+            spans = list(self.spans)
+        for span in spans:
+            if span.parent is None:
+                totals[span.name] = totals.get(span.name, 0.0) + (span.end or now) - span.start
+        return totals
+
+    def to_dict(self):
+        now = time.perf_counter()
+        with self.lock:
+            spans = list(self.spans)
+            annotations = dict(self.annotations)
+        return {
+            'run_id': self.run_id,
+            'started_at': self.started_at,
+            'total': round(now - self.start, 6),
+            'stages': {name: round(seconds, 6) for name, seconds in self.stages().items()},
+            'spans': [{
+                'name': span.name,
+                'parent': span.parent.path if span.parent is not None else None,
+                'start': round(span.start - self.start, 6),
+                'duration': round((span.end or now) - span.start, 6),
+                'status': span.status,
+                'error': span.error,
+                'attrs': span.attrs,
+            } for span in spans],
+            'annotations': annotations,
+        }
+
+    def summary(self):
+        """各阶段耗时的一行摘要"""
+        stages = self.stages()
+        parts = [f"{label} {stages[name]:.2f}s" for name, label in STAGE_NAMES.items() if name in stages]
+        return f"本次运行耗时 {time.perf_counter() - self.start:.2f}s：{' · '.join(parts)}" if parts else ''
+
+    def save(self, directory):
+        """写入 <directory>/run-<run_id>.json 并清理较早的指标文件，返回文件路径"""
+        path = os.path.join(directory, f"run-{self.run_id}.json")
+        data = self.to_dict()
+        if not atomic_write(path, lambda f: json.dump(data, f, ensure_ascii=False, indent=1, default=str),
+                            '运行指标'):
+            return None
+        _prune(directory, METRICS_KEEP)
+        return path
+
+
+def _prune(directory, keep):
+    try:
+        names = sorted(name for name in os.listdir(directory)
+                       if name.startswith('run-') and name.endswith('.json'))
+    except OSError:
+        return
+    for name in names[:-keep] if keep > 0 else []:
+        try:
+            os.remove(os.path.join(directory, name))
+        except OSError:
+            pass
+
+
+# 当前运行的 Tracer，没有进行中的运行时为None
+_active = None
+
+
+def start_run():
+    global _active
+    _active = Tracer()
+    return _active
+
+
+def finish_run(directory=None):
+    """结束当前运行；directory 不为None时写入指标文件。返回本次运行的 Tracer"""
+    global _active
+    tracer, _active = _active, None
+    if tracer is not None and directory is not None:
+        path = tracer.save(directory)
+        if path:
+            print(f"运行指标已写入 {path}")
+    return tracer
+
+
+def active():
+    return _active
+
+
+def span(name, **attrs):
+    return _active.span(name, **attrs) if _active is not None else nullcontext()
+
+
+def traced(name, func, **attrs):
+    return _active.traced(name, func, **attrs) if _active is not None else func
+
+
+def annotate(key, value):
+    if _active is not None:
+        _active.annotate(key, value)
@@ -0,0 +1,214 @@
+"""
+盘中监控：按固定间隔轮询实时行情，只在规则阈值被穿越时分析并发送提醒
+
+每个品种的行情保存在定长环形缓冲区中，每个tick只做常数量的计算：
+写入一行、与上一个tick比较得出 tick_change、对当前值求一次提醒规则。
+规则从"不满足"变为"满足"时才算穿越；启动后的第一个tick只记录基准状态，不提醒。
+某个品种本次没有取到数据时，引用它的规则保持上一次的状态。
+
+用法: python scripts/watch.py [轮询间隔秒数]
+环境变量: WATCH_INTERVAL (默认60秒)、WATCH_BUFFER_SIZE (每个品种保留的tick数，默认512)、
+         WATCH_COOLDOWN (同一规则两次提醒的最小间隔，默认1800秒)、WATCH_UNTIL (HH:MM，到点退出)
+"""
+import os
+import sys
+import time
+from datetime import datetime
+
+import numpy as np
+
+import fetch_and_send
+from analysis_rules import F, MARKET_ENGINE, Rule, RuleEngine
+
+WATCH_INTERVAL = float(os.getenv('WATCH_INTERVAL', '60'))
+WATCH_BUFFER_SIZE = int(os.getenv('WATCH_BUFFER_SIZE', '512'))
+WATCH_COOLDOWN = float(os.getenv('WATCH_COOLDOWN', '1800'))
+WATCH_UNTIL = os.getenv('WATCH_UNTIL')
+
+# 环形缓冲区中每个tick保存的列
+TICK_COLUMNS = ('value', 'change', 'change_pct', 'tick_change')
+
+# 盘中提醒规则，阈值与每日分析中的规则一致；字段命名同 analysis_rules，
+# 另外可以用 '<指标>.tick_change' 引用与上一个tick相比的变化
+WATCH_RULES = [
+    Rule('VIX升破25', F('VIX.value') > 25,
+         "⚠️ **VIX升破25** - 当前 {value:.2f}，市场担忧情绪上升，需要谨慎操作。",
+         value=F('VIX.value')),
+    Rule('标普500涨幅超过0.5%', F('S&P_500.change_pct') > 0.5,
+         "✅ **标普500涨幅超过0.5%** - 当前 {value} ({change_pct:+.2f}%)，美股表现强劲。",
+         value=F('S&P_500.value'), change_pct=F('S&P_500.change_pct')),
+    Rule('标普500跌幅超过0.5%', F('S&P_500.change_pct') < -0.5,
+         "⚠️ **标普500跌幅超过0.5%** - 当前 {value} ({change_pct:+.2f}%)，需要关注市场风险偏好变化。",
+         value=F('S&P_500.value'), change_pct=F('S&P_500.change_pct')),
+]
+
+
+class RingBuffer:
+    """定长环形缓冲区：保存最近 size 个tick的时间和各列数值，内存占用固定"""
+
+    def __init__(self, size, columns=TICK_COLUMNS):
+        self.size = size
+        self.columns = columns
+        self.times = np.full(size, np.nan)
+        self.rows = np.full((size, len(columns)), np.nan)
+        self.count = 0
+
+    def __len__(self):
+        return min(self.count, self.size)
+
+    def append(self, timestamp, row):
+        i = self.count % self.size
+        self.times[i] = timestamp
+        self.rows[i] = row
+        self.count += 1
+
+    def latest(self, back=0):
+        """倒数第 back+1 个tick的 {列: 值}，不存在时返回None"""
+        if back >= len(self):
+            return None
+        row = self.rows[(self.count - 1 - back) % self.size]
+        return dict(zip(self.columns, row.tolist()))
+
+    def window(self):
+        """按时间顺序返回 (times, rows) 的副本"""
+        if self.count <= self.size:
+            return self.times[:self.count].copy(), self.rows[:self.count].copy()
+        start = self.count % self.size
+        return np.roll(self.times, -start), np.roll(self.rows, -start, axis=0)
+
+
+class WatchDaemon:
+    """
+    轮询行情并检测规则穿越
+
+    fetch 为 {代码列表} -> {代码: 报价字典} 的函数，send 为 (主题, HTML) -> bool 的函数，
+    便于离线测试时替换
+    """
+
+    def __init__(self, instruments=None, rules=WATCH_RULES, buffer_size=None, cooldown=None,
+                 fetch=None, send=None):
+        if instruments is None:
+            instruments = {key: spec['quote'] for key, spec in fetch_and_send.INDICATORS.items()
+                           if spec.get('quote')}
+        self.instruments = instruments
+        self.engine = RuleEngine(rules)
+        self.rules = rules
+        self.buffers = {key: RingBuffer(buffer_size or WATCH_BUFFER_SIZE) for key in instruments}
+        self.cooldown = WATCH_COOLDOWN if cooldown is None else cooldown
+        self.fetch = fetch or fetch_and_send.fetch_sina_quotes
+        self.send = send or fetch_and_send.send_email
+        self.state = {}
+        self.last_alert = {}
+        self.ticks = 0
+        self.alerts = 0
+
+    def update(self, timestamp, quotes):
+        """把一次轮询的报价写入缓冲区，返回本次有更新的品种"""
+        updated = set()
+        for key, code in self.instruments.items():
+            quote = quotes.get(code)
+            if quote is None:
+                continue
+            buffer = self.buffers[key]
+            previous = buffer.latest()
+            tick_change = quote['value'] - previous['value'] if previous else 0.0
+            buffer.append(timestamp, (quote['value'], quote['change'], quote['change_pct'], tick_change))
+            updated.add(key)
+        return updated
+
+    def snapshot(self):
+        """各品种最新一个tick，结构与 fetch_financial_data 返回的数据一致"""
+        data = {}
+        for key, buffer in self.buffers.items():
+            latest = buffer.latest()
+            if latest is None:
+                continue
+            category = fetch_and_send.INDICATORS.get(key, {}).get('category', 'global_markets')
+            data.setdefault(category, {})[key] = latest
+        return data
+
+    def check(self, timestamp):
+        """对最新数据求规则，返回本次从不满足变为满足、且不在冷却期内的规则"""
+        fields = {}
+        for key, buffer in self.buffers.items():
+            latest = buffer.latest()
+            if latest is not None:
+                for column, value in latest.items():
+                    fields[f"{key}.{column}"] = np.array([value])
+        signals = self.engine.evaluate(fields)
+
+        crossed = []
+        for rule in self.rules:
+            if not all(name in fields for name in rule.fields()):
+                continue
+            active = bool(signals[rule.name][0])
+            was_active = self.state.get(rule.name)
+            self.state[rule.name] = active
+            if not active or was_active is None or was_active:
+                continue
+            if timestamp - self.last_alert.get(rule.name, -np.inf) < self.cooldown:
+                continue
+            self.last_alert[rule.name] = timestamp
+            crossed.append(rule)
+        return crossed
+
+    def alert(self, crossed):
+        """为穿越的规则生成分析并发送提醒邮件"""
+        data = self.snapshot()
+        lines = ["# 🔔 盘中提醒"] + RuleEngine(crossed).render(data) + [""]
+        lines += MARKET_ENGINE.render(data)
+        html = fetch_and_send.create_email_html(data, "\n".join(lines))
+        names = "、".join(rule.name for rule in crossed)
+        subject = f"🔔 盘中提醒: {names} ({datetime.now().strftime('%Y-%m-%d %H:%M')})"
+        print(f"触发提醒: {names}")
+        if self.send(subject, html):
+            self.alerts += 1
+
+    def tick(self, timestamp=None):
+        """执行一次轮询，返回本次穿越的规则"""
+        timestamp = time.time() if timestamp is None else timestamp
+        self.ticks += 1
+        try:
+            quotes = self.fetch(list(self.instruments.values()))
+        except Exception as e:
+            print(f"获取实时行情时出错: {e}")
+            return []
+        if not self.update(timestamp, quotes):
+            return []
+        crossed = self.check(timestamp)
+        if crossed:
+            self.alert(crossed)
+        return crossed
+
+    def run(self, interval=None, until=None, max_ticks=None):
+        """
+        按固定间隔轮询，直到 until (datetime) 或达到 max_ticks 次；Ctrl+C 也会正常退出
+
+        间隔按单调时钟对齐，单次轮询耗时不会累积成漂移
+        """
+        interval = interval or WATCH_INTERVAL
+        print(f"开始盘中监控，{len(self.instruments)} 个品种，每 {interval:g} 秒轮询一次...")
+        next_tick = time.monotonic()
+        try:
+            while max_ticks is None or self.ticks < max_ticks:
+                if until is not None and datetime.now() >= until:
+                    break
+                self.tick()
+                next_tick += interval
+                time.sleep(max(0.0, next_tick - time.monotonic()))
+        except KeyboardInterrupt:
+            pass
+        print(f"盘中监控结束，共轮询 {self.ticks} 次，发送提醒 {self.alerts} 次")
+
+
+def parse_until(value):
+    """把 HH:MM 解析为今天的该时刻，未配置时返回None"""
+    if not value:
+        return None
+    hour, minute = (int(part) for part in value.split(':'))
+    return datetime.now().replace(hour=hour, minute=minute, second=0, microsecond=0)
+
+
+if __name__ == '__main__':
+    interval = float(sys.argv[1]) if len(sys.argv) > 1 else WATCH_INTERVAL
+    WatchDaemon().run(interval, until=parse_until(WATCH_UNTIL))
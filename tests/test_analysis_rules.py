@@ -0,0 +1,516 @@
+"""
+generate_market_analysis（规则引擎）与原先 if/elif 实现的输出对比
+
+legacy_generate_market_analysis 是改为 analysis_rules 之前的实现，除板块名称外原样保留
+（CONSUMER 后来改名为"食品饮料"，见 analysis_rules.SECTOR_NAMES）。
+输入是固定的：各阈值上下的边界值，加上固定种子生成的随机数据。
+EngineTest 检查 RuleEngine.evaluate 在多天数组上的结果与逐日 render 一致；
+HistoryTest 在一份有缺失日期的小型 HistoryStore 上检查回测用的历史字段和 backtest 的统计。
+
+用法: python -m pytest tests  或  python -m unittest discover tests
+"""
+import copy
+import os
+import random
+import shutil
+import sys
+import tempfile
+import unittest
+from datetime import date, timedelta
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'scripts'))
+
+from analysis_rules import (ITEM_FIELD, MARKET_ENGINE, FirstMatch, ForEach, backtest,  # noqa: E402
+                            flatten_rule_fields, load_history_fields)
+from fetch_and_send import generate_market_analysis  # noqa: E402
+from history_store import HistoryStore, date_key  # noqa: E402
+
+
+def legacy_generate_market_analysis(data):
+    """
+    生成市场分析和解读，按照新手投资者每日必看清单组织
+    """
+    if not data:
+        return "今日无法获取市场数据，请手动检查数据源。"
+
+    analysis = []
+    # 滚动统计（均线、波动率、历史分位），没有历史数据时为空
+    stats = data.get('stats', {})
+
+    # 1. 国内市场分析
+    analysis.append("# 📊 国内市场分析（核心晴雨表）")
+
+    sh_index = data['domestic_market']['SHANGHAI']
+    sz_index = data['domestic_market']['SZ_COMP']
+    rising = data['domestic_market']['RISING_STOCKS']
+    falling = data['domestic_market']['FALLING_STOCKS']
+    limit_up = data['domestic_market']['LIMIT_UP']
+    limit_down = data['domestic_market']['LIMIT_DOWN']
+
+    # 大盘指数分析
+    if sh_index['change_pct'] > 0 and sz_index['change_pct'] > 0:
+        analysis.append("✅ **大盘指数双双上涨** - 上证指数和深证成指均收涨，市场整体情绪积极。")
+    elif sh_index['change_pct'] < 0 and sz_index['change_pct'] < 0:
+        analysis.append("⚠️ **大盘指数双双下跌** - 市场整体表现疲软，需要关注下跌原因和后续走势。")
+    else:
+        analysis.append("🔸 **大盘指数分化** - 主要指数走势不一，显示市场内部结构分化。")
+
+    # 结合20日均线判断趋势
+    sh_ma20 = stats.get('SHANGHAI', {}).get('ma20')
+    if sh_ma20:
+        position = "上方" if sh_index['value'] >= sh_ma20 else "下方"
+        analysis.append(f"📊 **上证指数位于20日均线{position}** - 20日均线 {sh_ma20:.2f}，偏离 {(sh_index['value'] / sh_ma20 - 1) * 100:+.2f}%")
+
+    # 涨跌家数分析
+    rising_ratio = rising / (rising + falling) * 100
+    if rising_ratio > 60:
+        analysis.append("✅ **市场普涨格局** - 上涨家数占比超过60%，市场赚钱效应较好。")
+    elif rising_ratio < 40:
+        analysis.append("⚠️ **市场普跌格局** - 下跌家数占比较多，市场整体情绪偏谨慎。")
+    else:
+        analysis.append("🔸 **市场涨跌互现** - 上涨和下跌家数基本持平，市场呈现结构性行情。")
+
+    # 涨跌停家数分析
+    analysis.append(f"📈 **涨停家数**: {limit_up}家 | 📉 **跌停家数**: {limit_down}家")
+    if limit_up > 50 and limit_down < 10:
+        analysis.append("✅ **市场炒作热情高** - 涨停家数较多而跌停家数较少，显示市场风险偏好较强。")
+    elif limit_up < 20 and limit_down > 20:
+        analysis.append("⚠️ **市场恐慌情绪上升** - 跌停家数明显多于涨停家数，需要警惕市场风险。")
+
+    # 2. 资金动向分析
+    analysis.append("\n# 💰 资金动向分析（市场发动机）")
+
+    northbound = data['capital_flows']['NORTHBOUND_NET']
+    turnover = data['capital_flows']['TURNOVER']
+    margin = data['capital_flows']['MARGIN_TRADING']
+
+    # 北向资金分析
+    if northbound > 30:
+        analysis.append("✅ **北向资金大幅净流入** - '聪明钱'大幅流入，通常对市场有积极影响，特别是其重点布局的板块。")
+    elif northbound < -30:
+        analysis.append("⚠️ **北向资金大幅净流出** - 外资流出可能对市场构成压力，需要关注流出原因和持续性。")
+    else:
+        analysis.append("🔸 **北向资金小幅波动** - 外资流向对市场影响中性。")
+
+    # 成交额分析
+    if turnover > 10000:
+        analysis.append("✅ **市场成交活跃** - 成交额超过万亿，显示市场参与度高，资金活跃。")
+    elif turnover < 8000:
+        analysis.append("⚠️ **市场成交萎缩** - 成交额较低，可能反映市场观望情绪浓厚。")
+
+    # 与近期成交额比较，比固定阈值更能反映放量或缩量
+    turnover_ma20 = stats.get('TURNOVER', {}).get('ma20')
+    if turnover_ma20:
+        analysis.append(f"📊 **成交额较20日均值**: {(turnover / turnover_ma20 - 1) * 100:+.1f}%")
+
+    # 融资融券分析
+    analysis.append(f"📊 **两融余额**: {margin}亿元 - 杠杆资金水平{(margin-15000)/500:.1f}%")
+
+    # 3. 全球市场分析
+    analysis.append("\n# 🌍 全球市场分析（外部环境）")
+
+    usd_cny = data['global_markets']['USD/CNY']
+    usd_index = data['global_markets']['USD_INDEX']
+    sp500 = data['global_markets']['S&P_500']
+    a50 = data['global_markets']['A50_INDEX']
+    vix = data['global_markets']['VIX']
+
+    # 汇率分析
+    if usd_index['change'] < 0 and usd_cny['change'] < 0:
+        analysis.append("✅ **美元走弱，人民币相对走强** - 美元指数下跌，同时人民币对美元升值，这通常有利于A股市场，特别是那些有美元负债和进口依赖型企业。")
+    elif usd_index['change'] > 0 and usd_cny['change'] > 0:
+        analysis.append("⚠️ **美元走强，人民币承压** - 美元指数上涨带动人民币贬值，这可能对A股市场构成压力，特别是外资可能会流出。")
+
+    # 美股影响分析
+    if sp500['change_pct'] > 0.5:
+        analysis.append("✅ **美股大幅上涨** - 隔夜美股表现强劲，特别是纳斯达克指数上涨明显，这对今日A股科技板块情绪有积极影响。")
+    elif sp500['change_pct'] < -0.5:
+        analysis.append("⚠️ **美股显著下跌** - 隔夜美股下跌可能对今日A股开盘造成压力，需要关注市场风险偏好变化。")
+
+    # A50指数分析
+    analysis.append(f"📈 **富时A50指数**: {a50['value']} ({a50['change_pct']:+.2f}%) - 作为A股先行指标，其表现对开盘有预示作用。")
+
+    # 恐慌指数分析
+    if vix['value'] < 18:
+        analysis.append("✅ **市场恐慌指数较低** - VIX指数低于18，显示市场情绪稳定，风险偏好较高。")
+    elif vix['value'] > 25:
+        analysis.append("⚠️ **市场恐慌指数升高** - VIX指数超过25，显示市场担忧情绪上升，需要谨慎操作。")
+
+    # VIX在近一年中的位置
+    vix_stats = stats.get('VIX', {})
+    if vix_stats.get('pct_rank') is not None and vix_stats.get('count', 0) >= 20:
+        analysis.append(f"📊 **VIX历史分位**: 处于近{vix_stats['count']}个交易日的{vix_stats['pct_rank']:.0f}%分位")
+
+    # 4. 政策与情绪分析
+    analysis.append("\n# 📰 政策与情绪分析（方向盘与催化剂）")
+
+    policy = data['policy_sentiment']['RECENT_POLICY']
+    news = data['policy_sentiment']['KEY_NEWS']
+    sectors = data['policy_sentiment']['SECTOR_PERFORMANCE']
+
+    analysis.append(f"🏛️ **近期政策焦点**: {policy}")
+    analysis.append(f"📢 **重要新闻**: {news}")
+
+    # 板块表现分析
+    analysis.append("📊 **板块表现**:")
+    for sector, performance in sectors.items():
+        sector_name = {
+            'AI_CHIP': '人工智能芯片',
+            'NEW_ENERGY': '新能源',
+            'CONSUMER': '食品饮料'
+        }.get(sector, sector)
+
+        if performance > 2:
+            analysis.append(f"  ✅ {sector_name}: +{performance:.2f}% - 表现强势，受政策或资金青睐")
+        elif performance < -1:
+            analysis.append(f"  ⚠️ {sector_name}: {performance:.2f}% - 表现疲软，需关注原因")
+        else:
+            analysis.append(f"  🔸 {sector_name}: {performance:+.2f}% - 表现平稳")
+
+    # 投资建议
+    analysis.append("\n# 💡 今日投资建议")
+    analysis.append("1. **关注北向资金流向** - 密切跟踪外资动向，特别是其重点增持的板块")
+    analysis.append("2. **注意板块轮动** - 市场可能在不同板块间轮动，避免追高")
+    analysis.append("3. **控制仓位风险** - 在不确定性中保持适度仓位，留有进退空间")
+    analysis.append("4. **关注政策受益板块** - 特别是人工智能、新能源等受政策支持的领域")
+
+    analysis.append("\n---")
+    analysis.append("**免责声明**: 本分析仅供参考，不构成投资建议。市场有风险，投资需谨慎。")
+
+    return "\n".join(analysis)
+
+
+def quote(value, change, change_pct):
+    return {'value': value, 'change': change, 'change_pct': change_pct}
+
+
+BASE_DATA = {
+    'domestic_market': {
+        'SHANGHAI': quote(3050.12, 12.3, 0.4),
+        'SZ_COMP': quote(9800.5, -20.1, -0.2),
+        'CHINEXT': quote(1900.2, 5.1, 0.27),
+        'RISING_STOCKS': 3200,
+        'FALLING_STOCKS': 1700,
+        'LIMIT_UP': 60,
+        'LIMIT_DOWN': 5,
+    },
+    'capital_flows': {
+        'NORTHBOUND_NET': 35.2,
+        'NORTHBOUND_SH': 20.1,
+        'NORTHBOUND_SZ': 15.1,
+        'TURNOVER': 10500.3,
+        'MARGIN_TRADING': 15500,
+    },
+    'global_markets': {
+        'USD/CNY': quote(7.18, -0.01, -0.14),
+        'USD_INDEX': quote(104.1, -0.2, -0.19),
+        'S&P_500': quote(5000.1, 30, 0.6),
+        'NASDAQ': quote(16000, 100, 0.63),
+        'NIKKEI': quote(36000, -50, -0.14),
+        'A50_INDEX': quote(12000, 30, 0.25),
+        'VIX': quote(15.2, -0.3, -1.9),
+    },
+    'policy_sentiment': {
+        'RECENT_POLICY': '稳增长',
+        'KEY_NEWS': '降准',
+        'SECTOR_PERFORMANCE': {'AI_CHIP': 2.5, 'NEW_ENERGY': -1.5, 'CONSUMER': 0.3},
+    },
+}
+
+STATS = {
+    'SHANGHAI': {'ma20': 3020.5},
+    'TURNOVER': {'ma20': 9800.0},
+    'VIX': {'pct_rank': 35.0, 'count': 250},
+}
+
+
+def with_values(**changes):
+    """在 BASE_DATA 上按 '节.指标[.字段]' 修改若干值"""
+    data = copy.deepcopy(BASE_DATA)
+    for path, value in changes.items():
+        *parents, leaf = path.split('__')
+        target = data
+        for key in parents:
+            target = target[key]
+        target[leaf] = value
+    return data
+
+
+# 各条规则阈值上、下和恰好等于阈值的取值
+BOUNDARY_CASES = [
+    ('涨跌幅为零', with_values(domestic_market__SHANGHAI__change_pct=0, domestic_market__SZ_COMP__change_pct=0.0)),
+    ('双双上涨', with_values(domestic_market__SZ_COMP__change_pct=0.01)),
+    ('双双下跌', with_values(domestic_market__SHANGHAI__change_pct=-0.01)),
+    ('上涨占比恰好60%', with_values(domestic_market__RISING_STOCKS=60, domestic_market__FALLING_STOCKS=40)),
+    ('上涨占比恰好40%', with_values(domestic_market__RISING_STOCKS=40, domestic_market__FALLING_STOCKS=60)),
+    ('普跌', with_values(domestic_market__RISING_STOCKS=1000, domestic_market__FALLING_STOCKS=4000)),
+    ('涨停恰好50', with_values(domestic_market__LIMIT_UP=50, domestic_market__LIMIT_DOWN=9)),
+    ('跌停恰好10', with_values(domestic_market__LIMIT_UP=51, domestic_market__LIMIT_DOWN=10)),
+    ('恐慌', with_values(domestic_market__LIMIT_UP=19, domestic_market__LIMIT_DOWN=21)),
+    ('恐慌边界', with_values(domestic_market__LIMIT_UP=20, domestic_market__LIMIT_DOWN=20)),
+    ('北向恰好30', with_values(capital_flows__NORTHBOUND_NET=30)),
+    ('北向恰好-30', with_values(capital_flows__NORTHBOUND_NET=-30.0)),
+    ('北向大幅流出', with_values(capital_flows__NORTHBOUND_NET=-30.01)),
+    ('成交恰好一万亿', with_values(capital_flows__TURNOVER=10000)),
+    ('成交恰好八千亿', with_values(capital_flows__TURNOVER=8000.0)),
+    ('成交萎缩', with_values(capital_flows__TURNOVER=7999.9)),
+    ('两融整数', with_values(capital_flows__MARGIN_TRADING=14321)),
+    ('美元走强', with_values(**{'global_markets__USD_INDEX__change': 0.2, 'global_markets__USD/CNY__change': 0.01})),
+    ('美元分化', with_values(global_markets__USD_INDEX__change=0.2)),
+    ('美元不变', with_values(**{'global_markets__USD_INDEX__change': 0, 'global_markets__USD/CNY__change': 0})),
+    ('美股恰好0.5%', with_values(**{'global_markets__S&P_500__change_pct': 0.5})),
+    ('美股恰好-0.5%', with_values(**{'global_markets__S&P_500__change_pct': -0.5})),
+    ('美股下跌', with_values(**{'global_markets__S&P_500__change_pct': -1.2})),
+    ('VIX恰好18', with_values(global_markets__VIX__value=18)),
+    ('VIX恰好25', with_values(global_markets__VIX__value=25.0)),
+    ('VIX高', with_values(global_markets__VIX__value=31.7)),
+    ('A50整数', with_values(global_markets__A50_INDEX__value=12000, global_markets__A50_INDEX__change_pct=0)),
+    ('板块恰好在阈值上', with_values(policy_sentiment__SECTOR_PERFORMANCE={'AI_CHIP': 2, 'NEW_ENERGY': -1, 'CONSUMER': -0.0})),
+    ('板块只有一个', with_values(policy_sentiment__SECTOR_PERFORMANCE={'NEW_ENERGY': 2.01})),
+    ('无板块', with_values(policy_sentiment__SECTOR_PERFORMANCE={})),
+    ('未知板块', with_values(policy_sentiment__SECTOR_PERFORMANCE={'OTHER': -3.5})),
+    ('有滚动统计', dict(copy.deepcopy(BASE_DATA), stats=STATS)),
+    ('指数恰好在均线上', dict(copy.deepcopy(BASE_DATA), stats={'SHANGHAI': {'ma20': 3050.12}})),
+    ('均线为零', dict(copy.deepcopy(BASE_DATA), stats={'SHANGHAI': {'ma20': 0}, 'TURNOVER': {'ma20': None}})),
+    ('VIX样本不足', dict(copy.deepcopy(BASE_DATA), stats={'VIX': {'pct_rank': 90.0, 'count': 19}})),
+    ('VIX样本恰好20', dict(copy.deepcopy(BASE_DATA), stats={'VIX': {'pct_rank': 0.0, 'count': 20}})),
+    ('VIX无分位', dict(copy.deepcopy(BASE_DATA), stats={'VIX': {'pct_rank': None, 'count': 250}})),
+]
+
+
+def random_cases(count=300, seed=20240209):
+    """固定种子生成的随机输入，数值取整到常见的小数位，覆盖各规则的不同分支"""
+    rng = random.Random(seed)
+
+    def q(value, spread, pct):
+        change_pct = round(rng.uniform(-pct, pct), 2)
+        return quote(round(value * rng.uniform(1 - spread, 1 + spread), 2),
+                     round(rng.uniform(-pct, pct) * value / 100, 2), change_pct)
+
+    cases = []
+    for i in range(count):
+        data = {
+            'domestic_market': {
+                'SHANGHAI': q(3000, 0.1, 3),
+                'SZ_COMP': q(9800, 0.1, 3),
+                'CHINEXT': q(1900, 0.1, 4),
+                'RISING_STOCKS': rng.randint(0, 5000),
+                'FALLING_STOCKS': rng.randint(1, 5000),
+                'LIMIT_UP': rng.randint(0, 150),
+                'LIMIT_DOWN': rng.randint(0, 80),
+            },
+            'capital_flows': {
+                'NORTHBOUND_NET': round(rng.uniform(-80, 80), 2),
+                'NORTHBOUND_SH': round(rng.uniform(-40, 40), 2),
+                'NORTHBOUND_SZ': round(rng.uniform(-40, 40), 2),
+                'TURNOVER': round(rng.uniform(5000, 15000), 2),
+                'MARGIN_TRADING': rng.choice([round(rng.uniform(14000, 17000), 2), rng.randint(14000, 17000)]),
+            },
+            'global_markets': {
+                'USD/CNY': q(7.2, 0.02, 0.5),
+                'USD_INDEX': q(104, 0.05, 1),
+                'S&P_500': q(5000, 0.1, 2),
+                'NASDAQ': q(16000, 0.1, 3),
+                'NIKKEI': q(36000, 0.1, 2),
+                'A50_INDEX': q(12000, 0.1, 2),
+                'VIX': q(20, 0.5, 10),
+            },
+            'policy_sentiment': {
+                'RECENT_POLICY': '稳增长',
+                'KEY_NEWS': '降准',
+                'SECTOR_PERFORMANCE': {key: round(rng.uniform(-4, 4), 2)
+                                       for key in ('AI_CHIP', 'NEW_ENERGY', 'CONSUMER') if rng.random() < 0.9},
+            },
+        }
+        if i % 2:
+            data['stats'] = {
+                'SHANGHAI': {'ma20': round(rng.uniform(2800, 3200), 2)},
+                'TURNOVER': {'ma20': round(rng.uniform(7000, 12000), 2)},
+                'VIX': {'pct_rank': round(rng.uniform(0, 100), 1), 'count': rng.randint(0, 250)},
+            }
+        cases.append((f"随机#{i}", data))
+    return cases
+
+
+class GenerateMarketAnalysisTest(unittest.TestCase):
+
+    def assert_same(self, cases):
+        for name, data in cases:
+            with self.subTest(name):
+                self.assertEqual(generate_market_analysis(data), legacy_generate_market_analysis(data))
+
+    def test_base_data(self):
+        self.assert_same([('样例', BASE_DATA)])
+
+    def test_no_data(self):
+        self.assert_same([('空', {}), ('None', None)])
+
+    def test_boundaries(self):
+        self.assert_same(BOUNDARY_CASES)
+
+    def test_random_inputs(self):
+        self.assert_same(random_cases())
+
+
+def stack_fields(cases):
+    """把多天的数据展开后排成 {字段: 数组}，某天缺少的字段为NaN/None"""
+    rows = [flatten_rule_fields(data) for _, data in cases]
+    arrays = {}
+    for name in set().union(*rows):
+        values = [row.get(name) for row in rows]
+        if all(v is None or isinstance(v, (int, float)) for v in values):
+            arrays[name] = np.array([np.nan if v is None else v for v in values], dtype=np.float64)
+        else:
+            arrays[name] = np.array(values, dtype=object)
+    return arrays
+
+
+def signal_lines(engine, values):
+    """{信号名: 该信号触发时输出的文本}，参数无法计算的信号不出现"""
+    lines = {}
+
+    def add(signal, rule, scope, **extra):
+        try:
+            params = {key: expr(scope) for key, expr in rule.params.items()}
+        except (KeyError, ZeroDivisionError):
+            return
+        lines[signal] = rule.text.format(**params, **extra)
+
+    for item in engine.rules:
+        if isinstance(item, ForEach):
+            for key in values:
+                label = key[len(item.prefix):]
+                if not key.startswith(item.prefix) or '.' in label:
+                    continue
+                for rule in item.group.rules:
+                    add(f"{rule.name}[{label}]", rule, {**values, ITEM_FIELD: values[key]},
+                        name=engine.labels.get(label, label))
+            continue
+        for rule in item.rules if isinstance(item, FirstMatch) else (item,):
+            if rule.name is not None:
+                add(rule.name, rule, values)
+    return lines
+
+
+class EngineTest(unittest.TestCase):
+
+    def test_evaluate_matches_daily_render(self):
+        cases = BOUNDARY_CASES + random_cases(count=100)
+        signals = MARKET_ENGINE.evaluate(stack_fields(cases))
+        self.assertIn('大盘指数双双上涨', signals)
+        self.assertIn('板块表现强势[AI_CHIP]', signals)
+        for day, (name, data) in enumerate(cases):
+            rendered = MARKET_ENGINE.render(data)
+            expected = signal_lines(MARKET_ENGINE, flatten_rule_fields(data))
+            for signal, hit in signals.items():
+                with self.subTest(name, signal=signal):
+                    self.assertEqual(len(hit), len(cases))
+                    self.assertEqual(bool(hit[day]), signal in expected and expected[signal] in rendered)
+
+    def test_empty_arrays(self):
+        signals = MARKET_ENGINE.evaluate({})
+        self.assertTrue(signals)
+        self.assertTrue(all(len(hit) == 0 for hit in signals.values()))
+
+
+# 回测用的40天历史：第5天缺少成交额，第25天缺少上证指数（数据源超时时的情形）
+HISTORY_DAYS = [date_key(date(2024, 1, 2) + timedelta(days=i)) for i in range(40)]
+HISTORY = {
+    'SHANGHAI': {i: 3000.0 + 30 * (i * 7 % 5) - 2 * i for i in range(40) if i != 25},
+    'SZ_COMP': {i: 9800.0 + 50 * (i * 3 % 4) for i in range(40)},
+    'TURNOVER': {i: (12000.0, 7000.0, 9000.0)[i % 3] for i in range(40) if i != 5},
+}
+
+
+class HistoryTest(unittest.TestCase):
+
+    def setUp(self):
+        root = tempfile.mkdtemp(prefix='rules_history_')
+        self.addCleanup(shutil.rmtree, root, ignore_errors=True)
+        self.store = HistoryStore(root)
+        for series, values in HISTORY.items():
+            for i, value in values.items():
+                self.store.append(series, HISTORY_DAYS[i], value)
+
+    def test_moving_average_skips_missing_days(self):
+        dates, arrays = load_history_fields(self.store, {'stats.TURNOVER.ma5', 'stats.SHANGHAI.ma20'})
+        self.assertEqual(list(dates), HISTORY_DAYS)
+        for series, n in (('TURNOVER', 5), ('SHANGHAI', 20)):
+            own = list(HISTORY[series].items())
+            expected = np.full(len(dates), np.nan)
+            for k in range(n - 1, len(own)):
+                expected[own[k][0]] = sum(value for _, value in own[k - n + 1:k + 1]) / n
+            with self.subTest(series=series):
+                np.testing.assert_allclose(arrays[f"stats.{series}.ma{n}"], expected)
+                self.assertEqual(int(np.isfinite(expected).sum()), len(own) - n + 1)
+
+    def expected_stats(self, hits, horizon=1):
+        """按触发日逐个计算目标（上证指数）之后 horizon 天的涨跌"""
+        sh = HISTORY['SHANGHAI']
+        outcomes = [(sh[i + horizon] / sh[i] - 1) * 100 for i in hits if i in sh and i + horizon in sh]
+        return {
+            'fired': len(hits),
+            'avg_forward_pct': sum(outcomes) / len(outcomes) if outcomes else None,
+            'win_rate': sum(o > 0 for o in outcomes) / len(outcomes) * 100 if outcomes else None,
+        }
+
+    def assert_result(self, result, expected):
+        self.assertEqual(result['fired'], expected['fired'])
+        self.assertEqual(result['days'], len(HISTORY_DAYS))
+        for key in ('avg_forward_pct', 'win_rate'):
+            if expected[key] is None:
+                self.assertIsNone(result[key])
+            else:
+                self.assertAlmostEqual(result[key], expected[key])
+
+    def test_backtest(self):
+        sh, sz, turnover = HISTORY['SHANGHAI'], HISTORY['SZ_COMP'], HISTORY['TURNOVER']
+
+        def pct(series, i):
+            return series[i] / series[i - 1] - 1 if i in series and i - 1 in series else None
+
+        both_up, both_down, mixed = [], [], []
+        for i in range(40):
+            a, b = pct(sh, i), pct(sz, i)
+            if a is None or b is None:
+                continue
+            (both_up if a > 0 and b > 0 else both_down if a < 0 and b < 0 else mixed).append(i)
+
+        own = list(sh.items())
+        above, below = [], []
+        for k in range(19, len(own)):
+            i, value = own[k]
+            ma20 = sum(v for _, v in own[k - 19:k + 1]) / 20
+            (above if value >= ma20 else below).append(i)
+
+        expected = {
+            '大盘指数双双上涨': both_up,
+            '大盘指数双双下跌': both_down,
+            '大盘指数分化': mixed,
+            '上证指数位于20日均线上方': above,
+            '上证指数位于20日均线下方': below,
+            '市场成交活跃': [i for i, v in turnover.items() if v > 10000],
+            '市场成交萎缩': [i for i, v in turnover.items() if v < 8000],
+            '北向资金大幅净流入': [],
+        }
+        self.assertTrue(all(expected[name] for name in expected if name != '北向资金大幅净流入'))
+
+        results = {r['signal']: r for r in backtest(self.store)}
+        for name, hits in expected.items():
+            with self.subTest(name):
+                self.assert_result(results[name], self.expected_stats(hits))
+
+        results = {r['signal']: r for r in backtest(self.store, horizon=3)}
+        with self.subTest('horizon=3'):
+            self.assert_result(results['市场成交活跃'], self.expected_stats(expected['市场成交活跃'], 3))
+
+    def test_backtest_empty_store(self):
+        root = tempfile.mkdtemp(prefix='rules_history_')
+        self.addCleanup(shutil.rmtree, root, ignore_errors=True)
+        self.assertEqual(backtest(HistoryStore(root)), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,165 @@
+"""
+完整的 fetch_and_send.main() 在节假日重复运行时的行为
+
+与 benchmarks/bench_pipeline.py 相同，每次在新的解释器进程中运行 main()：
+AKShare 由 benchmarks/akshare_replay.py 的合成数据回放，新浪报价和SMTP分别由本地回放服务和SMTP替身提供。
+交易日历固定到 2024-02-09（春节前最后一个交易日），之后的每次运行都属于这个交易日。
+第二次运行模拟节假日重跑：首选的指数数据源失败、由备用数据源返回，中行汇率表也有变动；
+第三次运行时境外市场照常交易，标普500有了新的收盘价；
+第四次用 FORCE_SEND=1 强制重发，中行汇率表的数值大幅变动，发出的报告必须是重新渲染的。
+PartialRerunTest 模拟同一交易日第一次运行时全市场快照失败，手动重跑补全数据后应当重发一次。
+
+用法: python -m pytest tests  或  python -m unittest discover tests
+"""
+import email
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+SCRIPTS_DIR = os.path.join(ROOT, 'scripts')
+BENCH_DIR = os.path.join(ROOT, 'benchmarks')
+sys.path.insert(0, SCRIPTS_DIR)
+sys.path.insert(0, BENCH_DIR)
+
+import akshare_replay  # noqa: E402
+from history_store import HistoryStore  # noqa: E402
+from smtp_stub import SMTPStub  # noqa: E402
+
+TRADE_DAY = 20240209
+
+CHILD = f"""
+import os, sys
+sys.path.insert(0, {BENCH_DIR!r})
+import pandas as pd
+import akshare_replay
+ak = akshare_replay.install()
+ak.tool_trade_date_hist_sina = lambda: pd.DataFrame(
+    {{'trade_date': pd.to_datetime(['2024-02-07', '2024-02-08', '2024-02-09']).date}})
+if os.environ.get('HOLIDAY_RERUN') == '1':
+    def stock_zh_index_spot(**kwargs):
+        raise ConnectionError('首选数据源不可用')
+    ak.stock_zh_index_spot = stock_zh_index_spot
+    boc, em = ak.currency_boc_sina, ak.stock_zh_index_spot_em
+    def currency_boc_sina(**kwargs):
+        frame = boc(**kwargs)
+        frame['现汇卖出价'] += float(os.environ.get('BOC_BUMP', '0.05'))
+        return frame
+    def stock_zh_index_spot_em(**kwargs):
+        frame = em(**kwargs)
+        frame['最新价'] += 0.01
+        return frame
+    ak.currency_boc_sina, ak.stock_zh_index_spot_em = currency_boc_sina, stock_zh_index_spot_em
+if os.environ.get('SNAPSHOT_DOWN') == '1':
+    def stock_zh_a_spot_em(**kwargs):
+        raise ConnectionError('全市场快照不可用')
+    ak.stock_zh_a_spot_em = stock_zh_a_spot_em
+import fetch_and_send
+sys.exit(0 if fetch_and_send.main() else 1)
+"""
+
+
+class DailyRunCase(unittest.TestCase):
+    """按 RUNS 依次运行 main()，记录每次发出的邮件数和运行后的历史"""
+
+    RUNS = []
+
+    @classmethod
+    def setUpClass(cls):
+        cls.cache_dir = tempfile.mkdtemp(prefix='daily_run_')
+        cls.sina = akshare_replay.SinaReplayServer(akshare_replay.Recording()).start()
+        cls.stub = SMTPStub().start()
+        env = dict(os.environ, CACHE_DIR=cls.cache_dir, SOURCE_CACHE_TTL='0', HTTP_MAX_RETRIES='0',
+                   SMTP_HOST='127.0.0.1', SMTP_PORT=str(cls.stub.port), SMTP_STARTTLS='0', SMTP_RATE_LIMIT='0',
+                   EMAIL_USER='bot@example.com', EMAIL_PASSWORD='secret', TO_EMAIL='reader@example.com',
+                   SINA_QUOTE_URL=cls.sina.url, FORCE_SEND='0')
+        for name in ('SUBSCRIBERS', 'SUBSCRIBERS_FILE', 'HISTORY_DIR', 'METRICS_DIR'):
+            env.pop(name, None)
+        cls.sent = []
+        cls.histories = []
+        for run in cls.RUNS:
+            if run.get('SP500_MOVE'):
+                cls.sina.lines['gb_$inx'] = cls.sina.lines['gb_$inx'].replace('5026.61', '5051.20', 1)
+            before = len(cls.stub.messages)
+            result = subprocess.run([sys.executable, '-c', CHILD], cwd=SCRIPTS_DIR,
+                                    env=dict(env, **run), capture_output=True, text=True)
+            if result.returncode != 0:
+                raise RuntimeError(f"main() 运行失败:\n{result.stdout[-3000:]}\n{result.stderr[-3000:]}")
+            cls.sent.append(len(cls.stub.messages) - before)
+            cls.histories.append(cls.history())
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.sina.shutdown()
+        cls.stub.shutdown()
+        cls.stub.server_close()
+        shutil.rmtree(cls.cache_dir, ignore_errors=True)
+
+    @classmethod
+    def history(cls):
+        store = HistoryStore(os.path.join(cls.cache_dir, 'history'))
+        return {series: tuple(map(list, store.columns(series))) for series in store.series()}
+
+    @classmethod
+    def html(cls, index):
+        message = email.message_from_bytes(cls.stub.messages[index][2])
+        part = next(p for p in message.walk() if p.get_content_type() == 'text/html')
+        return part.get_payload(decode=True).decode(part.get_content_charset() or 'utf-8')
+
+
+class HolidayRerunTest(DailyRunCase):
+
+    RUNS = [
+        {'HOLIDAY_RERUN': '0'},
+        {'HOLIDAY_RERUN': '1'},
+        {'HOLIDAY_RERUN': '1', 'SP500_MOVE': '1'},
+        {'HOLIDAY_RERUN': '1', 'FORCE_SEND': '1', 'BOC_BUMP': '286.89'},
+    ]
+
+    def test_first_run_recorded_under_trade_date(self):
+        self.assertEqual(self.sent[0], 1)
+        for series in ('SHANGHAI', 'USD/CNY', 'TURNOVER'):
+            self.assertEqual(self.histories[0][series][0], [TRADE_DAY], series)
+
+    def test_holiday_rerun_with_other_provider_adds_no_row(self):
+        self.assertEqual(self.histories[1], self.histories[0])
+
+    def test_holiday_rerun_with_other_provider_does_not_resend(self):
+        self.assertEqual(self.sent[1], 0)
+
+    def test_holiday_rerun_with_new_offshore_close_resends(self):
+        self.assertEqual(self.sent[2], 1)
+        self.assertIn('5051.2', self.html(1))
+        self.assertNotIn('5051.2', self.html(0))
+
+    def test_forced_resend_renders_fresh_data(self):
+        self.assertEqual(self.sent[3], 1)
+        self.assertIn('999.99', self.html(2))
+
+
+class PartialRerunTest(DailyRunCase):
+
+    RUNS = [
+        {'SNAPSHOT_DOWN': '1'},
+        {},
+        {},
+        {'SNAPSHOT_DOWN': '1'},
+    ]
+
+    def test_partial_first_run_is_sent(self):
+        self.assertEqual(self.sent[0], 1)
+        self.assertNotIn('TURNOVER', self.histories[0])
+
+    def test_rerun_with_missing_data_resends_once(self):
+        self.assertEqual(self.sent[1:3], [1, 0])
+        self.assertEqual(self.histories[1]['TURNOVER'][0], [TRADE_DAY])
+
+    def test_rerun_with_less_data_does_not_resend(self):
+        self.assertEqual(self.sent[3], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,243 @@
+"""
+hedging.run_hedged 的调度和 LatencyBook 的持久化
+
+数据源是返回 {指标: 取值} 的假函数，用 sleep 模拟慢请求；
+主数据源的对冲等待时间通过预先记录的延迟样本控制。
+
+用法: python -m pytest tests  或  python -m unittest discover tests
+"""
+import bisect
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'scripts'))
+
+import hedging  # noqa: E402
+from hedging import HEDGE_DEFAULT_DELAY, HEDGE_MIN_SAMPLES, LATENCY_BOUNDS, LatencyBook, run_hedged  # noqa: E402
+
+# 慢数据源的耗时，远大于测试中的对冲等待时间和超时
+SLOW = 2.0
+
+
+def extract(name, result):
+    return result
+
+
+class FakeProvider:
+    """记录调用次数的假数据源"""
+
+    def __init__(self, result=None, delay=0.0, error=None):
+        self.result = result or {}
+        self.delay = delay
+        self.error = error
+        self.calls = 0
+        self.lock = threading.Lock()
+
+    def __call__(self):
+        with self.lock:
+            self.calls += 1
+        time.sleep(self.delay)
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+
+class RunHedgedTest(unittest.TestCase):
+
+    def setUp(self):
+        root = tempfile.mkdtemp(prefix='hedging_')
+        self.addCleanup(shutil.rmtree, root, ignore_errors=True)
+        self.book = LatencyBook(os.path.join(root, 'latency.json'))
+
+    def fast_history(self, name, seconds=0.05):
+        """让 name 的对冲等待时间降到 seconds 所在的桶"""
+        for _ in range(HEDGE_MIN_SAMPLES):
+            self.book.record(name, seconds)
+
+    def run_chains(self, providers, chains, timeouts=None, **kwargs):
+        specs = {name: (func, (timeouts or {}).get(name, 30)) for name, func in providers.items()}
+        start = time.perf_counter()
+        outcome = run_hedged(specs, chains, extract, self.book, **kwargs)
+        return outcome, time.perf_counter() - start
+
+    def test_fast_primary_is_not_hedged(self):
+        primary, alternate = FakeProvider({'X': 1}, delay=0.02), FakeProvider({'X': 2})
+        (values, winners, _, timings), _ = self.run_chains(
+            {'primary': primary, 'alternate': alternate}, {'X': ['primary', 'alternate']})
+        self.assertEqual((values, winners), ({'X': 1}, {'X': 'primary'}))
+        self.assertEqual(alternate.calls, 0)
+        self.assertNotIn('alternate', timings)
+        self.assertEqual(self.book.histogram('primary').samples, 1)
+
+    def test_slow_primary_is_hedged(self):
+        self.fast_history('primary')
+        primary, alternate = FakeProvider({'X': 1}, delay=SLOW), FakeProvider({'X': 2})
+        (values, winners, results, timings), elapsed = self.run_chains(
+            {'primary': primary, 'alternate': alternate}, {'X': ['primary', 'alternate']})
+        self.assertEqual((values, winners), ({'X': 2}, {'X': 'alternate'}))
+        self.assertLess(elapsed, SLOW / 2)
+        self.assertEqual(timings['primary']['status'], 'abandoned')
+        self.assertEqual(timings['alternate']['status'], 'ok')
+        self.assertNotIn('primary', results)
+        # 被放弃的请求也记录延迟（截至放弃时的耗时）
+        self.assertEqual(self.book.histogram('primary').samples, HEDGE_MIN_SAMPLES + 1)
+        self.assertEqual(self.book.histogram('alternate').samples, 1)
+
+    def test_error_moves_down_the_chain(self):
+        primary = FakeProvider(error=ConnectionError('不可用'))
+        alternate = FakeProvider({'X': 2})
+        (values, winners, _, timings), elapsed = self.run_chains(
+            {'primary': primary, 'alternate': alternate}, {'X': ['primary', 'alternate']})
+        self.assertEqual((values, winners), ({'X': 2}, {'X': 'alternate'}))
+        # 不等待对冲时间（默认 HEDGE_DEFAULT_DELAY）
+        self.assertLess(elapsed, HEDGE_DEFAULT_DELAY / 2)
+        self.assertEqual(timings['primary']['status'], 'error')
+        self.assertEqual(timings['primary']['error'], '不可用')
+
+    def test_missing_key_moves_down_the_chain(self):
+        primary, alternate = FakeProvider({'Y': 1}), FakeProvider({'X': 2})
+        (values, winners, results, _), elapsed = self.run_chains(
+            {'primary': primary, 'alternate': alternate},
+            {'X': ['primary', 'alternate'], 'Y': ['primary']})
+        self.assertEqual(values, {'X': 2, 'Y': 1})
+        self.assertEqual(winners, {'X': 'alternate', 'Y': 'primary'})
+        self.assertEqual(primary.calls, 1)
+        self.assertEqual(set(results), {'primary', 'alternate'})
+        self.assertLess(elapsed, HEDGE_DEFAULT_DELAY / 2)
+
+    def test_shared_provider_called_once(self):
+        shared = FakeProvider({'X': 1, 'Y': 2})
+        (values, _, _, _), _ = self.run_chains({'shared': shared}, {'X': ['shared'], 'Y': ['shared']})
+        self.assertEqual(values, {'X': 1, 'Y': 2})
+        self.assertEqual(shared.calls, 1)
+
+    def test_all_providers_fail(self):
+        providers = {'primary': FakeProvider(error=ValueError('坏数据')), 'alternate': FakeProvider({'Y': 1})}
+        (values, winners, _, timings), _ = self.run_chains(providers, {'X': ['primary', 'alternate']})
+        self.assertEqual((values, winners), ({}, {}))
+        self.assertEqual(timings['primary']['status'], 'error')
+        self.assertEqual(timings['alternate']['status'], 'ok')
+
+    def test_timeout_moves_down_the_chain(self):
+        primary, alternate = FakeProvider({'X': 1}, delay=SLOW), FakeProvider({'X': 2})
+        (values, winners, _, timings), elapsed = self.run_chains(
+            {'primary': primary, 'alternate': alternate}, {'X': ['primary', 'alternate']},
+            timeouts={'primary': 0.1})
+        self.assertEqual((values, winners), ({'X': 2}, {'X': 'alternate'}))
+        self.assertLess(elapsed, SLOW / 2)
+        self.assertEqual(timings['primary']['status'], 'timeout')
+        # 超时记为超时时间
+        histogram = self.book.histogram('primary')
+        self.assertEqual(histogram.samples, 1)
+        self.assertEqual(histogram.counts[bisect.bisect_left(LATENCY_BOUNDS, 0.1)], 1)
+
+    def test_timeout_of_last_provider(self):
+        (values, _, _, timings), elapsed = self.run_chains(
+            {'primary': FakeProvider({'X': 1}, delay=SLOW)}, {'X': ['primary']}, timeouts={'primary': 0.1})
+        self.assertEqual(values, {})
+        self.assertEqual(timings['primary']['status'], 'timeout')
+        self.assertLess(elapsed, SLOW / 2)
+
+    def test_required_sources(self):
+        snapshot = FakeProvider({'rows': 5000}, delay=0.05)
+        broken = FakeProvider(error=ConnectionError('不可用'))
+        (values, _, results, timings), _ = self.run_chains(
+            {'snapshot': snapshot, 'broken': broken, 'primary': FakeProvider({'X': 1})},
+            {'X': ['primary']}, required=['snapshot', 'broken'])
+        self.assertEqual(values, {'X': 1})
+        # 指标早已返回，仍等待 required 数据源完成
+        self.assertEqual(results['snapshot'], {'rows': 5000})
+        self.assertEqual(timings['snapshot']['status'], 'ok')
+        self.assertEqual(timings['broken']['status'], 'error')
+
+    def test_required_only(self):
+        (values, _, results, _), _ = self.run_chains({'snapshot': FakeProvider({'rows': 1})}, {},
+                                                     required=['snapshot'])
+        self.assertEqual((values, results), ({}, {'snapshot': {'rows': 1}}))
+
+    def test_ready_sources_are_not_fetched(self):
+        primary, alternate = FakeProvider({'X': 1}), FakeProvider({'X': 2})
+        (values, winners, results, timings), _ = self.run_chains(
+            {'primary': primary, 'alternate': alternate}, {'X': ['primary', 'alternate']},
+            ready={'primary': {'X': 3}})
+        self.assertEqual((values, winners), ({'X': 3}, {'X': 'primary'}))
+        self.assertEqual((primary.calls, alternate.calls), (0, 0))
+        self.assertEqual(results, {'primary': {'X': 3}})
+        self.assertEqual(timings['primary']['status'], 'cache')
+        self.assertEqual(self.book.histograms, {})
+
+    def test_ready_source_without_key_falls_through(self):
+        alternate = FakeProvider({'X': 2})
+        (values, winners, _, _), _ = self.run_chains(
+            {'primary': FakeProvider({'X': 1}), 'alternate': alternate}, {'X': ['primary', 'alternate']},
+            ready={'primary': {}})
+        self.assertEqual((values, winners), ({'X': 2}, {'X': 'alternate'}))
+        self.assertEqual(alternate.calls, 1)
+
+    def test_nothing_to_fetch(self):
+        self.assertEqual(run_hedged({}, {}, extract, self.book), ({}, {}, {}, {}))
+
+
+class LatencyBookTest(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp(prefix='hedging_')
+        self.addCleanup(shutil.rmtree, self.root, ignore_errors=True)
+        self.path = os.path.join(self.root, 'nested', 'latency.json')
+
+    def test_round_trip(self):
+        book = LatencyBook(self.path)
+        for seconds in (0.01, 0.3, 1.2, 500):
+            book.record('stock_zh_index_spot', seconds)
+        book.record('currency_boc_sina', 0.8)
+        book.save()
+
+        loaded = LatencyBook(self.path)
+        self.assertEqual(set(loaded.histograms), {'stock_zh_index_spot', 'currency_boc_sina'})
+        for provider, histogram in book.histograms.items():
+            with self.subTest(provider):
+                self.assertEqual(loaded.histograms[provider].to_dict(), histogram.to_dict())
+        # 超过最大上界的样本落在溢出桶
+        self.assertEqual(loaded.histogram('stock_zh_index_spot').counts[-1], 1)
+
+    def test_unreadable_file_starts_empty(self):
+        os.makedirs(os.path.dirname(self.path))
+        for content in ('not json', '[1, 2]', '{"a": {"counts": [1, 2], "samples": 3}}'):
+            with self.subTest(content=content):
+                with open(self.path, 'w', encoding='utf-8') as f:
+                    f.write(content)
+                book = LatencyBook(self.path)
+                self.assertEqual(book.hedge_delay('a'), HEDGE_DEFAULT_DELAY)
+
+    def test_hedge_delay_adapts_after_min_samples(self):
+        book = LatencyBook(self.path)
+        self.assertEqual(book.hedge_delay('sina'), HEDGE_DEFAULT_DELAY)
+        for _ in range(HEDGE_MIN_SAMPLES - 1):
+            book.record('sina', 0.3)
+        self.assertEqual(book.hedge_delay('sina'), HEDGE_DEFAULT_DELAY)
+
+        book.record('sina', 0.3)
+        bucket = LATENCY_BOUNDS[bisect.bisect_left(LATENCY_BOUNDS, 0.3)]
+        self.assertEqual(book.hedge_delay('sina'), bucket)
+
+        # 变慢之后，旧样本衰减，p95 随之升高
+        for _ in range(20):
+            book.record('sina', 4.0)
+        self.assertEqual(book.hedge_delay('sina'), LATENCY_BOUNDS[bisect.bisect_left(LATENCY_BOUNDS, 4.0)])
+        self.assertEqual(LatencyBook(self.path).hedge_delay('sina'), HEDGE_DEFAULT_DELAY)
+
+    def test_decay(self):
+        histogram = hedging.LatencyHistogram()
+        histogram.record(0.1)
+        histogram.record(1.0)
+        self.assertAlmostEqual(histogram.counts[bisect.bisect_left(LATENCY_BOUNDS, 0.1)], hedging.LATENCY_DECAY)
+        self.assertEqual(histogram.samples, 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
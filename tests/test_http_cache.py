@@ -0,0 +1,183 @@
+"""
+http_cache.CachedSession 的条件请求，在本地HTTP服务上验证
+
+服务器按请求头里的 If-None-Match / If-Modified-Since 返回 304，并记录收到的每个请求头。
+
+用法: python -m pytest tests  或  python -m unittest discover tests
+"""
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'scripts'))
+
+import http_cache  # noqa: E402
+
+BODY = '币种,现汇卖出价\n美元,713.1\n'.encode('utf-8')
+ETAG = '"v1"'
+LAST_MODIFIED = 'Fri, 09 Feb 2024 08:00:00 GMT'
+
+
+class ReferenceHandler(BaseHTTPRequestHandler):
+    """
+    /etag 带 ETag，/modified 带 Last-Modified，/lower 用小写的 etag/last-modified，
+    /plain 不带校验头，/missing 为带 ETag 的 404；
+    304 响应附带 X-Revalidated，用于检查响应头的合并
+    """
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        path = self.path.split('?', 1)[0]
+        self.server.received.append((self.path, dict(self.headers)))
+        validators = {}
+        if path == '/etag':
+            validators = {'ETag': ETAG}
+            fresh = self.headers.get('If-None-Match') == ETAG
+        elif path == '/modified':
+            validators = {'Last-Modified': LAST_MODIFIED}
+            fresh = self.headers.get('If-Modified-Since') == LAST_MODIFIED
+        elif path == '/lower':
+            validators = {'etag': ETAG, 'last-modified': LAST_MODIFIED}
+            fresh = self.headers.get('If-None-Match') == ETAG
+        else:
+            fresh = False
+
+        if fresh:
+            self.send_response(304)
+            self.send_header('X-Revalidated', '1')
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+
+        status = 404 if path == '/missing' else 200
+        self.send_response(status)
+        self.send_header('Content-Type', 'text/csv; charset=utf-8')
+        self.send_header('Content-Length', str(len(BODY)))
+        for name, value in validators.items():
+            self.send_header(name, value)
+        if path == '/missing':
+            self.send_header('ETag', ETAG)
+        self.end_headers()
+        self.wfile.write(BODY)
+
+    def log_message(self, *args):
+        pass
+
+
+class CachedSessionTest(unittest.TestCase):
+
+    def setUp(self):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), ReferenceHandler)
+        self.server.daemon_threads = True
+        self.server.received = []
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+
+        self.cache_dir = tempfile.mkdtemp(prefix='http_cache_')
+        self.addCleanup(shutil.rmtree, self.cache_dir, ignore_errors=True)
+        self.session = self.new_session()
+
+    def new_session(self):
+        session = http_cache.CachedSession(self.cache_dir, max_retries=0, timeout=5)
+        self.addCleanup(session.close)
+        return session
+
+    def url(self, path):
+        return f"http://127.0.0.1:{self.server.server_address[1]}{path}"
+
+    def last_headers(self):
+        return self.server.received[-1][1]
+
+    def test_etag_revalidation(self):
+        first = self.session.get(self.url('/etag'))
+        self.assertEqual(first.status_code, 200)
+        self.assertNotIn('If-None-Match', self.last_headers())
+
+        # 新的会话（下一次运行）同样从磁盘缓存发起条件请求
+        session = self.new_session()
+        second = session.get(self.url('/etag'), headers={'Referer': 'https://example.com/'})
+        sent = self.last_headers()
+        self.assertEqual(sent['If-None-Match'], ETAG)
+        self.assertNotIn('If-Modified-Since', sent)
+        self.assertEqual(sent['Referer'], 'https://example.com/')
+
+        self.assertEqual(second.status_code, 200)
+        self.assertTrue(second.from_cache)
+        self.assertEqual(second.content, BODY)
+        self.assertEqual(second.text, BODY.decode('utf-8'))
+        # 缓存的头与304中的新头合并，长度头不沿用
+        self.assertEqual(second.headers['ETag'], ETAG)
+        self.assertEqual(second.headers['Content-Type'], 'text/csv; charset=utf-8')
+        self.assertEqual(second.headers['X-Revalidated'], '1')
+        self.assertNotIn('Content-Length', second.headers)
+
+        self.assertEqual(session.stats, {'requests': 1, 'conditional': 1, 'not_modified': 1,
+                                         'bytes_downloaded': 0, 'bytes_saved': len(BODY)})
+
+    def test_last_modified_revalidation(self):
+        self.session.get(self.url('/modified'))
+        response = self.session.get(self.url('/modified'))
+        self.assertEqual(self.last_headers()['If-Modified-Since'], LAST_MODIFIED)
+        self.assertNotIn('If-None-Match', self.last_headers())
+        self.assertTrue(response.from_cache)
+        self.assertEqual(response.content, BODY)
+        self.assertEqual(self.session.stats['bytes_downloaded'], len(BODY))
+        self.assertEqual(self.session.stats['bytes_saved'], len(BODY))
+
+    def test_lowercase_validator_headers(self):
+        self.session.get(self.url('/lower'))
+        session = self.new_session()
+        response = session.get(self.url('/lower'))
+        sent = self.last_headers()
+        self.assertEqual(sent['If-None-Match'], ETAG)
+        self.assertEqual(sent['If-Modified-Since'], LAST_MODIFIED)
+        self.assertTrue(response.from_cache)
+        self.assertEqual(response.headers['ETag'], ETAG)
+        self.assertEqual(response.content, BODY)
+        self.assertEqual(session.stats, {'requests': 1, 'conditional': 1, 'not_modified': 1,
+                                         'bytes_downloaded': 0, 'bytes_saved': len(BODY)})
+
+    def test_query_string_is_part_of_the_key(self):
+        self.session.get(self.url('/etag'), params={'symbol': '美元'})
+        self.session.get(self.url('/etag'), params={'symbol': '欧元'})
+        self.assertNotIn('If-None-Match', self.last_headers())
+        self.session.get(self.url('/etag'), params={'symbol': '美元'})
+        self.assertEqual(self.last_headers()['If-None-Match'], ETAG)
+
+    def test_only_successful_responses_with_validators_are_stored(self):
+        for path in ('/plain', '/missing'):
+            with self.subTest(path=path):
+                self.session.get(self.url(path))
+                self.session.get(self.url(path))
+                self.assertNotIn('If-None-Match', self.last_headers())
+                self.assertNotIn('If-Modified-Since', self.last_headers())
+        self.assertEqual(os.listdir(self.cache_dir), [])
+        self.assertEqual(self.session.stats['conditional'], 0)
+        self.assertEqual(self.session.stats['bytes_downloaded'], 4 * len(BODY))
+
+    def test_without_cache_dir(self):
+        session = http_cache.CachedSession(None, max_retries=0, timeout=5)
+        self.addCleanup(session.close)
+        session.get(self.url('/etag'))
+        session.get(self.url('/etag'))
+        self.assertNotIn('If-None-Match', self.last_headers())
+        self.assertEqual(session.stats['requests'], 2)
+
+    def test_patch_requests_routes_module_calls(self):
+        self.session.get(self.url('/etag'))
+        with http_cache.patch_requests(self.session):
+            response = requests.get(self.url('/etag'))
+        self.assertTrue(response.from_cache)
+        self.assertFalse(hasattr(requests.get(self.url('/etag')), 'from_cache'))
+        self.assertEqual(self.session.stats['not_modified'], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,87 @@
+"""
+mailer 的批量投递在本地SMTP替身（benchmarks/smtp_stub.py）上的行为
+
+重点是致命错误：服务器不支持STARTTLS、没有可用的认证方式或密码错误时，
+整批只尝试建立一次连接，其余收件人直接记为投递中止。
+
+用法: python -m pytest tests  或  python -m unittest discover tests
+"""
+import os
+import smtplib
+import sys
+import unittest
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, os.path.join(ROOT, 'scripts'))
+sys.path.insert(0, os.path.join(ROOT, 'benchmarks'))
+
+import mailer  # noqa: E402
+from smtp_stub import SMTPStub  # noqa: E402
+
+RECIPIENTS = [f"reader{i}@example.com" for i in range(10)]
+
+
+class FatalErrorTest(unittest.TestCase):
+
+    def deliver(self, starttls=False, **stub_options):
+        stub = SMTPStub(**stub_options).start()
+        self.addCleanup(stub.server_close)
+        self.addCleanup(stub.shutdown)
+        pool = mailer.SMTPConnectionPool('bot@example.com', 'secret', host='127.0.0.1', port=stub.port,
+                                         size=3, starttls=starttls, timeout=5)
+        messages = [(r, '日报', '<p>test</p>') for r in RECIPIENTS]
+        results = mailer.deliver(messages, 'bot@example.com', pool, rate_limit=0, max_retries=3, backoff=0)
+        pool.close()
+        return stub, pool, results
+
+    def assert_aborted_once(self, stub, pool, results, error_type):
+        self.assertEqual(stub.connections, 1)
+        self.assertIsInstance(pool.failed, error_type)
+        self.assertEqual(stub.messages, [])
+        aborted = [r for r, error in results.items() if error and error.startswith("投递已中止")]
+        self.assertEqual(len(aborted), len(RECIPIENTS) - 1)
+        self.assertTrue(all(results.values()))
+
+    def test_starttls_not_supported(self):
+        stub, pool, results = self.deliver(starttls=True)
+        self.assert_aborted_once(stub, pool, results, smtplib.SMTPNotSupportedError)
+
+    def test_no_suitable_auth_method(self):
+        stub, pool, results = self.deliver(auth_methods='XOAUTH2')
+        self.assert_aborted_once(stub, pool, results, smtplib.SMTPException)
+        self.assertEqual(stub.auth_attempts, 0)
+
+    def test_authentication_failure(self):
+        stub, pool, results = self.deliver(auth_fail=True, auth_methods='PLAIN')
+        self.assert_aborted_once(stub, pool, results, smtplib.SMTPAuthenticationError)
+        self.assertEqual(stub.auth_attempts, 1)
+
+    def test_transient_failure_is_retried(self):
+        stub, pool, results = self.deliver(fail_first=2)
+        self.assertIsNone(pool.failed)
+        self.assertEqual(results, {r: None for r in RECIPIENTS})
+        self.assertEqual(len(stub.messages), len(RECIPIENTS))
+
+
+class ClassificationTest(unittest.TestCase):
+
+    def test_smtp_errors_are_not_os_errors(self):
+        self.assertFalse(mailer.is_transient(smtplib.SMTPNotSupportedError("STARTTLS extension not supported")))
+        self.assertFalse(mailer.is_transient(smtplib.SMTPException("No suitable authentication method found.")))
+        self.assertTrue(mailer.is_fatal(smtplib.SMTPNotSupportedError("SMTP AUTH extension not supported")))
+        self.assertTrue(mailer.is_fatal(smtplib.SMTPException("No suitable authentication method found.")))
+
+    def test_network_errors_are_transient(self):
+        for error in (smtplib.SMTPServerDisconnected(), ConnectionResetError(), TimeoutError(),
+                      smtplib.SMTPConnectError(421, b"busy"), smtplib.SMTPResponseException(451, b"later")):
+            self.assertTrue(mailer.is_transient(error), error)
+            self.assertFalse(mailer.is_fatal(error), error)
+
+    def test_permanent_connect_errors_are_fatal(self):
+        self.assertTrue(mailer.is_fatal(smtplib.SMTPConnectError(554, b"no service")))
+        self.assertTrue(mailer.is_fatal(smtplib.SMTPAuthenticationError(535, b"bad password")))
+        self.assertFalse(mailer.is_fatal(smtplib.SMTPRecipientsRefused({'a@x': (550, b"no such user")})))
+
+
+if __name__ == '__main__':
+    unittest.main()
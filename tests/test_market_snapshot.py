@@ -0,0 +1,126 @@
+"""
+全市场快照的涨跌停判断：各板块的涨跌停幅度、新股和停牌的处理、涨跌停价四舍五入到分
+
+每行是一只手工构造的股票，单独放进快照计算后与预期的分类比较。
+
+用法: python -m pytest tests  或  python -m unittest discover tests
+"""
+import os
+import sys
+import unittest
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'scripts'))
+
+from market_snapshot import compute_market_breadth, price_limit_ratios  # noqa: E402
+
+NAN = float('nan')
+
+# (代码, 名称, 昨收, 最新价, 涨跌停幅度, 分类)
+# 分类: up/down 为涨停/跌停，rising/falling/flat 为普通涨跌平，None 为停牌不计入
+CASES = [
+    # 主板 10%
+    ('600000', '浦发银行', 10.00, 11.00, 0.10, 'up'),
+    ('600000', '浦发银行', 10.00, 10.99, 0.10, 'rising'),
+    ('000001', '平安银行', 10.00, 9.00, 0.10, 'down'),
+    ('000001', '平安银行', 10.00, 9.01, 0.10, 'falling'),
+    ('002001', '新和成', 10.00, 10.00, 0.10, 'flat'),
+    # 涨跌停价四舍五入到分: 9.87 * 1.1 = 10.857 -> 10.86，9.87 * 0.9 = 8.883 -> 8.88
+    ('600519', '贵州茅台', 9.87, 10.86, 0.10, 'up'),
+    ('600519', '贵州茅台', 9.87, 10.85, 0.10, 'rising'),
+    ('600519', '贵州茅台', 9.87, 8.88, 0.10, 'down'),
+    ('600519', '贵州茅台', 9.87, 8.89, 0.10, 'falling'),
+    # 3.45 * 1.1 = 3.795 -> 3.80
+    ('000002', '万科A', 3.45, 3.80, 0.10, 'up'),
+    ('000002', '万科A', 3.45, 3.79, 0.10, 'rising'),
+    # 主板 ST/*ST 5%
+    ('600001', 'ST某某', 5.00, 5.25, 0.05, 'up'),
+    ('600001', 'ST某某', 5.00, 5.24, 0.05, 'rising'),
+    ('000003', '*ST某某', 5.00, 4.75, 0.05, 'down'),
+    ('000003', '*st某某', 5.00, 4.75, 0.05, 'down'),
+    # 创业板、科创板 20%，其中的ST股同样按20%
+    ('300001', '特锐德', 20.00, 24.00, 0.20, 'up'),
+    ('301001', '凯淳股份', 20.00, 22.00, 0.20, 'rising'),
+    ('302132', '中航成飞', 20.00, 16.00, 0.20, 'down'),
+    ('300002', '*ST创业', 2.00, 2.40, 0.20, 'up'),
+    ('300002', '*ST创业', 2.00, 2.10, 0.20, 'rising'),
+    ('688001', '华兴源创', 50.00, 40.00, 0.20, 'down'),
+    ('689009', '九号公司', 50.00, 60.00, 0.20, 'up'),
+    ('688002', 'ST科创', 10.00, 9.50, 0.20, 'falling'),
+    # 北交所 30%
+    ('830001', '北交所甲', 10.00, 13.00, 0.30, 'up'),
+    ('430001', '北交所乙', 10.00, 12.99, 0.30, 'rising'),
+    ('920001', '北交所丙', 10.00, 7.00, 0.30, 'down'),
+    # 上市首日无涨跌幅限制的新股(N)和次新股(C)不计入涨跌停
+    ('301999', 'N新股', 10.00, 30.00, 0.20, 'rising'),
+    ('688999', 'C次新', 10.00, 12.00, 0.20, 'rising'),
+    ('603999', 'N主板', 10.00, 11.00, 0.10, 'rising'),
+    # 停牌：没有最新价或昨收
+    ('600002', '停牌股', 10.00, NAN, 0.10, None),
+    ('600003', '新上市', NAN, 10.00, 0.10, None),
+    ('600004', '无昨收', 0.0, 10.00, 0.10, None),
+]
+
+COUNT_KEYS = {
+    'up': ('RISING_STOCKS', 'LIMIT_UP'),
+    'down': ('FALLING_STOCKS', 'LIMIT_DOWN'),
+    'rising': ('RISING_STOCKS',),
+    'falling': ('FALLING_STOCKS',),
+    'flat': ('FLAT_STOCKS',),
+    None: (),
+}
+
+
+def snapshot(rows):
+    return pd.DataFrame({
+        '代码': [row[0] for row in rows],
+        '名称': [row[1] for row in rows],
+        '昨收': [row[2] for row in rows],
+        '最新价': [row[3] for row in rows],
+        '成交额': [1e8] * len(rows),
+    })
+
+
+class PriceLimitTest(unittest.TestCase):
+
+    def test_limit_ratios(self):
+        codes = np.array([case[0] for case in CASES])
+        names = np.array([case[1] for case in CASES])
+        limits = price_limit_ratios(codes, names)
+        for case, limit in zip(CASES, limits):
+            with self.subTest(code=case[0], name=case[1]):
+                self.assertEqual(limit, case[4])
+
+    def test_breadth_per_stock(self):
+        for case in CASES:
+            with self.subTest(code=case[0], name=case[1], prev_close=case[2], price=case[3]):
+                breadth = compute_market_breadth(snapshot([case]))
+                expected = {key: 0 for key in ('RISING_STOCKS', 'FALLING_STOCKS', 'FLAT_STOCKS',
+                                               'LIMIT_UP', 'LIMIT_DOWN')}
+                for key in COUNT_KEYS[case[5]]:
+                    expected[key] = 1
+                breadth.pop('TURNOVER')
+                self.assertEqual(breadth, expected)
+
+    def test_breadth_totals(self):
+        breadth = compute_market_breadth(snapshot(CASES))
+        classes = [case[5] for case in CASES]
+        self.assertEqual(breadth['LIMIT_UP'], classes.count('up'))
+        self.assertEqual(breadth['LIMIT_DOWN'], classes.count('down'))
+        self.assertEqual(breadth['RISING_STOCKS'], classes.count('up') + classes.count('rising'))
+        self.assertEqual(breadth['FALLING_STOCKS'], classes.count('down') + classes.count('falling'))
+        self.assertEqual(breadth['FLAT_STOCKS'], classes.count('flat'))
+        self.assertEqual(breadth['TURNOVER'], float(len(CASES)))
+
+    def test_numeric_strings_and_suspension_markers(self):
+        # 数据源把停牌股的价格写成 '-'
+        frame = pd.DataFrame({'代码': ['600000', '600002'], '名称': ['浦发银行', '停牌股'],
+                              '昨收': ['10.00', '10.00'], '最新价': ['11.00', '-'], '成交额': ['1e8', '-']})
+        breadth = compute_market_breadth(frame)
+        self.assertEqual((breadth['RISING_STOCKS'], breadth['LIMIT_UP'], breadth['TURNOVER']), (1, 1, 1.0))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,82 @@
+"""
+QuoteTable 的增删、序列化和字典视图
+
+渲染报告时 financial_data 经 pickle 传给进程池，删除品种之后行号与代码的对应关系必须保持不变。
+
+用法: python -m pytest tests  或  python -m unittest discover tests
+"""
+import copy
+import math
+import os
+import pickle
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'scripts'))
+
+from quotes import QuoteTable  # noqa: E402
+
+
+def quote(value, change=0.0, change_pct=0.0):
+    return {'value': value, 'change': change, 'change_pct': change_pct}
+
+
+class QuoteTableTest(unittest.TestCase):
+
+    def setUp(self):
+        self.table = QuoteTable(capacity=2)
+        self.table['A'] = quote(1.0, 0.1, 10.0)
+        self.table['B'] = quote(2.0, 0.2, 20.0)
+        self.table['C'] = quote(3.0, 0.3, 30.0)
+        self.table['RISING_STOCKS'] = 1200
+
+    def assertRows(self, table, expected):
+        self.assertEqual(table.to_dict(), expected)
+        for symbol, row in zip(table.symbols, table.array):
+            self.assertEqual(float(row['value']), expected[symbol]['value'], symbol)
+
+    def test_grows_past_capacity(self):
+        self.assertEqual(self.table.symbols, ['A', 'B', 'C'])
+        self.assertEqual(list(self.table), ['A', 'B', 'C', 'RISING_STOCKS'])
+        self.assertEqual(self.table['C']['change_pct'], 30.0)
+
+    def test_delete_keeps_array_aligned_with_symbols(self):
+        del self.table['A']
+        self.assertEqual(self.table.symbols, ['B', 'C'])
+        self.assertRows(self.table, {'B': quote(2.0, 0.2, 20.0), 'C': quote(3.0, 0.3, 30.0),
+                                     'RISING_STOCKS': 1200})
+
+        self.table['D'] = quote(4.0)
+        del self.table['C']
+        self.assertRows(self.table, {'B': quote(2.0, 0.2, 20.0), 'D': quote(4.0), 'RISING_STOCKS': 1200})
+
+    def test_delete_scalar(self):
+        del self.table['RISING_STOCKS']
+        self.assertNotIn('RISING_STOCKS', self.table)
+        self.assertEqual(len(self.table), 3)
+
+    def test_pickle_and_deepcopy_after_delete(self):
+        del self.table['A']
+        expected = self.table.to_dict()
+        for restored in (pickle.loads(pickle.dumps(self.table)), copy.deepcopy(self.table)):
+            self.assertIsInstance(restored, QuoteTable)
+            self.assertRows(restored, expected)
+            self.assertEqual(restored['B']['value'], 2.0)
+            self.assertEqual(restored['C']['value'], 3.0)
+
+    def test_missing_fields_read_as_zero(self):
+        self.table['E'] = {'value': 5.0}
+        self.assertTrue(math.isnan(self.table.array[self.table.symbols.index('E')]['change']))
+        self.assertEqual(dict(self.table['E']), {'value': 5.0, 'change': 0, 'change_pct': 0})
+        self.assertIn(('E', 'change_pct', 0), list(self.table.flat_items()))
+
+        self.table['E']['change'] = 0.5
+        self.assertEqual(self.table['E']['change'], 0.5)
+
+    def test_from_arrays(self):
+        table = QuoteTable.from_arrays(['X', 'Y'], [[1.0, float('nan'), 0.5], [2.0, 0.1, float('nan')]])
+        self.assertEqual(table.to_dict(), {'X': quote(1.0, 0, 0.5), 'Y': quote(2.0, 0.1, 0)})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,87 @@
+"""
+update_history 对历史推算涨跌的指标（中行美元汇率）按数据源区分历史序列，以及同一交易日重跑时逐个序列补录
+
+主数据源（中行现汇卖出价）和备用数据源（新浪在岸人民币中间价）基准不同：
+只有同一数据源的两个点才能相减，备用数据源返回时保留它自己的涨跌。
+
+用法: python -m pytest tests  或  python -m unittest discover tests
+"""
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'scripts'))
+
+from fetch_and_send import SINA_QUOTES, update_history  # noqa: E402
+from history_store import HistoryStore  # noqa: E402
+from rolling_stats import RollingStatsBook  # noqa: E402
+
+PRIMARY = 'currency_boc_sina'
+
+
+def usd_cny(value, change=0, change_pct=0):
+    return {'global_markets': {'USD/CNY': {'value': value, 'change': change, 'change_pct': change_pct}}}
+
+
+class UsdCnyProviderTest(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp(prefix='history_')
+        self.addCleanup(shutil.rmtree, self.root, ignore_errors=True)
+        self.store = HistoryStore(self.root)
+
+    def run_day(self, day, data, provider):
+        update_history(data, store=self.store, day=day, providers={'USD/CNY': provider})
+        return data['global_markets']['USD/CNY']
+
+    def test_change_derived_from_same_provider(self):
+        self.run_day(20240206, usd_cny(713.0), PRIMARY)
+        quote = self.run_day(20240207, usd_cny(713.5), PRIMARY)
+        self.assertEqual(quote['change'], 0.5)
+        self.assertEqual(quote['change_pct'], round(0.5 / 713.0 * 100, 2))
+
+    def test_alternate_keeps_own_change_and_series(self):
+        self.run_day(20240206, usd_cny(713.0), PRIMARY)
+        quote = self.run_day(20240207, usd_cny(719.1, -0.3, -0.04), SINA_QUOTES)
+        self.assertEqual((quote['change'], quote['change_pct']), (-0.3, -0.04))
+        self.assertEqual(list(self.store.columns('USD/CNY')[0]), [20240206])
+        self.assertEqual(list(self.store.columns(f'USD/CNY@{SINA_QUOTES}')[1]), [719.1])
+
+        # 主数据源恢复后与它自己的上一个点比较，不与中间价相减
+        quote = self.run_day(20240208, usd_cny(713.2), PRIMARY)
+        self.assertEqual(quote['change'], 0.2)
+        self.assertEqual(list(self.store.columns('USD/CNY')[1]), [713.0, 713.2])
+
+
+class PartialRerunTest(unittest.TestCase):
+    """同一交易日第一次运行缺少部分数据源，重跑时补上缺少的序列"""
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp(prefix='history_')
+        self.addCleanup(shutil.rmtree, self.root, ignore_errors=True)
+        self.store = HistoryStore(self.root)
+
+    def book(self):
+        return RollingStatsBook(os.path.join(self.root, 'rolling_stats.json')).series
+
+    def test_rerun_records_missing_series_only(self):
+        update_history({'domestic_market': {'SHANGHAI': {'value': 3050.0}}}, store=self.store, day=20240209)
+        data = update_history({'domestic_market': {'SHANGHAI': {'value': 3051.0}},
+                               'global_markets': {'S&P_500': {'value': 5026.6}}},
+                              store=self.store, day=20240209)
+
+        self.assertEqual(self.store.series(), ['S&P_500', 'SHANGHAI'])
+        self.assertEqual(list(self.store.columns('S&P_500')[1]), [5026.6])
+        # 已记录的序列保留第一次的值
+        self.assertEqual(list(self.store.columns('SHANGHAI')[1]), [3050.0])
+
+        book = self.book()
+        self.assertEqual(list(book['S&P_500'].values), [5026.6])
+        self.assertEqual(list(book['SHANGHAI'].values), [3050.0])
+        self.assertEqual(set(data['stats']), {'SHANGHAI', 'S&P_500'})
+
+
+if __name__ == '__main__':
+    unittest.main()